@@ -2,10 +2,32 @@
 
 from google.adk import Agent, AgentConfig
 from google.adk.tools import ToolContext
+import asyncio
+import re
 import time
+from datetime import datetime
 
 from google import genai
 
+_TIMEFRAME_RE = re.compile(r"last_(\d+)_(hours|days)")
+
+def parse_timeframe(timeframe: str, now: float = None) -> tuple:
+    """
+    Turns a timeframe name into an epoch-seconds window [t0, t1):
+    today, last_N_hours, last_N_days or all_time. Raises ValueError otherwise.
+    """
+    now = time.time() if now is None else now
+    if timeframe == "today":
+        midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        return midnight.timestamp(), now
+    if timeframe == "all_time":
+        return 0.0, now
+    match = _TIMEFRAME_RE.fullmatch(timeframe or "")
+    if not match:
+        raise ValueError(f"Unknown timeframe: {timeframe!r}")
+    unit = 3600 if match.group(2) == "hours" else 86400
+    return now - int(match.group(1)) * unit, now
+
 class RevenueAgent(Agent):
     def __init__(self, mem_bank):
         super().__init__(
@@ -20,20 +42,21 @@ class RevenueAgent(Agent):
 
     async def handle(self, ctx: ToolContext):
         timeframe = ctx.inputs.get("timeframe", "last_7_days")
-        orders = self.mem.get_all_orders()
+        t0, t1 = parse_timeframe(timeframe)
+        stats = await asyncio.to_thread(self.mem.order_stats_between, t0, t1)
         
-        total_revenue = sum(o.get('total', 0) for o in orders)
+        total_revenue = round(stats["revenue"], 2)
         
         # AI Analysis
-        prompt = f"Analyze this revenue: ${total_revenue} for {timeframe}. Brief 1-sentence insight."
+        prompt = f"Analyze this revenue: ${total_revenue} from {stats['orders']} orders for {timeframe}. Brief 1-sentence insight."
         try:
-            response = self.client.models.generate_content(model="gemini-2.0-flash-exp", contents=prompt)
+            response = await self.client.models.generate_content_async(model="gemini-2.0-flash-exp", contents=prompt, priority=genai.BACKGROUND)
             ai_summary = response.text.strip()
         except Exception as e:
             print(f"Revenue Agent AI Error: {e}")
             ai_summary = f"Total Revenue is ${total_revenue}."
 
-        return {"revenue_total": total_revenue, "timeframe": timeframe, "ai_summary": ai_summary}
+        return {"revenue_total": total_revenue, "orders": stats["orders"], "timeframe": timeframe, "ai_summary": ai_summary}
 
 class LogisticsAgent(Agent):
     def __init__(self, mem_bank):
@@ -48,24 +71,32 @@ class LogisticsAgent(Agent):
         self.client = genai.Client()
 
     async def handle(self, ctx: ToolContext):
-        orders = self.mem.get_all_orders()
-        if not orders:
+        timeframe = ctx.inputs.get("timeframe", "last_7_days")
+        t0, t1 = parse_timeframe(timeframe)
+        stats, turnaround = await asyncio.gather(
+            asyncio.to_thread(self.mem.order_stats_between, t0, t1),
+            asyncio.to_thread(self.mem.turnaround_stats, t0, t1),
+        )
+        if not stats["orders"] and not turnaround["count"]:
             return {"efficiency": 100, "avg_turnaround": 0, "ai_summary": "No orders to analyze."}
             
-        finished_count = sum(1 for o in orders if o['status'] in ['Finished', 'Delivered'])
-        efficiency = int((finished_count / len(orders)) * 100) if orders else 100
-        avg_turnaround = 24 
+        finished_count = sum(stats["status"].get(s, 0) for s in ('Finished', 'Delivered'))
+        efficiency = int((finished_count / stats["orders"]) * 100) if stats["orders"] else 100
+        # Hours from intake to first Ready/Finished/Delivered, for orders completed in the window
+        avg_turnaround, p50, p90 = (round(turnaround[k] / 3600, 1) for k in ("avg", "p50", "p90"))
         
         # AI Analysis
-        prompt = f"Analyze logistics: {efficiency}% efficiency, {avg_turnaround}h turnaround. Brief 1-sentence insight."
+        prompt = (f"Analyze logistics: {efficiency}% efficiency, {avg_turnaround}h average turnaround "
+                  f"(median {p50}h, p90 {p90}h over {turnaround['count']} orders). Brief 1-sentence insight.")
         try:
-            response = self.client.models.generate_content(model="gemini-2.0-flash-exp", contents=prompt)
+            response = await self.client.models.generate_content_async(model="gemini-2.0-flash-exp", contents=prompt, priority=genai.BACKGROUND)
             ai_summary = response.text.strip()
         except Exception as e:
             print(f"Logistics Agent AI Error: {e}")
             ai_summary = f"Efficiency is {efficiency}%."
 
-        return {"efficiency": efficiency, "avg_turnaround": avg_turnaround, "ai_summary": ai_summary}
+        return {"efficiency": efficiency, "avg_turnaround": avg_turnaround, "p50_turnaround": p50,
+                "p90_turnaround": p90, "ai_summary": ai_summary}
 
 class FeedbackAgent(Agent):
     def __init__(self, mem_bank):
@@ -80,18 +111,19 @@ class FeedbackAgent(Agent):
         self.client = genai.Client()
 
     async def handle(self, ctx: ToolContext):
-        feedbacks = self.mem.get_all_feedback()
-        if not feedbacks:
+        timeframe = ctx.inputs.get("timeframe", "last_7_days")
+        t0, t1 = parse_timeframe(timeframe)
+        stats = await asyncio.to_thread(self.mem.feedback_stats_between, t0, t1)
+        if not stats["count"]:
             return {"avg_rating": 0, "issues": [], "ai_summary": "No feedback yet."}
             
-        ratings = [f['rating'] for f in feedbacks]
-        avg_rating = sum(ratings) / len(ratings)
-        issues = [f['comment'] for f in feedbacks if f['rating'] < 3 and f['comment']]
+        avg_rating = stats["avg_rating"]
+        issues = stats["comments"]
         
         # AI Analysis
         prompt = f"Analyze feedback. Avg Rating: {avg_rating:.1f}. Issues: {issues}. Summarize key pain points in 1 sentence."
         try:
-            response = self.client.models.generate_content(model="gemini-2.0-flash-exp", contents=prompt)
+            response = await self.client.models.generate_content_async(model="gemini-2.0-flash-exp", contents=prompt, priority=genai.BACKGROUND)
             ai_summary = response.text.strip()
         except Exception as e:
             print(f"Feedback Agent AI Error: {e}")
@@ -2,10 +2,21 @@
 
 from google.adk import Agent, AgentConfig
 from google.adk.tools import ToolContext
+from google import genai
 import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+from agents.result_cache import ResultCache
+
+# Granularity at which a cached summary's time window is considered to have moved
+WINDOW_BUCKET_SECONDS = 300
 
 class AnalyticsOrchestrator(Agent):
-    def __init__(self, a2a):
+    def __init__(self, a2a, mem=None):
         super().__init__(
             config=AgentConfig(
                 name="analytics_orchestrator",
@@ -15,22 +26,26 @@ class AnalyticsOrchestrator(Agent):
             )
         )
         self.a2a = a2a
+        # With a MemoryBank, summaries are cached until orders/feedback change
+        self.mem = mem
+        self.cache = ResultCache(max_stale_seconds=Config.SWARM_CACHE_MAX_STALE_SECONDS) if mem else None
         
-        # Initialize Gemini
-        import google.generativeai as genai
-        import os
-        
-        api_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        else:
-            print("[AnalyticsOrchestrator] Warning: No API Key found")
-            self.model = None
+        # Shared, rate-limited Gemini client (google/genai shim)
+        self.client = genai.Client()
 
     async def handle(self, ctx: ToolContext):
         timeframe = ctx.inputs.get("timeframe", "last_7_days")
+        if self.cache is None:
+            return await self._summarize(timeframe)
 
+        # Stale-while-revalidate: an outdated summary is returned at once while
+        # a single background refresh (shared by concurrent callers) recomputes it.
+        # Windows like last_24_hours slide even without writes, hence the time bucket.
+        version = (await asyncio.to_thread(self.mem.get_data_version), int(time.time() // WINDOW_BUCKET_SECONDS))
+        summary, state = await self.cache.get(timeframe, version, lambda: self._summarize(timeframe))
+        return {**summary, "cache": state}
+
+    async def _summarize(self, timeframe: str):
         # Parallel execution using A2A
         revenue_task = self.a2a.call("revenue_agent", {"timeframe": timeframe})
         logistics_task = self.a2a.call("logistics_agent", {"timeframe": timeframe})
@@ -53,7 +68,9 @@ class AnalyticsOrchestrator(Agent):
         """
         try:
             # We can reuse the model to synthesize
-            resp = await self.model.generate_content_async(master_prompt)
+            resp = await self.client.models.generate_content_async(
+                model=self.config.model, contents=master_prompt, priority=genai.BACKGROUND
+            )
             master_summary = resp.text
         except Exception as e:
             print(f"[AnalyticsOrchestrator] Synthesis failed: {e}")
@@ -0,0 +1,57 @@
+# agents/async_runtime.py
+import asyncio
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+
+logger = logging.getLogger("async_runtime")
+
+
+class AsyncRuntime:
+    """
+    One long-lived event loop on a background thread, shared by the whole process.
+    Sync code (Flask handlers) hands it coroutines with submit() and gets a
+    concurrent.futures.Future back, instead of paying for asyncio.run() per request.
+    Blocking SDK calls inside those coroutines should go through asyncio.to_thread(),
+    which uses this loop's executor (sized by `workers`).
+    """
+    def __init__(self, workers: int = 32, name: str = "async-runtime"):
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-io"))
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable) -> Future:
+        """Schedules coro on the background loop; safe to call from any thread."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncRuntime.submit() called from the runtime loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """Submits and waits for the result (re-raises the coroutine's exception)."""
+        return self.submit(coro).result(timeout=timeout)
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_runtime() -> AsyncRuntime:
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = AsyncRuntime(workers=Config.ASYNC_WORKERS)
+    return _runtime
@@ -0,0 +1,59 @@
+# agents/background_jobs.py
+import logging
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("background_jobs")
+
+
+class JobRegistry:
+    """
+    Runs long operations (e.g. cascade deletes) off the request thread.
+    The job function receives a `progress` callback; callers poll get(job_id).
+    Job state is in-process, so poll the same worker that started the job.
+    """
+    def __init__(self, max_workers: int = 2, keep: int = 200):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.keep = keep
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        job = {"id": job_id, "kind": kind, "status": "queued", "progress": {},
+               "result": None, "error": None, "created": time.time(), "finished": None}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim()
+
+        def progress(update: Dict):
+            with self._lock:
+                job["progress"] = dict(update)
+
+        def run():
+            job["status"] = "running"
+            try:
+                job["result"] = fn(*args, progress=progress, **kwargs)
+                job["status"] = "done"
+            except Exception as e:
+                logger.error(f"Job {kind}/{job_id} failed: {e}\n{traceback.format_exc()}")
+                job["error"] = str(e)
+                job["status"] = "failed"
+            job["finished"] = time.time()
+
+        self._executor.submit(run)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j["finished"]]
+        for job in sorted(finished, key=lambda j: j["finished"])[:max(0, len(self._jobs) - self.keep)]:
+            del self._jobs[job["id"]]
@@ -0,0 +1,155 @@
+# agents/blob_store.py
+import base64
+import hashlib
+import logging
+import os
+import re
+import sys
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+
+logger = logging.getLogger("blob_store")
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+def sniff_content_type(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "application/octet-stream"
+
+def decode_data_url(data_url: str) -> Optional[bytes]:
+    """'data:image/jpeg;base64,....' -> raw bytes (None if it isn't a base64 data URL)."""
+    match = re.match(r"^data:[^;,]*;base64,", data_url or "")
+    if not match:
+        return None
+    return base64.b64decode(data_url[match.end():])
+
+
+class BlobStore(ABC):
+    """
+    Content-addressed, immutable blob storage. Blobs are keyed by the SHA-256 of
+    their bytes, so identical uploads are stored once and URLs can be cached forever.
+    """
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        ...
+
+    @abstractmethod
+    def get(self, digest: str, start: Optional[int] = None, end: Optional[int] = None) -> Optional[bytes]:
+        """Blob bytes, or only data[start:end] for a ranged read (None if the blob doesn't exist)."""
+
+    @abstractmethod
+    def info(self, digest: str) -> Optional[Tuple[int, str]]:
+        """(size, content type) without downloading the blob (None if it doesn't exist)."""
+
+    def local_path(self, digest: str) -> Optional[str]:
+        """Filesystem path if the backend has one (lets the server stream/range directly)."""
+        return None
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def url(digest: str) -> str:
+        return f"/blobs/{digest}"
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        digest = self.digest(data)
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest  # Deduplicated
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str, start: Optional[int] = None, end: Optional[int] = None) -> Optional[bytes]:
+        path = self.local_path(digest)
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            f.seek(start or 0)
+            return f.read() if end is None else f.read(max(0, end - (start or 0)))
+
+    def info(self, digest: str) -> Optional[Tuple[int, str]]:
+        path = self.local_path(digest)
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            return os.fstat(f.fileno()).st_size, sniff_content_type(f.read(16))
+
+    def local_path(self, digest: str) -> Optional[str]:
+        path = self._path(digest)
+        return path if os.path.exists(path) else None
+
+
+class GCSBlobStore(BlobStore):
+    def __init__(self, bucket: str, prefix: str = "blobs/"):
+        from google.cloud import storage
+        self.bucket = storage.Client().bucket(bucket)
+        self.prefix = prefix
+
+    def put(self, data: bytes) -> str:
+        digest = self.digest(data)
+        blob = self.bucket.blob(self.prefix + digest)
+        if not blob.exists():
+            blob.cache_control = "public, max-age=31536000, immutable"
+            blob.upload_from_string(data, content_type=sniff_content_type(data))
+        return digest
+
+    def get(self, digest: str, start: Optional[int] = None, end: Optional[int] = None) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+        blob = self.bucket.blob(self.prefix + digest)
+        if end is not None and end <= (start or 0):
+            return b"" if blob.exists() else None
+        try:
+            # GCS ranges are inclusive; only the requested bytes leave the bucket
+            return blob.download_as_bytes(start=start, end=None if end is None else end - 1)
+        except NotFound:
+            return None
+
+    def info(self, digest: str) -> Optional[Tuple[int, str]]:
+        blob = self.bucket.get_blob(self.prefix + digest)
+        if blob is None:
+            return None
+        return blob.size, blob.content_type or "application/octet-stream"
+
+
+_store = None
+
+def get_blob_store() -> BlobStore:
+    global _store
+    if _store is None:
+        if Config.BLOB_BACKEND == "gcs":
+            if not Config.GCS_BUCKET:
+                raise RuntimeError("BLOB_BACKEND=gcs requires GCS_BUCKET (on Cloud Run, images must not go to the "
+                                   "instance's local disk; set BLOB_BACKEND=local only for a single-instance setup)")
+            _store = GCSBlobStore(Config.GCS_BUCKET)
+        else:
+            if Config.IS_CLOUD_RUN:
+                logger.warning("Local blob store on Cloud Run is ephemeral; set GCS_BUCKET to persist images.")
+            _store = LocalBlobStore(Config.BLOB_DIR)
+    return _store
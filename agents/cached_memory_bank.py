@@ -0,0 +1,219 @@
+# agents/cached_memory_bank.py
+import copy
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger("cached_memory_bank")
+
+# Event hub topic for invalidations: {"origin", "items": [[namespace, key or None], ...]}
+INVALIDATE_TOPIC = "cache_invalidate"
+_MISSING = object()
+
+
+class CachePolicy:
+    def __init__(self, ttl_seconds: float, max_entries: int, negative_ttl_seconds: float = 0):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # None / [] results ("unknown phone") are kept this long; 0 disables negative caching
+        self.negative_ttl_seconds = negative_ttl_seconds
+
+
+DEFAULT_POLICIES = {
+    "customer": CachePolicy(ttl_seconds=300, max_entries=10000, negative_ttl_seconds=30),
+    "redeems": CachePolicy(ttl_seconds=120, max_entries=10000, negative_ttl_seconds=30),
+    "redeem": CachePolicy(ttl_seconds=300, max_entries=10000, negative_ttl_seconds=30),
+    "fabric": CachePolicy(ttl_seconds=3600, max_entries=5000, negative_ttl_seconds=300),
+}
+
+# Used unless the event relay reaches every writer (Config.READ_CACHE_SHARED_RELAY). A code
+# redeemed or issued by another service/instance is never invalidated here, so redeem
+# state and "not found" results may only be a few seconds stale
+LOCAL_RELAY_POLICIES = {
+    "customer": CachePolicy(ttl_seconds=300, max_entries=10000, negative_ttl_seconds=3),
+    "redeems": CachePolicy(ttl_seconds=5, max_entries=10000, negative_ttl_seconds=3),
+    "redeem": CachePolicy(ttl_seconds=5, max_entries=10000, negative_ttl_seconds=3),
+    "fabric": CachePolicy(ttl_seconds=3600, max_entries=5000, negative_ttl_seconds=3),
+}
+
+
+class TTLCache:
+    """LRU of at most policy.max_entries, each entry expiring after its TTL."""
+    def __init__(self, policy: CachePolicy):
+        self.policy = policy
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a load that raced with one must not be stored
+        self.generation = 0
+        self.hits = self.negative_hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if not entry[0]:
+                self.negative_hits += 1
+            return entry[0]
+
+    def put(self, key, value, generation: int):
+        ttl = self.policy.ttl_seconds if value else self.policy.negative_ttl_seconds
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.policy.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drops one key, or everything when key is None."""
+        with self._lock:
+            self.generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "negative_hits": self.negative_hits, "misses": self.misses,
+                    "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                    "entries": len(self._entries)}
+
+
+class CachedMemoryBank:
+    """
+    Read-through cache in front of a MemoryBank for lookups that are read far more
+    often than written: get_customer, get_redeems_by_phone, get_redeem, get_fabric.
+    Every other attribute is passed through to the wrapped bank.
+
+    - Per-namespace TTL/LRU policies, with negative caching of None / [] results
+      (e.g. unknown phones polling for offers).
+    - The save/update/delete methods drop the affected entries after the write and
+      broadcast the invalidation on the event hub, so other workers drop them too.
+      With WRITE_BEHIND another worker may still re-read the old row before the
+      commit; the TTL bounds how long that can stick.
+    - The hub's relay is a local SQLite file: writes made by another host or service
+      (a separate business app container, another Cloud Run instance) are never
+      heard of. Unless shared_relay says the relay reaches every writer, the
+      LOCAL_RELAY_POLICIES apply, so only the TTL bounds staleness and it is seconds
+      for redeem codes and negative results. Customer profiles and fabric entries
+      keep their longer TTLs in both cases.
+    - Cached values are deep-copied on the way in and out; callers may mutate them.
+    """
+    @staticmethod
+    def policies_from_json(overrides: Dict, shared_relay: bool = False) -> Dict[str, CachePolicy]:
+        """{"customer": {"ttl_seconds": 60}} -> policies, unspecified fields from the defaults."""
+        defaults = DEFAULT_POLICIES if shared_relay else LOCAL_RELAY_POLICIES
+        return {name: CachePolicy(**{**vars(defaults.get(name, defaults["customer"])), **fields})
+                for name, fields in overrides.items()}
+
+    def __init__(self, base, policies: Optional[Dict[str, CachePolicy]] = None, hub=None,
+                 shared_relay: bool = False):
+        self.base = base
+        self.origin = uuid.uuid4().hex
+        defaults = DEFAULT_POLICIES if shared_relay else LOCAL_RELAY_POLICIES
+        self.caches = {name: TTLCache(policy) for name, policy in {**defaults, **(policies or {})}.items()}
+        self.hub = hub if hub is not None else base.events
+        self._listener = None
+        if self.hub is not None:
+            q = self.hub.subscribe(INVALIDATE_TOPIC)
+            self._listener = threading.Thread(target=self._listen, args=(q,), name="cache-invalidate", daemon=True)
+            self._listener.start()
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined here: everything else is the base bank
+        return getattr(self.base, name)
+
+    def _read(self, namespace: str, key, load):
+        cache = self.caches[namespace]
+        generation = cache.generation
+        value = cache.get(key)
+        if value is _MISSING:
+            value = load()
+            cache.put(key, copy.deepcopy(value), generation)
+            return value
+        return copy.deepcopy(value)
+
+    def _invalidate(self, items: Iterable[Tuple[str, Optional[str]]]):
+        items = [list(item) for item in items]
+        for namespace, key in items:
+            self.caches[namespace].invalidate(key)
+        if self.hub is not None:
+            try:
+                self.hub.publish(INVALIDATE_TOPIC, {"origin": self.origin, "items": items})
+            except Exception as e:
+                logger.warning(f"Cache invalidation publish failed: {e}")
+
+    def _listen(self, q):
+        while True:
+            event = q.get()
+            if event.get("origin") == self.origin:
+                continue
+            for namespace, key in event.get("items", ()):
+                if namespace in self.caches:
+                    self.caches[namespace].invalidate(key)
+
+    # --- Cached reads ---
+
+    def get_customer(self, phone: str) -> Optional[Dict]:
+        return self._read("customer", phone, lambda: self.base.get_customer(phone))
+
+    def get_redeems_by_phone(self, phone: str) -> list:
+        return self._read("redeems", phone, lambda: self.base.get_redeems_by_phone(phone))
+
+    def get_redeem(self, code: str) -> Optional[Dict]:
+        return self._read("redeem", code, lambda: self.base.get_redeem(code))
+
+    def get_fabric(self, key: str) -> Optional[Dict]:
+        return self._read("fabric", key, lambda: self.base.get_fabric(key))
+
+    # --- Writes that invalidate ---
+
+    def save_customer(self, phone: str, profile: Dict):
+        result = self.base.save_customer(phone, profile)
+        self._invalidate([("customer", phone)])
+        return result
+
+    def delete_customer(self, phone: str, progress=None) -> Dict:
+        result = self.base.delete_customer(phone, progress)
+        # The customer's codes aren't known here, so the per-code namespace is dropped whole
+        self._invalidate([("customer", phone), ("redeems", phone), ("redeem", None)])
+        return result
+
+    def save_fabric(self, key: str, data: Dict):
+        result = self.base.save_fabric(key, data)
+        self._invalidate([("fabric", key)])
+        return result
+
+    def save_redeem(self, code: str, phone: str, data: Dict):
+        result = self.base.save_redeem(code, phone, data)
+        self._invalidate([("redeem", code), ("redeems", phone)])
+        return result
+
+    def update_redeem_used(self, code: str, used: bool):
+        result = self.base.update_redeem_used(code, used)
+        # Which phone's list holds the code isn't known here, so drop all lists
+        self._invalidate([("redeem", code), ("redeems", None)])
+        return result
+
+    def save_offers_bulk(self, offers: list) -> list:
+        saved = self.base.save_offers_bulk(offers)
+        # One broadcast for the whole chunk; the codes are new but may be negatively cached
+        self._invalidate([item for code, phone, _, _ in saved for item in (("redeem", code), ("redeems", phone))])
+        return saved
+
+    def cache_stats(self) -> Dict:
+        return {name: cache.stats() for name, cache in self.caches.items()}
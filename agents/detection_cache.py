@@ -0,0 +1,165 @@
+# agents/detection_cache.py
+import copy
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+logger = logging.getLogger("detection_cache")
+
+HASH_SIZE = 8      # 8x8 low-frequency DCT block -> 64-bit hash
+DCT_SIZE = 32      # image is reduced to 32x32 grayscale first
+BAND_BITS = 16     # persistent tier indexes the hash as four 16-bit bands
+
+# DCT-II basis for the first HASH_SIZE frequencies; separable, so rows then columns
+_COS = [[math.cos(math.pi * k * (2 * n + 1) / (2 * DCT_SIZE)) for n in range(DCT_SIZE)]
+        for k in range(HASH_SIZE)]
+
+
+def phash(image) -> int:
+    """
+    64-bit perceptual hash of a PIL image: grayscale 32x32, 2D DCT, keep the
+    8x8 lowest frequencies and set a bit for each coefficient above the median.
+    Re-shoots and re-encodes of the same scene land within a few bits.
+    """
+    from PIL import Image
+    small = image.convert("L").resize((DCT_SIZE, DCT_SIZE), Image.BILINEAR)
+    pixels = list(small.getdata())
+    rows = [pixels[r * DCT_SIZE:(r + 1) * DCT_SIZE] for r in range(DCT_SIZE)]
+
+    # 1D DCT along each row, keeping only the low frequencies we need
+    row_freq = [[sum(x * c for x, c in zip(row, basis)) for basis in _COS] for row in rows]
+    # ...then down each column of that result
+    coeffs = [sum(_COS[k][r] * row_freq[r][l] for r in range(DCT_SIZE))
+              for k in range(HASH_SIZE) for l in range(HASH_SIZE)]
+
+    # The DC term is overall brightness; leave it out of the median
+    median = sorted(coeffs[1:])[len(coeffs[1:]) // 2]
+    value = 0
+    for c in coeffs:
+        value = (value << 1) | (1 if c > median else 0)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _bands(value: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (i * BAND_BITS)) & mask for i in range(64 // BAND_BITS)]
+
+
+def _to_signed(value: int) -> int:
+    # SQLite INTEGER is signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class DetectionCache:
+    """
+    Maps perceptual hashes of intake photos to the vision model's detections, so
+    a re-shot or re-submitted pile returns cached items instead of another model call.
+
+    - Memory tier: LRU of max_entries with a TTL; lookups match any hash within
+      `threshold` bits (exact hash first, then a linear Hamming scan).
+    - Persistent tier (optional, db_path): SQLite table shared across workers and
+      restarts. Candidates are found through the four indexed 16-bit bands, which
+      guarantees a match for distances up to 3 and finds most beyond that.
+    """
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 86400, threshold: int = 6,
+                 db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._entries = OrderedDict()  # hash -> (items, created)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.persistent_hits = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS detection_cache (
+                    phash INTEGER PRIMARY KEY, items TEXT, created REAL,
+                    b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER)
+            """)
+            for i in range(4):
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_detection_cache_b{i} ON detection_cache (b{i})")
+            self._db.commit()
+
+    def get(self, key: int) -> Optional[List[dict]]:
+        now = time.time()
+        with self._lock:
+            items = self._get_memory(key, now)
+            if items is None and self._db is not None:
+                items = self._get_persistent(key, now)
+                if items is not None:
+                    self.persistent_hits += 1
+                    self._remember(key, items, now)
+            if items is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(items)
+
+    def put(self, key: int, items: List[dict]):
+        now = time.time()
+        items = copy.deepcopy(items)
+        with self._lock:
+            self._remember(key, items, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO detection_cache (phash, items, created, b0, b1, b2, b3) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (_to_signed(key), json.dumps(items), now, *_bands(key))
+                )
+                self._db.execute("DELETE FROM detection_cache WHERE created < ?", (now - self.ttl_seconds,))
+                self._db.commit()
+
+    def _remember(self, key: int, items: List[dict], created: float):
+        self._entries[key] = (items, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_memory(self, key: int, now: float) -> Optional[List[dict]]:
+        candidates = [key] if key in self._entries else []
+        if not candidates and self.threshold > 0:
+            candidates = sorted((k for k in self._entries if hamming(k, key) <= self.threshold),
+                                key=lambda k: hamming(k, key))
+        for k in candidates:
+            items, created = self._entries[k]
+            if now - created > self.ttl_seconds:
+                del self._entries[k]
+                continue
+            self._entries.move_to_end(k)
+            return items
+        return None
+
+    def _get_persistent(self, key: int, now: float) -> Optional[List[dict]]:
+        bands = _bands(key)
+        rows = self._db.execute(
+            "SELECT phash, items FROM detection_cache WHERE created >= ? AND (b0 = ? OR b1 = ? OR b2 = ? OR b3 = ?)",
+            (now - self.ttl_seconds, *bands)
+        ).fetchall()
+        best = None
+        for stored, items in rows:
+            distance = hamming(stored & ((1 << 64) - 1), key)
+            if distance <= self.threshold and (best is None or distance < best[0]):
+                best = (distance, items)
+        return json.loads(best[1]) if best else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "persistent_hits": self.persistent_hits,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+            }
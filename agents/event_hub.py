@@ -0,0 +1,177 @@
+# agents/event_hub.py
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+
+logger = logging.getLogger("event_hub")
+
+
+class SQLiteRelay:
+    """
+    Local stand-in for a real broker (Redis / Cloud Pub/Sub).
+    Every process appends events to a shared SQLite file and a single tail
+    thread per process picks up rows written by other processes, so all
+    gunicorn workers (and both apps) see the same stream.
+    """
+    def __init__(self, path: str, poll_interval: float = 0.2, retention: float = 300):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT, topic TEXT, payload TEXT, ts REAL)")
+        self._conn.commit()
+        self._thread = None
+        self._on_event = None
+        self._last_prune = 0.0
+
+    def send(self, origin: str, topic: str, event: Dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT INTO events (origin, topic, payload, ts) VALUES (?, ?, ?, ?)",
+                               (origin, topic, json.dumps(event), now))
+            if now - self._last_prune > self.retention:
+                self._conn.execute("DELETE FROM events WHERE ts < ?", (now - self.retention,))
+                self._last_prune = now
+            self._conn.commit()
+
+    def send_many(self, origin: str, items: list):
+        """Appends many (topic, event) pairs in one commit."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("INSERT INTO events (origin, topic, payload, ts) VALUES (?, ?, ?, ?)",
+                                   [(origin, topic, json.dumps(event), now) for topic, event in items])
+            self._conn.commit()
+
+    def start(self, on_event):
+        """Starts the tail thread (idempotent). on_event(origin, topic, event)."""
+        self._on_event = on_event
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._tail, name="event-relay", daemon=True)
+        self._thread.start()
+
+    def _tail(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                rows = conn.execute("SELECT id, origin, topic, payload FROM events WHERE id > ? ORDER BY id",
+                                    (last_id,)).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Event relay read failed: {e}")
+                continue
+            for row_id, origin, topic, payload in rows:
+                last_id = row_id
+                try:
+                    self._on_event(origin, topic, json.loads(payload))
+                except Exception as e:
+                    logger.error(f"Event relay delivery failed: {e}")
+
+
+class EventHub:
+    """
+    In-process pub/sub. Each subscriber gets its own bounded queue for a topic
+    (e.g. "customer:<phone>"); a slow subscriber drops its oldest events rather
+    than blocking publishers.
+    """
+    def __init__(self, relay: Optional[SQLiteRelay] = None, queue_size: int = 100):
+        self.origin = uuid.uuid4().hex
+        self.relay = relay
+        self.queue_size = queue_size
+        self._subs = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str) -> queue.Queue:
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subs.setdefault(topic, set()).add(q)
+        # Only tail the relay once somebody in this process is listening
+        if self.relay:
+            self.relay.start(self._on_relay_event)
+        return q
+
+    def unsubscribe(self, topic: str, q: queue.Queue):
+        with self._lock:
+            subs = self._subs.get(topic)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self._subs[topic]
+
+    def publish(self, topic: str, event: Dict):
+        event = dict(event)
+        event.setdefault("ts", time.time())
+        self._deliver(topic, event)
+        if self.relay:
+            try:
+                self.relay.send(self.origin, topic, event)
+            except Exception as e:
+                logger.warning(f"Event relay publish failed: {e}")
+
+    def publish_many(self, items: list):
+        """publish() for many (topic, event) pairs; the relay gets them in a single write."""
+        now = time.time()
+        items = [(topic, {"ts": now, **event}) for topic, event in items]
+        for topic, event in items:
+            self._deliver(topic, event)
+        if self.relay and items:
+            try:
+                self.relay.send_many(self.origin, items)
+            except Exception as e:
+                logger.warning(f"Event relay publish failed: {e}")
+
+    def subscriber_count(self, topic: str) -> int:
+        with self._lock:
+            return len(self._subs.get(topic, ()))
+
+    def _on_relay_event(self, origin: str, topic: str, event: Dict):
+        # Our own events were already delivered locally in publish()
+        if origin != self.origin:
+            self._deliver(topic, event)
+
+    def _deliver(self, topic: str, event: Dict):
+        with self._lock:
+            subs = list(self._subs.get(topic, ()))
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    q.put_nowait(event)
+                except (queue.Empty, queue.Full):
+                    pass
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+def get_hub() -> EventHub:
+    """Process-wide hub, configured from Config.EVENT_RELAY."""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            relay = None
+            if Config.EVENT_RELAY == "sqlite":
+                try:
+                    relay = SQLiteRelay(Config.EVENT_RELAY_DB)
+                except sqlite3.Error as e:
+                    logger.error(f"Event relay unavailable, using in-process hub only: {e}")
+            _hub = EventHub(relay)
+        return _hub
+
+def customer_topic(phone: str) -> str:
+    return f"customer:{phone}"
@@ -1,13 +1,20 @@
 # agents/hitl_agent.py
-import time, logging
-
-logger = logging.getLogger("hitl_agent")
-
-# agents/hitl_agent.py
+import asyncio
+import logging
+import os
+import sys
 
 from google.adk import Agent, AgentConfig
 from google.adk.tools import ToolContext
-import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+from agents.async_runtime import get_runtime
+
+logger = logging.getLogger("hitl_agent")
+
+# Order status applied once the human has decided
+DECISION_STATUS = {"approved": "Pending", "rejected": "Rejected"}
 
 class HITLAgent(Agent):
     def __init__(self, session_service):
@@ -21,19 +28,46 @@ class HITLAgent(Agent):
                 """,
             )
         )
+        # MemoryBank: create_task / get_task / complete_task / wait_for_task
         self.session = session_service
 
     async def handle(self, ctx: ToolContext):
+        """
+        Opens an approval task for the order and suspends until a human decides
+        or the task expires. Waiting costs no CPU and no request thread.
+        With resume=True the existing task is awaited instead (e.g. after a restart).
+        """
         order_id = ctx.inputs["order_id"]
-        overlay_url = ctx.inputs.get("overlay", "")
-
-        self.session.create_task(order_id, {"status": "waiting", "overlay": overlay_url})
-
-        # Pause/resume pattern from ADK docs
-        while True:
-            task = self.session.get_task(order_id)
-            if not task: return {"status": "error", "message": "Task lost"}
-            
-            if task.get("status") != "waiting":
-                return task
-        return self.session.get_task(order_id)
+        if not ctx.inputs.get("resume"):
+            data = {"overlay": ctx.inputs.get("overlay", ""), "reason": ctx.inputs.get("reason", "")}
+            timeout = ctx.inputs.get("timeout", Config.APPROVAL_TIMEOUT_SECONDS)
+            await asyncio.to_thread(self.session.create_task, order_id, data, timeout)
+
+        task = await self.session.wait_for_task(order_id)
+        if not task:
+            return {"status": "error", "message": "Task lost"}
+        return task
+
+    async def review_order(self, order_id: str, overlay: str = "", reason: str = "", resume: bool = False):
+        """Waits for the decision on a "Needs Approval" order, then moves the order on."""
+        task = await self.handle(ToolContext({"order_id": order_id, "overlay": overlay,
+                                              "reason": reason, "resume": resume}))
+        status = DECISION_STATUS.get(task.get("status"))
+        if status:
+            await asyncio.to_thread(self.session.update_order_status, order_id, status)
+        elif task.get("status") == "expired":
+            logger.warning(f"Approval for {order_id} expired; order stays in Needs Approval")
+        return task
+
+    def submit_review(self, order_id: str, overlay: str = "", reason: str = ""):
+        """Starts review_order on the background loop; returns a concurrent Future."""
+        return get_runtime().submit(self.review_order(order_id, overlay, reason))
+
+    def resume_pending(self) -> int:
+        """Re-attaches waiters to the persisted pending tasks (call once at startup)."""
+        tasks = self.session.list_pending_tasks(limit=10**6)
+        for task in tasks:
+            get_runtime().submit(self.review_order(task["order_id"], resume=True))
+        if tasks:
+            logger.info(f"Resumed {len(tasks)} pending approval tasks")
+        return len(tasks)
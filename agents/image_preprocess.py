@@ -0,0 +1,46 @@
+# agents/image_preprocess.py
+import io
+import logging
+from typing import Tuple
+
+logger = logging.getLogger("image_preprocess")
+
+
+def prepare_image(data: bytes, max_side: int = 1024, quality: int = 85, fmt: str = "JPEG") -> Tuple[object, bytes]:
+    """
+    Turns a raw upload (often a 4-12 MB phone photo) into what the vision model
+    actually needs: upright, at most max_side pixels on the long edge, re-encoded
+    compactly. Returns (PIL image, encoded bytes).
+
+    For JPEGs, draft() makes the decoder produce a 1/2, 1/4 or 1/8 scale image
+    directly, so the full-resolution bitmap is never held in memory.
+    """
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    if (image.format == fmt.upper() and max(image.size) <= max_side
+            and image.getexif().get(0x0112, 1) == 1 and image.mode == "RGB"):
+        # Already prepared (e.g. by the intake endpoint); don't re-encode again
+        image.load()
+        return image, data
+    if image.format == "JPEG":
+        # Square box: the EXIF rotation below may swap width and height
+        image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    out = io.BytesIO()
+    if fmt.upper() == "WEBP":
+        image.save(out, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(out, format="JPEG", quality=quality, optimize=True)
+    encoded = out.getvalue()
+    logger.info(f"Preprocessed image {original_size} {len(data)} B -> {image.size} {len(encoded)} B")
+    return image, encoded
+
+
+def mime_type(fmt: str) -> str:
+    return "image/webp" if fmt.upper() == "WEBP" else "image/jpeg"
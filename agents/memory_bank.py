@@ -1,12 +1,23 @@
 # agents/memory_bank.py
-import sqlite3
+import atexit
 import json
 import os
 import logging
+import threading
+import re
+import base64
+import asyncio
 from typing import Optional, Dict
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config import Config
+from agents.event_hub import get_hub, customer_topic
+from agents.migrations import migrate
+from agents.rollups import GRANULARITIES, MAX_BUCKETS, bucket_start, rollup_deltas, to_series
+from agents.task_waiters import TASKS_TOPIC, TaskWaiters
+from agents.sqlite_pool import SQLitePool
+from agents.write_behind import PendingWrites, FirestoreBatcher
+from contextlib import closing
 
 logger = logging.getLogger("memory_bank")
 
@@ -16,8 +27,83 @@ if os.environ.get('K_SERVICE'):
 
 USE_CLOUD_SQL = os.getenv("USE_CLOUD_SQL", "False") == "True"
 
+# Firestore document holding the materialized analytics counters
+AGGREGATES_DOC = ('analytics', 'aggregates')
+# Counter stored alongside the aggregates; grows on every order/feedback write
+DATA_VERSION = ('meta', 'data_version')
+# Statuses that end processing; the first one an order enters marks its turnaround
+COMPLETED_STATUSES = ('Ready', 'Finished', 'Delivered')
+
+def _percentiles(values: list, points=(50, 90, 95)) -> Dict:
+    """Nearest-rank percentiles plus count/avg of a list of numbers."""
+    values = sorted(values)
+    result = {"count": len(values), "avg": sum(values) / len(values) if values else 0.0}
+    for p in points:
+        result[f"p{p}"] = values[max(0, -(-p * len(values) // 100) - 1)] if values else 0.0
+    return result
+
+def _item_category(label) -> str:
+    # Simple extraction: "Blue Shirt" -> "Shirt"
+    parts = str(label or 'Unknown').split()
+    return parts[-1] if parts else 'Unknown'
+
+def _order_deltas(status: str, data: Dict, sign: int = 1) -> Dict:
+    """Counter contributions of a single order, keyed by (metric, dim)."""
+    deltas = {
+        ('orders', 'total'): sign,
+        ('revenue', 'total'): sign * float(data.get('total') or 0),
+        ('status', status or 'Pending'): sign,
+    }
+    for item in data.get('items') or []:
+        key = ('category', _item_category(item.get('label', 'Unknown')))
+        deltas[key] = deltas.get(key, 0) + sign
+    return deltas
+
+def _feedback_deltas(rating, sign: int = 1) -> Dict:
+    try:
+        rating = int(rating)
+    except (TypeError, ValueError):
+        return {}
+    deltas = {('reviews', 'total'): sign, ('rating_sum', 'total'): sign * rating}
+    if 1 <= rating <= 5:
+        deltas[('rating', str(rating))] = sign
+    return deltas
+
+# Order fields stored as real SQLite columns; anything else is projected out of the JSON blob
+ORDER_COLUMNS = ('id', 'phone', 'status', 'timestamp', 'total', 'item_count')
+FIELD_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def encode_cursor(ts: float, key: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([ts, key]).encode()).decode()
+
+def decode_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    try:
+        ts, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(ts), str(key)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _merge_deltas(target: Dict, src: Dict) -> Dict:
+    for key, value in src.items():
+        target[key] = target.get(key, 0) + value
+    return target
+
+def _active_offer_deltas(prev, phone: str, used: bool) -> Dict:
+    """Per-phone change in unused redeem codes when a code (previously (phone, used) or None) is saved."""
+    deltas = {phone: 0 if used else 1}
+    if prev and not prev[1]:
+        deltas[prev[0]] = deltas.get(prev[0], 0) - 1
+    return deltas
+
 class MemoryBank:
-    def __init__(self, path=DB_FILE):
+    def __init__(self, path=DB_FILE, events=None):
+        self.events = events or get_hub()
+        self.task_waiters = TaskWaiters(self.events)
+        self.write_behind = Config.WRITE_BEHIND
+        self.pending = PendingWrites()
+        self.batcher = None
         self.use_cloud = Config.USE_FIRESTORE
         if self.use_cloud:
             logger.info("Connecting to Google Firestore...")
@@ -25,48 +111,331 @@ class MemoryBank:
                 from google.cloud import firestore
                 self.db = firestore.Client()
                 logger.info("Firestore connected.")
+                if self.write_behind:
+                    self.batcher = FirestoreBatcher(self.db, Config.WRITE_BATCH_MAX_OPS, Config.WRITE_BATCH_MAX_DELAY_MS)
             except Exception as e:
                 logger.error(f"Failed to connect to Firestore: {e}")
                 # Fallback to SQLite if Firestore fails (e.g. local without creds)
                 self.use_cloud = False
         
         if not self.use_cloud:
-            self.conn = sqlite3.connect(path, check_same_thread=False)
-            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.pool = SQLitePool(
+                path,
+                journal_mode=Config.SQLITE_JOURNAL_MODE,
+                synchronous=Config.SQLITE_SYNCHRONOUS,
+                busy_timeout_ms=Config.SQLITE_BUSY_TIMEOUT_MS,
+                queue_size=Config.SQLITE_WRITE_QUEUE_SIZE,
+                batch_max_ops=Config.WRITE_BATCH_MAX_OPS,
+                batch_max_delay_ms=Config.WRITE_BATCH_MAX_DELAY_MS if self.write_behind else 0,
+            )
             self._init_tables()
 
     def _init_tables(self):
         if self.use_cloud: return
-        cur = self.conn.cursor()
-        cur.execute("CREATE TABLE IF NOT EXISTS customers (phone TEXT PRIMARY KEY, data TEXT)")
-        cur.execute("CREATE TABLE IF NOT EXISTS fabric_kb (fabric_key TEXT PRIMARY KEY, data TEXT)")
-        cur.execute("CREATE TABLE IF NOT EXISTS redeem_codes (code TEXT PRIMARY KEY, phone TEXT, data TEXT)")
-        cur.execute("CREATE TABLE IF NOT EXISTS orders (id TEXT PRIMARY KEY, phone TEXT, status TEXT, data TEXT, timestamp REAL)")
-        cur.execute("CREATE TABLE IF NOT EXISTS feedback (id TEXT PRIMARY KEY, order_id TEXT, rating INTEGER, comment TEXT, timestamp REAL)")
-        self.conn.commit()
+        with closing(self.pool.connect()) as conn:
+            migrate(conn)
+        cur = self._reader()
+
+        # One-time backfill for databases created before aggregates existed
+        cur.execute("SELECT 1 FROM aggregates LIMIT 1")
+        if not cur.fetchone():
+            self.rebuild_aggregates()
+        # ...and before rollups existed
+        cur.execute("SELECT 1 FROM rollups LIMIT 1")
+        if not cur.fetchone() and cur.execute("SELECT 1 FROM orders LIMIT 1").fetchone():
+            self.rebuild_rollups()
+
+    def _reader(self):
+        # Thread-local read connection; all writes go through self.pool.write()
+        return self.pool.reader().cursor()
+
+    # --- Write path ---
+    # Writes are group-committed (one SQLite transaction / one Firestore WriteBatch).
+    # With Config.WRITE_BEHIND the caller returns before the commit; reads that
+    # touch one of the write's keys wait for it first (read-your-writes).
+
+    def _sql_write(self, fn, keys=(), on_commit=None):
+        return self._finish_write(self.pool.write(fn, wait=False), keys, on_commit)
+
+    def _fs_write(self, apply, keys=(), on_commit=None):
+        if not self.batcher:
+            batch = self.db.batch()
+            apply(batch)
+            batch.commit()
+            if on_commit:
+                on_commit(None)
+            return None
+        return self._finish_write(self.batcher.submit(apply), keys, on_commit)
+
+    def _finish_write(self, future, keys, on_commit):
+        if not self.write_behind:
+            result = future.result()
+            if on_commit:
+                on_commit(result)
+            return result
+        self.pending.track(future, keys)
+        if on_commit:
+            future.add_done_callback(lambda f: f.exception() is None and on_commit(f.result()))
+        return None
+
+    def _barrier(self, *keys):
+        if self.write_behind:
+            self.pending.wait(*keys)
+
+    def flush(self):
+        """Blocks until every queued write-behind write is committed."""
+        self._barrier()
+
+    def close(self):
+        """Flushes pending writes and stops the SQLite writer thread. Shared instances are closed at exit."""
+        self.flush()
+        if not self.use_cloud:
+            self.pool.close()
+
+    def _publish(self, phone: str, event: Dict):
+        # Push is best-effort: a failed publish must never fail the write
+        if not phone:
+            return
+        try:
+            self.events.publish(customer_topic(phone), event)
+        except Exception as e:
+            logger.warning(f"Event publish failed: {e}")
+
+    # --- Materialized analytics aggregates ---
+    # Counters are stored as (metric, dim) -> value, e.g. ('status', 'Pending') -> 3.
+    # Every write path applies its delta in the same commit/batch as the row itself.
+
+    def _apply_deltas(self, cur, deltas: Dict):
+        # Every order/feedback write also bumps the data version (cache invalidation)
+        cur.executemany(
+            "INSERT INTO aggregates (metric, dim, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(metric, dim) DO UPDATE SET value = value + excluded.value",
+            [(m, d, v) for (m, d), v in deltas.items() if v] + [DATA_VERSION + (1,)]
+        )
+
+    def _sqlite_order_deltas(self, cur, where: str, params: tuple, sign: int = 1) -> Dict:
+        """Same as _order_deltas, but computed in SQL over the matching order rows."""
+        deltas = {}
+        cur.execute(f"SELECT status, COUNT(*), SUM(total) FROM orders WHERE {where} GROUP BY status", params)
+        for status, count, total in cur.fetchall():
+            _merge_deltas(deltas, {('orders', 'total'): sign * count, ('revenue', 'total'): sign * (total or 0),
+                                   ('status', status or 'Pending'): sign * count})
+        cur.execute(
+            "SELECT json_extract(j.value, '$.label') FROM orders, json_each(orders.data, '$.items') j "
+            f"WHERE {where} AND j.type = 'object'", params
+        )
+        for (label,) in cur.fetchall():
+            _merge_deltas(deltas, {('category', _item_category(label or 'Unknown')): sign})
+        return deltas
+
+    def _apply_rollups(self, cur, rdeltas: Dict):
+        cur.executemany(
+            "INSERT INTO rollups (granularity, bucket, metric, dim, value) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(granularity, bucket, metric, dim) DO UPDATE SET value = value + excluded.value",
+            [key + (v,) for key, v in rdeltas.items() if v]
+        )
+
+    def _sqlite_order_rollups(self, cur, where: str, params: tuple, sign: int = 1) -> Dict:
+        """Rollup deltas of the matching order rows, each in the buckets of its own timestamp."""
+        rdeltas = {}
+        for granularity, size in GRANULARITIES.items():
+            cur.execute(
+                f"SELECT CAST(timestamp / {size} AS INTEGER) * {size} AS bucket, status, COUNT(*), SUM(total) "
+                f"FROM orders WHERE {where} AND timestamp IS NOT NULL GROUP BY bucket, status", params
+            )
+            for bucket, status, count, total in cur.fetchall():
+                _merge_deltas(rdeltas, {(granularity, bucket, 'orders', 'total'): sign * count,
+                                        (granularity, bucket, 'revenue', 'total'): sign * (total or 0),
+                                        (granularity, bucket, 'status', status or 'Pending'): sign * count})
+        cur.execute(
+            "SELECT orders.timestamp, json_extract(j.value, '$.label') FROM orders, json_each(orders.data, '$.items') j "
+            f"WHERE {where} AND j.type = 'object' AND orders.timestamp IS NOT NULL", params
+        )
+        for ts, label in cur.fetchall():
+            _merge_deltas(rdeltas, rollup_deltas({('category', _item_category(label or 'Unknown')): sign}, ts))
+        return rdeltas
+
+    def _firestore_rollups(self, batch, rdeltas: Dict):
+        """Adds rollup increments to a batch: one merged set per touched bucket document."""
+        from google.cloud import firestore
+        docs = {}
+        for (granularity, bucket, metric, dim), value in rdeltas.items():
+            if value:
+                doc = docs.setdefault((granularity, bucket), {"granularity": granularity, "bucket": bucket})
+                doc.setdefault(metric, {})[dim] = firestore.Increment(value)
+        for (granularity, bucket), doc in docs.items():
+            batch.set(self._rollup_ref(granularity, bucket), doc, merge=True)
+
+    def _rollup_ref(self, granularity: str, bucket: int):
+        return self.db.collection('rollups').document(f"{granularity}_{bucket}")
+
+    def _firestore_increments(self, deltas: Dict) -> Dict:
+        from google.cloud import firestore
+        doc = {DATA_VERSION[0]: {DATA_VERSION[1]: firestore.Increment(1)}}
+        for (metric, dim), value in deltas.items():
+            if value:
+                doc.setdefault(metric, {})[dim] = firestore.Increment(value)
+        return doc
+
+    def _aggregates_ref(self):
+        return self.db.collection(AGGREGATES_DOC[0]).document(AGGREGATES_DOC[1])
+
+    def get_aggregates(self) -> Dict:
+        """Returns the materialized counters as {metric: {dim: value}}."""
+        self._barrier()
+        if self.use_cloud:
+            doc = self._aggregates_ref().get()
+            if not doc.exists:
+                return self.rebuild_aggregates()
+            return doc.to_dict()
+        cur = self._reader()
+        cur.execute("SELECT metric, dim, value FROM aggregates")
+        result = {}
+        for metric, dim, value in cur.fetchall():
+            result.setdefault(metric, {})[dim] = value
+        return result
+
+    def get_data_version(self) -> int:
+        """Counter bumped by every order/feedback write; cheap to poll for cache validation."""
+        self._barrier()
+        if self.use_cloud:
+            doc = self._aggregates_ref().get()
+            meta = (doc.to_dict() or {}).get(DATA_VERSION[0], {}) if doc.exists else {}
+            return int(meta.get(DATA_VERSION[1], 0))
+        row = self._reader().execute("SELECT value FROM aggregates WHERE metric = ? AND dim = ?", DATA_VERSION).fetchone()
+        return int(row[0]) if row else 0
+
+    def rebuild_aggregates(self) -> Dict:
+        """Recomputes all counters from a full scan. Only needed for backfill/repair."""
+        self._barrier()
+        deltas = {}
+        if self.use_cloud:
+            for d in self.db.collection('orders').stream():
+                dd = d.to_dict()
+                _merge_deltas(deltas, _order_deltas(dd.get('status'), dd.get('data', {})))
+            for d in self.db.collection('feedback').stream():
+                _merge_deltas(deltas, _feedback_deltas(d.to_dict().get('rating')))
+            doc = {}
+            for (metric, dim), value in deltas.items():
+                doc.setdefault(metric, {})[dim] = value
+            # Keep the version growing across the rebuild so caches see a change
+            current = self._aggregates_ref().get()
+            version = ((current.to_dict() or {}).get(DATA_VERSION[0], {}).get(DATA_VERSION[1], 0)
+                       if current.exists else 0)
+            doc[DATA_VERSION[0]] = {DATA_VERSION[1]: version + 1}
+            self._aggregates_ref().set(doc)
+            return doc
+
+        def _rebuild(cur):
+            _merge_deltas(deltas, self._sqlite_order_deltas(cur, "1 = 1", ()))
+            for rating, count in cur.execute("SELECT rating, COUNT(*) FROM feedback GROUP BY rating").fetchall():
+                _merge_deltas(deltas, {k: v * count for k, v in _feedback_deltas(rating).items()})
+            cur.execute("DELETE FROM aggregates WHERE metric != ?", (DATA_VERSION[0],))
+            self._apply_deltas(cur, deltas)
+        self.pool.write(_rebuild)
+        return self.get_aggregates()
+
+    def rebuild_rollups(self) -> int:
+        """Recomputes every hour/day bucket from order and feedback history. Returns the bucket row count."""
+        self._barrier()
+        if self.use_cloud:
+            rdeltas = {}
+            for d in self.db.collection('orders').stream():
+                dd = d.to_dict()
+                _merge_deltas(rdeltas, rollup_deltas(_order_deltas(dd.get('status'), dd.get('data', {})), dd.get('timestamp')))
+            for d in self.db.collection('feedback').stream():
+                dd = d.to_dict()
+                _merge_deltas(rdeltas, rollup_deltas(_feedback_deltas(dd.get('rating')), dd.get('timestamp')))
+            docs = {}
+            for (granularity, bucket, metric, dim), value in rdeltas.items():
+                if value:
+                    doc = docs.setdefault((granularity, bucket), {"granularity": granularity, "bucket": bucket})
+                    doc.setdefault(metric, {})[dim] = value
+            refs = [d.reference for d in self.db.collection('rollups').stream()]
+            ops = [('delete', ref, None) for ref in refs] + [('set', self._rollup_ref(*key), doc) for key, doc in docs.items()]
+            for i in range(0, len(ops), 500):
+                batch = self.db.batch()
+                for op, ref, doc in ops[i:i + 500]:
+                    if op == 'delete':
+                        batch.delete(ref)
+                    else:
+                        batch.set(ref, doc)
+                batch.commit()
+            return sum(1 for v in rdeltas.values() if v)
+
+        def _rebuild(cur):
+            rdeltas = self._sqlite_order_rollups(cur, "1 = 1", ())
+            for granularity, size in GRANULARITIES.items():
+                cur.execute(
+                    f"SELECT CAST(timestamp / {size} AS INTEGER) * {size} AS bucket, rating, COUNT(*) "
+                    "FROM feedback WHERE timestamp IS NOT NULL GROUP BY bucket, rating"
+                )
+                for bucket, rating, count in cur.fetchall():
+                    _merge_deltas(rdeltas, {(granularity, bucket, m, d): v * count
+                                            for (m, d), v in _feedback_deltas(rating).items()})
+            cur.execute("DELETE FROM rollups")
+            self._apply_rollups(cur, rdeltas)
+            return sum(1 for v in rdeltas.values() if v)
+        return self.pool.write(_rebuild)
+
+    def get_timeseries(self, granularity: str, t0: float, t1: float) -> list:
+        """
+        Per-bucket chart points for [t0, t1) from the rollups (see agents/rollups.py).
+        Raises ValueError for an unknown granularity or a range of more than MAX_BUCKETS buckets.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {sorted(GRANULARITIES)}")
+        if t1 <= t0:
+            raise ValueError("'to' must be after 'from'")
+        if (t1 - bucket_start(t0, granularity)) / GRANULARITIES[granularity] > MAX_BUCKETS:
+            raise ValueError(f"Range spans more than {MAX_BUCKETS} {granularity} buckets")
+        self._barrier()
+        start = bucket_start(t0, granularity)
+        if self.use_cloud:
+            docs = (self.db.collection('rollups').where('granularity', '==', granularity)
+                    .where('bucket', '>=', start).where('bucket', '<', t1).stream())
+            rows = []
+            for d in docs:
+                dd = d.to_dict()
+                for metric, dims in dd.items():
+                    if isinstance(dims, dict):
+                        rows.extend((dd['bucket'], metric, dim, value) for dim, value in dims.items())
+        else:
+            cur = self._reader()
+            cur.execute("SELECT bucket, metric, dim, value FROM rollups WHERE granularity = ? AND bucket >= ? AND bucket < ?",
+                        (granularity, start, t1))
+            rows = cur.fetchall()
+        return to_series(rows, granularity, t0, t1)
 
     def save_customer(self, phone: str, profile: Dict):
+        keys = (f"customer:{phone}",)
         if self.use_cloud:
-            self.db.collection('customers').document(phone).set(profile)
+            def _apply(batch):
+                batch.set(self.db.collection('customers').document(phone), profile)
+                self._firestore_active_offers(batch, {phone: 0})
+            self._fs_write(_apply, keys)
             return
-        cur = self.conn.cursor()
-        cur.execute("INSERT OR REPLACE INTO customers (phone, data) VALUES (?, ?)", (phone, json.dumps(profile)))
-        self.conn.commit()
+        def _save(cur):
+            cur.execute("INSERT OR REPLACE INTO customers (phone, data) VALUES (?, ?)", (phone, json.dumps(profile)))
+            self._apply_active_offers(cur, {phone: 0})
+        self._sql_write(_save, keys)
 
     def get_customer(self, phone: str) -> Optional[Dict]:
+        self._barrier(f"customer:{phone}")
         if self.use_cloud:
             doc = self.db.collection('customers').document(phone).get()
             return doc.to_dict() if doc.exists else None
-        cur = self.conn.cursor()
+        cur = self._reader()
         cur.execute("SELECT data FROM customers WHERE phone = ?", (phone,))
         r = cur.fetchone()
         return json.loads(r[0]) if r else None
 
     def get_all_customers(self) -> list:
+        self._barrier()
         if self.use_cloud:
             docs = self.db.collection('customers').stream()
             return [{"phone": d.id, **d.to_dict()} for d in docs]
-        cur = self.conn.cursor()
+        cur = self._reader()
         cur.execute("SELECT phone, data FROM customers")
         rows = cur.fetchall()
         results = []
@@ -76,74 +445,205 @@ class MemoryBank:
             results.append(d)
         return results
 
-    def delete_customer(self, phone: str):
+    def get_customers_with_stats(self, limit: int = 100, cursor: Optional[str] = None) -> Dict:
+        """
+        One page of customers (ordered by phone) with their order counts.
+        Pass the returned next_cursor back in to fetch the following page.
+        """
+        if limit < 1:
+            raise ValueError("limit must be >= 1")
+        self._barrier()
+        if self.use_cloud:
+            from google.cloud import firestore
+            query = self.db.collection('customers').order_by(firestore.FieldPath.document_id())
+            if cursor:
+                query = query.start_after(self.db.collection('customers').document(cursor).get())
+            docs = list(query.limit(limit + 1).stream())
+            page = docs[:limit]
+            # Order counts come from per-customer counters kept up to date by save_order
+            refs = [self.db.collection('customer_stats').document(d.id) for d in page]
+            counts = {s.id: s.to_dict().get('orders_count', 0) for s in self.db.get_all(refs) if s.exists}
+            results = []
+            for d in page:
+                if d.id not in counts:
+                    counts[d.id] = self._backfill_customer_stats(d.id)
+                results.append({"phone": d.id, **d.to_dict(), "orders_count": counts[d.id]})
+            next_cursor = page[-1].id if len(docs) > limit else None
+            return {"customers": results, "next_cursor": next_cursor}
+
+        cur = self._reader()
+        cur.execute(
+            "SELECT c.phone, c.data, COUNT(o.id) FROM "
+            "(SELECT phone, data FROM customers WHERE phone > ? ORDER BY phone LIMIT ?) c "
+            "LEFT JOIN orders o ON o.phone = c.phone GROUP BY c.phone ORDER BY c.phone",
+            (cursor or '', limit + 1)
+        )
+        rows = cur.fetchall()
+        results = []
+        for r in rows[:limit]:
+            d = json.loads(r[1])
+            d['phone'] = r[0]
+            d['orders_count'] = r[2]
+            results.append(d)
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return {"customers": results, "next_cursor": next_cursor}
+
+    def _backfill_customer_stats(self, phone: str) -> int:
+        # Customers created before counters existed: count once, then keep incrementally
+        agg = self.db.collection('orders').where('phone', '==', phone).count().get()
+        count = int(agg[0][0].value)
+        self.db.collection('customer_stats').document(phone).set({"orders_count": count})
+        return count
+
+    def delete_customer(self, phone: str, progress=None) -> Dict:
+        """
+        Cascade-deletes a customer with their orders, notifications and redeem codes.
+        progress, if given, is called with {"stage", "deleted", "total"} as work completes.
+        Returns the number of deleted rows/documents per collection.
+        """
+        self._barrier()
+        report = progress or (lambda update: None)
         if self.use_cloud:
-            # Firestore batch delete would be better, but doing sequential for simplicity
-            self.db.collection('customers').document(phone).delete()
-            
-            # Delete orders
-            orders = self.db.collection('orders').where('phone', '==', phone).stream()
+            return self._delete_customer_firestore(phone, report)
+
+        def _delete(cur):
+            self._apply_deltas(cur, self._sqlite_order_deltas(cur, "orders.phone = ?", (phone,), -1))
+            self._apply_rollups(cur, self._sqlite_order_rollups(cur, "orders.phone = ?", (phone,), -1))
+            cur.execute("DELETE FROM approval_tasks WHERE order_id IN (SELECT id FROM orders WHERE phone = ?)", (phone,))
+            counts = {}
+            for table in ('customers', 'orders', 'order_status_history', 'notifications', 'redeem_codes',
+                          'offer_eligibility'):
+                cur.execute(f"DELETE FROM {table} WHERE phone = ?", (phone,))
+                counts[table] = cur.rowcount
+            return counts
+        # Single transaction: either everything for this customer goes, or nothing does
+        counts = self.pool.write(_delete)
+        total = sum(counts.values())
+        report({"stage": "done", "deleted": total, "total": total})
+        return counts
+
+    def _delete_customer_firestore(self, phone: str, report) -> Dict:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Query the child collections concurrently
+        report({"stage": "querying", "deleted": 0, "total": 0})
+        children = ('orders', 'order_status_history', 'notifications', 'redeem_codes')
+        def _refs(collection):
+            return list(self.db.collection(collection).where('phone', '==', phone).stream())
+        with ThreadPoolExecutor(max_workers=len(children)) as pool:
+            found = dict(zip(children, pool.map(_refs, children)))
+
+        # Everything except the orders goes first, in independent chunks
+        refs = [self.db.collection('customers').document(phone),
+                self.db.collection('customer_stats').document(phone),
+                self.db.collection('offer_eligibility').document(phone)]
+        for name, docs in found.items():
+            if name != 'orders':
+                refs.extend(d.reference for d in docs)
+        # Then the orders. Each chunk carries the aggregate/rollup decrements of exactly
+        # its own orders, so the counters always match the orders still stored: a run
+        # that fails part-way leaves them consistent, and re-running finishes the job.
+        # Firestore caps a WriteBatch at 500 ops: per order 2 deletes (order, approval
+        # task) + up to 2 rollup buckets, plus one aggregates update per chunk.
+        orders_per_chunk = 120
+        order_chunks = [found['orders'][i:i + orders_per_chunk]
+                        for i in range(0, len(found['orders']), orders_per_chunk)]
+        total = len(refs) + 2 * len(found['orders'])
+
+        deleted = 0
+        lock = threading.Lock()
+        def _commit(batch, count):
+            nonlocal deleted
+            batch.commit()
+            with lock:
+                deleted += count
+                report({"stage": "deleting", "deleted": deleted, "total": total})
+
+        def _delete_refs(chunk):
+            batch = self.db.batch()
+            for ref in chunk:
+                batch.delete(ref)
+            _commit(batch, len(chunk))
+
+        def _delete_orders(orders):
+            batch = self.db.batch()
+            deltas, rdeltas = {}, {}
             for o in orders:
-                o.reference.delete()
-                
-            # Delete notifications
-            notifs = self.db.collection('notifications').where('phone', '==', phone).stream()
-            for n in notifs:
-                n.reference.delete()
-                
-            # Delete redeem codes
-            codes = self.db.collection('redeem_codes').where('phone', '==', phone).stream()
-            for c in codes:
-                c.reference.delete()
-            return
+                oo = o.to_dict()
+                order_deltas = _order_deltas(oo.get('status'), oo.get('data', {}), -1)
+                _merge_deltas(deltas, order_deltas)
+                _merge_deltas(rdeltas, rollup_deltas(order_deltas, oo.get('timestamp')))
+                batch.delete(o.reference)
+                batch.delete(self.db.collection('approval_tasks').document(o.id))
+            batch.set(self._aggregates_ref(), self._firestore_increments(deltas), merge=True)
+            self._firestore_rollups(batch, rdeltas)
+            _commit(batch, 2 * len(orders))
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(_delete_refs, [refs[i:i + 500] for i in range(0, len(refs), 500)]))
+            list(pool.map(_delete_orders, order_chunks))
 
-        cur = self.conn.cursor()
-        cur.execute("DELETE FROM customers WHERE phone = ?", (phone,))
-        cur.execute("DELETE FROM orders WHERE phone = ?", (phone,))
-        cur.execute("DELETE FROM notifications WHERE phone = ?", (phone,))
-        cur.execute("DELETE FROM redeem_codes WHERE phone = ?", (phone,))
-        self.conn.commit()
+        report({"stage": "done", "deleted": deleted, "total": total})
+        counts = {name: len(docs) for name, docs in found.items()}
+        counts['customers'] = 1
+        return counts
 
     def save_fabric(self, key: str, data: Dict):
+        keys = (f"fabric:{key}",)
         if self.use_cloud:
-            self.db.collection('fabric_kb').document(key).set(data)
+            self._fs_write(lambda batch: batch.set(self.db.collection('fabric_kb').document(key), data), keys)
             return
-        cur = self.conn.cursor()
-        cur.execute("INSERT OR REPLACE INTO fabric_kb (fabric_key, data) VALUES (?, ?)", (key, json.dumps(data)))
-        self.conn.commit()
+        self._sql_write(lambda cur: cur.execute("INSERT OR REPLACE INTO fabric_kb (fabric_key, data) VALUES (?, ?)",
+                                                (key, json.dumps(data))), keys)
 
     def get_fabric(self, key: str) -> Optional[Dict]:
+        self._barrier(f"fabric:{key}")
         if self.use_cloud:
             doc = self.db.collection('fabric_kb').document(key).get()
             return doc.to_dict() if doc.exists else None
-        cur = self.conn.cursor()
+        cur = self._reader()
         cur.execute("SELECT data FROM fabric_kb WHERE fabric_key = ?", (key,))
         r = cur.fetchone()
         return json.loads(r[0]) if r else None
 
     def save_redeem(self, code: str, phone: str, data: Dict):
+        keys = (f"redeem:{code}", f"redeems:{phone}")
+        used = bool(data.get('used', False))
         if self.use_cloud:
             data['phone'] = phone # Ensure phone is in data for Firestore
-            self.db.collection('redeem_codes').document(code).set(data)
+            ref = self.db.collection('redeem_codes').document(code)
+            self._barrier(f"redeem:{code}")
+            prev = ref.get()
+            pp = prev.to_dict() if prev.exists else None
+            counts = _active_offer_deltas(pp and (pp.get('phone'), pp.get('used', False)), phone, used)
+            def _apply(batch):
+                batch.set(ref, data)
+                self._firestore_active_offers(batch, counts)
+            self._fs_write(_apply, keys)
             return
-        cur = self.conn.cursor()
-        cur.execute("INSERT OR REPLACE INTO redeem_codes (code, phone, data) VALUES (?, ?, ?)", (code, phone, json.dumps(data)))
-        self.conn.commit()
+        def _save(cur):
+            prev = cur.execute("SELECT phone, used FROM redeem_codes WHERE code = ?", (code,)).fetchone()
+            cur.execute("INSERT OR REPLACE INTO redeem_codes (code, phone, data, used) VALUES (?, ?, ?, ?)",
+                        (code, phone, json.dumps(data), int(used)))
+            self._apply_active_offers(cur, _active_offer_deltas(prev, phone, used))
+        self._sql_write(_save, keys)
 
     def get_redeem(self, code: str) -> Optional[Dict]:
+        self._barrier(f"redeem:{code}")
         if self.use_cloud:
             doc = self.db.collection('redeem_codes').document(code).get()
             return doc.to_dict() if doc.exists else None
-        cur = self.conn.cursor()
+        cur = self._reader()
         cur.execute("SELECT data FROM redeem_codes WHERE code = ?", (code,))
         r = cur.fetchone()
         return json.loads(r[0]) if r else None
 
     def get_redeems_by_phone(self, phone: str) -> list:
+        self._barrier(f"redeems:{phone}")
         if self.use_cloud:
             docs = self.db.collection('redeem_codes').where('phone', '==', phone).stream()
             return [{"code": d.id, **d.to_dict()} for d in docs]
-        cur = self.conn.cursor()
+        cur = self._reader()
         cur.execute("SELECT code, data FROM redeem_codes WHERE phone = ?", (phone,))
         rows = cur.fetchall()
         results = []
@@ -154,10 +654,11 @@ class MemoryBank:
         return results
 
     def get_all_redeems(self) -> list:
+        self._barrier()
         if self.use_cloud:
             docs = self.db.collection('redeem_codes').limit(100).stream()
             return [{"code": d.id, **d.to_dict()} for d in docs]
-        cur = self.conn.cursor()
+        cur = self._reader()
         cur.execute("SELECT code, phone, data FROM redeem_codes ORDER BY rowid DESC LIMIT 100")
         rows = cur.fetchall()
         results = []
@@ -169,6 +670,19 @@ class MemoryBank:
         return results
 
     def update_redeem_used(self, code: str, used: bool):
+        if not self.use_cloud:
+            # In place: the SQLite data blob has no phone, so a read-modify-save would lose it
+            def _update(cur):
+                prev = cur.execute("SELECT phone, used FROM redeem_codes WHERE code = ?", (code,)).fetchone()
+                if not prev:
+                    return False
+                cur.execute("UPDATE redeem_codes SET used = ?, data = json_set(data, '$.used', json(?)) WHERE code = ?",
+                            (int(bool(used)), 'true' if used else 'false', code))
+                self._apply_active_offers(cur, _active_offer_deltas(prev, prev[0], bool(used)))
+                return True
+            self._barrier(f"redeem:{code}")
+            return self.pool.write(_update)
+
         # Fetch existing to preserve other fields
         existing = self.get_redeem(code)
         if not existing:
@@ -181,10 +695,187 @@ class MemoryBank:
         self.save_redeem(code, phone, existing)
         return True
 
+    # --- Offer eligibility index ---
+    # offer_eligibility holds, per customer, the number of unused redeem codes (kept
+    # up to date by save_customer / save_redeem / update_redeem_used in the same
+    # commit) and next_eligible_at, before which the offer job leaves them alone.
+
+    def _apply_active_offers(self, cur, deltas: Dict):
+        cur.executemany(
+            "INSERT INTO offer_eligibility (phone, active_offers) VALUES (?, MAX(?, 0)) "
+            "ON CONFLICT(phone) DO UPDATE SET active_offers = MAX(active_offers + ?, 0)",
+            [(phone, delta, delta) for phone, delta in deltas.items()]
+        )
+
+    def _firestore_active_offers(self, batch, deltas: Dict):
+        from google.cloud import firestore
+        for phone, delta in deltas.items():
+            # Increment creates missing fields, so new customers start out due at 0
+            batch.set(self.db.collection('offer_eligibility').document(phone),
+                      {"active_offers": firestore.Increment(delta), "next_eligible_at": firestore.Increment(0)},
+                      merge=True)
+
+    def get_offer_eligibility(self, phone: str) -> Optional[Dict]:
+        """{"active_offers", "next_eligible_at"} for one customer (primary-key lookup)."""
+        self._barrier(f"redeems:{phone}", f"customer:{phone}")
+        if self.use_cloud:
+            doc = self.db.collection('offer_eligibility').document(phone).get()
+            return doc.to_dict() if doc.exists else None
+        cur = self._reader()
+        cur.execute("SELECT active_offers, next_eligible_at FROM offer_eligibility WHERE phone = ?", (phone,))
+        r = cur.fetchone()
+        return {"active_offers": r[0], "next_eligible_at": r[1]} if r else None
+
+    def claim_offer_candidates(self, now: float, hold_until: float, limit: int = 500) -> list:
+        """
+        Phones of customers with no unused code whose next_eligible_at has passed,
+        oldest first. Their next_eligible_at moves to hold_until in the same
+        transaction, so concurrent offer jobs in other workers never see them twice.
+        """
+        self._barrier()
+        if self.use_cloud:
+            from google.cloud import firestore
+            query = (self.db.collection('offer_eligibility').where('active_offers', '==', 0)
+                     .where('next_eligible_at', '<=', now).order_by('next_eligible_at').limit(limit))
+
+            @firestore.transactional
+            def _claim(transaction):
+                snaps = list(transaction.get(query))
+                for snap in snaps:
+                    transaction.update(snap.reference, {"next_eligible_at": hold_until})
+                return [snap.id for snap in snaps]
+            return _claim(self.db.transaction())
+
+        return self.pool.write(lambda cur: [r[0] for r in cur.execute(
+            "UPDATE offer_eligibility SET next_eligible_at = ? WHERE phone IN ("
+            "SELECT phone FROM offer_eligibility WHERE active_offers = 0 AND next_eligible_at <= ? "
+            "ORDER BY next_eligible_at LIMIT ?) RETURNING phone", (hold_until, now, limit)
+        ).fetchall()])
+
+    def order_stats_by_phone(self, phones: list) -> Dict[str, list]:
+        """
+        Order aggregates for many customers as columns aligned with `phones`:
+        {"phone", "orders", "spend", "first_order", "last_order"} (timestamps None without orders).
+        """
+        self._barrier()
+        found = {}
+        if self.use_cloud:
+            from concurrent.futures import ThreadPoolExecutor
+            # 'in' filters take at most 30 values
+            def _chunk(group):
+                docs = self.db.collection('orders').where('phone', 'in', group).select(['phone', 'timestamp', 'data.total']).stream()
+                return [d.to_dict() for d in docs]
+            groups = [phones[i:i + 30] for i in range(0, len(phones), 30)]
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                for docs in pool.map(_chunk, groups):
+                    for dd in docs:
+                        ts = dd.get('timestamp') or 0
+                        n, spend, first, last = found.get(dd['phone'], (0, 0.0, ts, ts))
+                        found[dd['phone']] = (n + 1, spend + float((dd.get('data') or {}).get('total') or 0),
+                                              min(first, ts), max(last, ts))
+        else:
+            cur = self._reader()
+            for i in range(0, len(phones), 500):
+                group = phones[i:i + 500]
+                cur.execute(
+                    f"SELECT phone, COUNT(*), SUM(total), MIN(timestamp), MAX(timestamp) FROM orders "
+                    f"WHERE phone IN ({','.join('?' * len(group))}) GROUP BY phone", group)
+                found.update((r[0], r[1:]) for r in cur.fetchall())
+        rows = [found.get(phone, (0, 0.0, None, None)) for phone in phones]
+        return {"phone": list(phones), "orders": [r[0] for r in rows], "spend": [r[1] or 0.0 for r in rows],
+                "first_order": [r[2] for r in rows], "last_order": [r[3] for r in rows]}
+
+    def save_offers_bulk(self, offers: list) -> list:
+        """
+        Saves many (code, phone, data, message) offers: the redeem code, the customer's
+        offer-eligibility count and the notification, in one transaction (SQLite) or
+        500-op batches (Firestore). Codes that already exist (or repeat within offers) are
+        skipped; OfferCampaign.save() re-issues those with new codes.
+        Returns the offers that were saved; notification events go out in one publish.
+        """
+        import time
+        ts = time.time()
+        if self.use_cloud:
+            refs = [self.db.collection('redeem_codes').document(code) for code, _, _, _ in offers]
+            taken = {d.id for d in self.db.get_all(refs) if d.exists} if refs else set()
+            saved = []
+            for offer in offers:
+                if offer[0] not in taken:
+                    taken.add(offer[0])
+                    saved.append(offer)
+            events = []
+            # Three writes per offer: code, eligibility counter, notification
+            for i in range(0, len(saved), 166):
+                batch = self.db.batch()
+                for code, phone, data, message in saved[i:i + 166]:
+                    batch.set(self.db.collection('redeem_codes').document(code), {**data, "phone": phone})
+                    self._firestore_active_offers(batch, {phone: 0 if data.get('used', False) else 1})
+                    ref = self.db.collection('notifications').document()
+                    batch.set(ref, {"phone": phone, "message": message, "timestamp": ts, "read": False})
+                    events.append((phone, ref.id, message))
+                batch.commit()
+        else:
+            def _save(cur):
+                done, events, deltas = [], [], {}
+                for code, phone, data, message in offers:
+                    used = bool(data.get('used', False))
+                    cur.execute("INSERT OR IGNORE INTO redeem_codes (code, phone, data, used) VALUES (?, ?, ?, ?)",
+                                (code, phone, json.dumps(data), int(used)))
+                    if not cur.rowcount:
+                        continue
+                    _merge_deltas(deltas, _active_offer_deltas(None, phone, used))
+                    cur.execute("INSERT INTO notifications (phone, message, timestamp, read) VALUES (?, ?, ?, 0)",
+                                (phone, message, ts))
+                    done.append((code, phone, data, message))
+                    events.append((phone, cur.lastrowid, message))
+                self._apply_active_offers(cur, deltas)
+                return done, events
+            saved, events = self.pool.write(_save)
+        try:
+            self.events.publish_many([(customer_topic(phone), {"type": "notification", "id": notif_id,
+                                                               "message": message, "timestamp": ts})
+                                      for phone, notif_id, message in events])
+        except Exception as e:
+            logger.warning(f"Event publish failed: {e}")
+        return saved
+
+    def rebuild_offer_index(self) -> int:
+        """Recounts unused codes for every customer (next_eligible_at is kept). Returns the row count."""
+        self._barrier()
+        if self.use_cloud:
+            from google.cloud import firestore
+            counts = {d.id: 0 for d in self.db.collection('customers').stream()}
+            for d in self.db.collection('redeem_codes').stream():
+                dd = d.to_dict()
+                counts[dd.get('phone')] = counts.get(dd.get('phone'), 0) + (0 if dd.get('used', False) else 1)
+            counts.pop(None, None)
+            items = list(counts.items())
+            for i in range(0, len(items), 500):
+                batch = self.db.batch()
+                for phone, count in items[i:i + 500]:
+                    batch.set(self.db.collection('offer_eligibility').document(phone),
+                              {"active_offers": count, "next_eligible_at": firestore.Increment(0)}, merge=True)
+                batch.commit()
+            return len(items)
+
+        def _rebuild(cur):
+            cur.execute("""
+                INSERT INTO offer_eligibility (phone, active_offers)
+                SELECT phone, SUM(used = 0) FROM (
+                    SELECT phone, used FROM redeem_codes UNION ALL SELECT phone, 1 FROM customers)
+                WHERE 1 GROUP BY phone
+                ON CONFLICT(phone) DO UPDATE SET active_offers = excluded.active_offers
+            """)
+            return cur.execute("SELECT COUNT(*) FROM offer_eligibility").fetchone()[0]
+        return self.pool.write(_rebuild)
+
     def save_order(self, order_id: str, phone: str, status: str, data: Dict):
+        keys = (f"order:{order_id}", f"orders:{phone}")
         if self.use_cloud:
             import time
+            from google.cloud import firestore
             ts = data.get('timestamp', time.time())
+            event = {"type": "order", "order_id": order_id, "status": status, "timestamp": ts}
             doc_data = {
                 "phone": phone,
                 "status": status,
@@ -192,18 +883,50 @@ class MemoryBank:
                 "data": data # Store full blob to match SQLite structure or flatten
             }
             # Flatten for easier querying if needed, but keeping structure similar to SQLite for now
-            self.db.collection('orders').document(order_id).set(doc_data)
+            ref = self.db.collection('orders').document(order_id)
+            deltas = _order_deltas(status, data)
+            rdeltas = rollup_deltas(deltas, ts)
+            self._barrier(f"order:{order_id}")
+            prev = ref.get()
+            if prev.exists:
+                pp = prev.to_dict()
+                prev_deltas = _order_deltas(pp.get('status'), pp.get('data', {}), -1)
+                _merge_deltas(deltas, prev_deltas)
+                _merge_deltas(rdeltas, rollup_deltas(prev_deltas, pp.get('timestamp')))
+            def _apply(batch):
+                batch.set(ref, doc_data)
+                batch.set(self._aggregates_ref(), self._firestore_increments(deltas), merge=True)
+                self._firestore_rollups(batch, rdeltas)
+                if not prev.exists or prev.to_dict().get('status') != status:
+                    batch.set(self.db.collection('order_status_history').document(), {
+                        "order_id": order_id, "phone": phone, "status": status,
+                        "timestamp": ts if not prev.exists else time.time(), "order_ts": ts})
+                if not prev.exists:
+                    batch.set(self.db.collection('customer_stats').document(phone),
+                              {"orders_count": firestore.Increment(1)}, merge=True)
+            self._fs_write(_apply, keys, on_commit=lambda _: self._publish(phone, event))
             return
         import time
         ts = data.get('timestamp', time.time())
-        cur = self.conn.cursor()
-        cur.execute("INSERT OR REPLACE INTO orders (id, phone, status, data, timestamp) VALUES (?, ?, ?, ?, ?)", 
-                   (order_id, phone, status, json.dumps(data), ts))
-        self.conn.commit()
+        event = {"type": "order", "order_id": order_id, "status": status, "timestamp": ts}
+        def _save(cur):
+            deltas = _order_deltas(status, data)
+            rdeltas = rollup_deltas(deltas, ts)
+            _merge_deltas(deltas, self._sqlite_order_deltas(cur, "orders.id = ?", (order_id,), -1))
+            _merge_deltas(rdeltas, self._sqlite_order_rollups(cur, "orders.id = ?", (order_id,), -1))
+            prev = cur.execute("SELECT status FROM orders WHERE id = ?", (order_id,)).fetchone()
+            cur.execute("INSERT OR REPLACE INTO orders (id, phone, status, data, timestamp, total, item_count) VALUES (?, ?, ?, ?, ?, ?, ?)", 
+                       (order_id, phone, status, json.dumps(data), ts, float(data.get('total') or 0), len(data.get('items') or [])))
+            if not prev or prev[0] != status:
+                cur.execute("INSERT INTO order_status_history (order_id, phone, status, timestamp, order_ts) VALUES (?, ?, ?, ?, ?)",
+                            (order_id, phone, status, ts if not prev else time.time(), ts))
+            self._apply_deltas(cur, deltas)
+            self._apply_rollups(cur, rdeltas)
+        self._sql_write(_save, keys, on_commit=lambda _: self._publish(phone, event))
 
     def get_orders_by_phone(self, phone: str) -> list:
+        self._barrier(f"orders:{phone}", "order_status")
         if self.use_cloud:
-            from google.cloud import firestore
             # Remove order_by to avoid needing a composite index immediately
             docs = self.db.collection('orders').where('phone', '==', phone).stream()
             results = []
@@ -218,7 +941,7 @@ class MemoryBank:
             # Sort in Python
             results.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
             return results
-        cur = self.conn.cursor()
+        cur = self._reader()
         cur.execute("SELECT id, status, data, timestamp FROM orders WHERE phone = ? ORDER BY timestamp DESC", (phone,))
         rows = cur.fetchall()
         results = []
@@ -230,10 +953,11 @@ class MemoryBank:
             results.append(d)
         return results
 
-    def get_all_orders(self) -> list:
+    def get_all_orders(self, limit: int = 100) -> list:
+        self._barrier()
         if self.use_cloud:
             from google.cloud import firestore
-            docs = self.db.collection('orders').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(100).stream()
+            docs = self.db.collection('orders').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit).stream()
             results = []
             for d in docs:
                 dd = d.to_dict()
@@ -244,8 +968,8 @@ class MemoryBank:
                 order_data['timestamp'] = dd.get('timestamp')
                 results.append(order_data)
             return results
-        cur = self.conn.cursor()
-        cur.execute("SELECT id, phone, status, data, timestamp FROM orders ORDER BY timestamp DESC LIMIT 100")
+        cur = self._reader()
+        cur.execute("SELECT id, phone, status, data, timestamp FROM orders ORDER BY timestamp DESC LIMIT ?", (limit,))
         rows = cur.fetchall()
         results = []
         for r in rows:
@@ -257,36 +981,310 @@ class MemoryBank:
             results.append(d)
         return results
 
+    def query_orders(self, phone: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None,
+                     fields: Optional[list] = None, since: Optional[float] = None,
+                     until: Optional[float] = None) -> Dict:
+        """
+        Keyset-paginated orders, newest first, optionally for one customer and/or
+        created in [since, until).
+        fields limits what is returned (e.g. ['id', 'status', 'total']); None means everything.
+        Returns {"orders": [...], "next_cursor": str|None}.
+        """
+        if limit < 1:
+            raise ValueError("limit must be >= 1")
+        if fields:
+            bad = [f for f in fields if not FIELD_RE.match(f)]
+            if bad:
+                raise ValueError(f"Invalid fields: {bad}")
+        after = decode_cursor(cursor)
+        self._barrier(*((f"orders:{phone}", "order_status") if phone else ()))
+        window = (since, until)
+        if self.use_cloud:
+            rows = self._query_orders_firestore(phone, limit + 1, after, fields, window)
+        else:
+            rows = self._query_orders_sqlite(phone, limit + 1, after, fields, window)
+
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            ts, key, _ = page[-1]
+            next_cursor = encode_cursor(ts, key)
+        return {"orders": [order for _, _, order in page], "next_cursor": next_cursor}
+
+    def orders_between(self, t0: float, t1: float, fields: Optional[list] = None, page_size: int = 500):
+        """Yields every order created in [t0, t1), newest first, one page in memory at a time."""
+        cursor = None
+        while True:
+            page = self.query_orders(limit=page_size, cursor=cursor, fields=fields, since=t0, until=t1)
+            yield from page["orders"]
+            cursor = page["next_cursor"]
+            if not cursor:
+                return
+
+    def _query_orders_sqlite(self, phone, limit, after, fields, window=(None, None)) -> list:
+        where, params = [], []
+        if phone is not None:
+            where.append("phone = ?")
+            params.append(phone)
+        if window[0] is not None:
+            where.append("timestamp >= ?")
+            params.append(window[0])
+        if window[1] is not None:
+            where.append("timestamp < ?")
+            params.append(window[1])
+        if after:
+            where.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend([after[0], after[0], after[1]])
+        if fields:
+            columns = [f for f in fields if f in ORDER_COLUMNS]
+            extra = [f for f in fields if f not in ORDER_COLUMNS]
+        else:
+            columns, extra = list(ORDER_COLUMNS), None
+        # Blob fields are pulled out with json_extract so only the requested parts are decoded
+        if extra is None:
+            blob = "data"
+        elif extra:
+            blob = "json_object(" + ", ".join("?, json_extract(data, ?)" for _ in extra) + ")"
+        else:
+            blob = "NULL"
+        blob_params = [p for f in (extra or []) for p in (f, f"$.{f}")]
+        sql = (f"SELECT timestamp, id, {blob}" + "".join(f", {c}" for c in columns) + " FROM orders"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + " ORDER BY timestamp DESC, id DESC LIMIT ?")
+        cur = self._reader()
+        cur.execute(sql, blob_params + params + [limit])
+        results = []
+        for row in cur.fetchall():
+            order = json.loads(row[2]) if row[2] else {}
+            if extra is None:
+                # Column values win over stale copies inside the blob
+                order.pop('phone', None)
+            order.update(zip(columns, row[3:]))
+            results.append((row[0], row[1], order))
+        return results
+
+    def _query_orders_firestore(self, phone, limit, after, fields, window=(None, None)) -> list:
+        from google.cloud import firestore
+        query = self.db.collection('orders')
+        if phone is not None:
+            query = query.where('phone', '==', phone)
+        if window[0] is not None:
+            query = query.where('timestamp', '>=', window[0])
+        if window[1] is not None:
+            query = query.where('timestamp', '<', window[1])
+        # Needs a composite index on (phone, timestamp desc) for per-customer queries
+        query = query.order_by('timestamp', direction=firestore.Query.DESCENDING)
+        if fields:
+            paths = {'timestamp'}
+            for f in fields:
+                if f in ('phone', 'status', 'timestamp'):
+                    paths.add(f)
+                elif f == 'item_count':
+                    paths.add('data.items')
+                elif f != 'id':
+                    paths.add(f"data.{f}")
+            query = query.select(sorted(paths))
+        if after:
+            query = query.start_after(self.db.collection('orders').document(after[1]).get())
+        results = []
+        for d in query.limit(limit).stream():
+            dd = d.to_dict()
+            data = dd.get('data', {})
+            full = {**data, 'id': d.id, 'phone': dd.get('phone'), 'status': dd.get('status'),
+                    'timestamp': dd.get('timestamp'), 'item_count': len(data.get('items') or [])}
+            order = {f: full.get(f) for f in fields} if fields else full
+            results.append((dd.get('timestamp'), d.id, order))
+        return results
+
+    def get_recent_order_totals(self, limit: int = 10) -> list:
+        """Totals of the latest orders, newest first (served from the total column)."""
+        self._barrier()
+        if self.use_cloud:
+            from google.cloud import firestore
+            docs = self.db.collection('orders').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(limit).stream()
+            return [d.to_dict().get('data', {}).get('total', 0) for d in docs]
+        cur = self._reader()
+        cur.execute("SELECT total FROM orders ORDER BY timestamp DESC LIMIT ?", (limit,))
+        return [r[0] for r in cur.fetchall()]
+
     def update_order_status(self, order_id: str, status: str):
+        import time
+        # The phone isn't known up front, so per-phone order reads also wait on "order_status"
+        keys = (f"order:{order_id}", "order_status")
+        event = {"type": "order", "order_id": order_id, "status": status}
         if self.use_cloud:
-            self.db.collection('orders').document(order_id).update({"status": status})
+            ref = self.db.collection('orders').document(order_id)
+            self._barrier(f"order:{order_id}")
+            prev = ref.get()
+            pp = prev.to_dict() if prev.exists else {}
+            def _apply(batch):
+                batch.update(ref, {"status": status})
+                if prev.exists and pp.get('status') != status:
+                    deltas = {('status', pp.get('status') or 'Pending'): -1, ('status', status): 1}
+                    batch.set(self._aggregates_ref(), self._firestore_increments(deltas), merge=True)
+                    self._firestore_rollups(batch, rollup_deltas(deltas, pp.get('timestamp')))
+                    batch.set(self.db.collection('order_status_history').document(), {
+                        "order_id": order_id, "phone": pp.get('phone'), "status": status,
+                        "timestamp": time.time(), "order_ts": pp.get('timestamp')})
+            self._fs_write(_apply, keys, on_commit=lambda _: self._publish(pp.get('phone'), event))
             return
-        cur = self.conn.cursor()
-        cur.execute("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
-        self.conn.commit()
+        def _update(cur):
+            cur.execute("SELECT status, phone, timestamp FROM orders WHERE id = ?", (order_id,))
+            prev = cur.fetchone()
+            cur.execute("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
+            if prev and prev[0] != status:
+                deltas = {('status', prev[0] or 'Pending'): -1, ('status', status): 1}
+                self._apply_deltas(cur, deltas)
+                self._apply_rollups(cur, rollup_deltas(deltas, prev[2]))
+                cur.execute("INSERT INTO order_status_history (order_id, phone, status, timestamp, order_ts) VALUES (?, ?, ?, ?, ?)",
+                            (order_id, prev[1], status, time.time(), prev[2]))
+            return prev
+        self._sql_write(_update, keys, on_commit=lambda prev: prev and self._publish(prev[1], event))
 
-    def save_feedback(self, feedback_id: str, order_id: str, rating: int, comment: str):
+    # --- Approval tasks (human-in-the-loop) ---
+    # One task per order: 'waiting' until a human decides ('approved' / 'rejected')
+    # or its deadline passes ('expired'). Pending tasks survive restarts.
+
+    def create_task(self, order_id: str, data: Dict, timeout: Optional[float] = None):
+        """Opens (or re-opens) the approval task for an order; timeout in seconds, None = no deadline."""
+        import time
+        now = time.time()
+        expires = now + timeout if timeout else None
         if self.use_cloud:
-            import time
-            self.db.collection('feedback').document(feedback_id).set({
-                "order_id": order_id,
-                "rating": rating,
-                "comment": comment,
-                "timestamp": time.time()
-            })
+            self._fs_write(lambda batch: batch.set(self.db.collection('approval_tasks').document(order_id), {
+                "status": "waiting", "data": data, "result": None,
+                "created": now, "updated": now, "expires": expires,
+            }), (f"task:{order_id}",))
             return
+        self._sql_write(lambda cur: cur.execute(
+            "INSERT OR REPLACE INTO approval_tasks (order_id, status, data, result, created, updated, expires) "
+            "VALUES (?, 'waiting', ?, NULL, ?, ?, ?)", (order_id, json.dumps(data), now, now, expires)
+        ), (f"task:{order_id}",))
+
+    def get_task(self, order_id: str) -> Optional[Dict]:
+        self._barrier(f"task:{order_id}")
+        if self.use_cloud:
+            doc = self.db.collection('approval_tasks').document(order_id).get()
+            return {"order_id": order_id, **doc.to_dict()} if doc.exists else None
+        cur = self._reader()
+        cur.execute("SELECT order_id, status, data, result, created, updated, expires FROM approval_tasks WHERE order_id = ?",
+                    (order_id,))
+        row = cur.fetchone()
+        return self._task_row(row) if row else None
+
+    @staticmethod
+    def _task_row(row) -> Dict:
+        return {"order_id": row[0], "status": row[1], "data": json.loads(row[2] or '{}'),
+                "result": json.loads(row[3]) if row[3] else None,
+                "created": row[4], "updated": row[5], "expires": row[6]}
+
+    def list_pending_tasks(self, limit: int = 100) -> list:
+        """Waiting tasks, oldest first."""
+        self._barrier()
+        if self.use_cloud:
+            docs = (self.db.collection('approval_tasks').where('status', '==', 'waiting')
+                    .order_by('created').limit(limit).stream())
+            return [{"order_id": d.id, **d.to_dict()} for d in docs]
+        cur = self._reader()
+        cur.execute("SELECT order_id, status, data, result, created, updated, expires FROM approval_tasks "
+                    "WHERE status = 'waiting' ORDER BY created LIMIT ?", (limit,))
+        return [self._task_row(r) for r in cur.fetchall()]
+
+    def complete_task(self, order_id: str, status: str, result: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Moves a waiting task to `status` and wakes everyone waiting on it, in any worker.
+        Returns the updated task, or None if there is no waiting task (already decided or expired).
+        """
+        import time
+        self._barrier(f"task:{order_id}")
+        now = time.time()
+        if self.use_cloud:
+            from google.cloud import firestore
+            ref = self.db.collection('approval_tasks').document(order_id)
+
+            @firestore.transactional
+            def _complete(transaction):
+                snap = ref.get(transaction=transaction)
+                if not snap.exists or snap.to_dict().get('status') != 'waiting':
+                    return False
+                transaction.update(ref, {"status": status, "result": result, "updated": now})
+                return True
+            done = _complete(self.db.transaction())
+        else:
+            def _complete(cur):
+                cur.execute("UPDATE approval_tasks SET status = ?, result = ?, updated = ? WHERE order_id = ? AND status = 'waiting'",
+                            (status, json.dumps(result) if result is not None else None, now, order_id))
+                return cur.rowcount > 0
+            done = self.pool.write(_complete)
+        if not done:
+            return None
+        try:
+            self.events.publish(TASKS_TOPIC, {"type": "task", "order_id": order_id, "status": status})
+        except Exception as e:
+            logger.warning(f"Event publish failed: {e}")
+        return self.get_task(order_id)
+
+    async def wait_for_task(self, order_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        Suspends until the task is no longer waiting and returns it (None if there is no task).
+        Nothing polls: completions wake the waiter through TaskWaiters; the task is only
+        re-read every APPROVAL_RECHECK_SECONDS as a safety net for missed events.
+        The deadline is the task's own `expires` unless timeout is given; when it passes
+        the task is marked 'expired'.
+        """
         import time
-        cur = self.conn.cursor()
-        cur.execute("INSERT INTO feedback (id, order_id, rating, comment, timestamp) VALUES (?, ?, ?, ?, ?)", 
-                   (feedback_id, order_id, rating, comment, time.time()))
-        self.conn.commit()
+        # Register before the first read so a completion in between still wakes us
+        wake = self.task_waiters.register(order_id)
+        try:
+            task = await asyncio.to_thread(self.get_task, order_id)
+            if task is None:
+                return None
+            deadline = time.time() + timeout if timeout is not None else task.get('expires')
+            while task and task['status'] == 'waiting':
+                remaining = deadline - time.time() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    expired = await asyncio.to_thread(self.complete_task, order_id, 'expired')
+                    return expired or await asyncio.to_thread(self.get_task, order_id)
+                recheck = Config.APPROVAL_RECHECK_SECONDS
+                try:
+                    await asyncio.wait_for(wake.wait(), recheck if remaining is None else min(remaining, recheck))
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+                task = await asyncio.to_thread(self.get_task, order_id)
+            return task
+        finally:
+            self.task_waiters.unregister(order_id, wake)
+
+    def save_feedback(self, feedback_id: str, order_id: str, rating: int, comment: str):
+        import time
+        ts = time.time()
+        if self.use_cloud:
+            def _apply(batch):
+                batch.set(self.db.collection('feedback').document(feedback_id), {
+                    "order_id": order_id,
+                    "rating": rating,
+                    "comment": comment,
+                    "timestamp": ts
+                })
+                batch.set(self._aggregates_ref(), self._firestore_increments(_feedback_deltas(rating)), merge=True)
+                self._firestore_rollups(batch, rollup_deltas(_feedback_deltas(rating), ts))
+            self._fs_write(_apply, ("feedback",))
+            return
+        def _save(cur):
+            cur.execute("INSERT INTO feedback (id, order_id, rating, comment, timestamp) VALUES (?, ?, ?, ?, ?)", 
+                       (feedback_id, order_id, rating, comment, ts))
+            self._apply_deltas(cur, _feedback_deltas(rating))
+            self._apply_rollups(cur, rollup_deltas(_feedback_deltas(rating), ts))
+        self._sql_write(_save, ("feedback",))
 
     def get_all_feedback(self) -> list:
+        self._barrier()
         if self.use_cloud:
             from google.cloud import firestore
             docs = self.db.collection('feedback').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(100).stream()
             return [{"id": d.id, **d.to_dict()} for d in docs]
-        cur = self.conn.cursor()
+        cur = self._reader()
         cur.execute("SELECT id, order_id, rating, comment, timestamp FROM feedback ORDER BY timestamp DESC LIMIT 100")
         rows = cur.fetchall()
         results = []
@@ -296,27 +1294,129 @@ class MemoryBank:
             })
         return results
 
+    # --- Time-windowed analytics (t0 inclusive, t1 exclusive, epoch seconds) ---
+
+    def order_stats_between(self, t0: float, t1: float) -> Dict:
+        """Order count, revenue, items and per-status counts for orders created in [t0, t1)."""
+        self._barrier()
+        stats = {"orders": 0, "revenue": 0.0, "items": 0, "status": {}}
+        if self.use_cloud:
+            docs = (self.db.collection('orders').where('timestamp', '>=', t0).where('timestamp', '<', t1)
+                    .select(['status', 'data.total', 'data.items']).stream())
+            rows = []
+            for d in docs:
+                dd = d.to_dict()
+                data = dd.get('data', {})
+                rows.append((dd.get('status'), 1, float(data.get('total') or 0), len(data.get('items') or [])))
+        else:
+            cur = self._reader()
+            cur.execute("""
+                SELECT status, COUNT(*), COALESCE(SUM(total), 0), COALESCE(SUM(item_count), 0)
+                FROM orders WHERE timestamp >= ? AND timestamp < ? GROUP BY status
+            """, (t0, t1))
+            rows = cur.fetchall()
+        for status, count, revenue, items in rows:
+            status = status or 'Pending'
+            stats["orders"] += count
+            stats["revenue"] += revenue
+            stats["items"] += items
+            stats["status"][status] = stats["status"].get(status, 0) + count
+        return stats
+
+    def feedback_stats_between(self, t0: float, t1: float, comments_limit: int = 20) -> Dict:
+        """Count and average rating of feedback in [t0, t1), plus the latest low-rated (< 3) comments."""
+        self._barrier("feedback")
+        if self.use_cloud:
+            from google.cloud import firestore
+            docs = (self.db.collection('feedback').where('timestamp', '>=', t0).where('timestamp', '<', t1)
+                    .order_by('timestamp', direction=firestore.Query.DESCENDING)
+                    .select(['rating', 'comment']).stream())
+            ratings, comments = [], []
+            for d in docs:
+                dd = d.to_dict()
+                ratings.append(dd.get('rating') or 0)
+                if ratings[-1] < 3 and dd.get('comment') and len(comments) < comments_limit:
+                    comments.append(dd['comment'])
+            count = len(ratings)
+            return {"count": count, "avg_rating": sum(ratings) / count if count else 0.0, "comments": comments}
+        cur = self._reader()
+        count, avg = cur.execute(
+            "SELECT COUNT(*), COALESCE(AVG(rating), 0) FROM feedback WHERE timestamp >= ? AND timestamp < ?", (t0, t1)
+        ).fetchone()
+        cur.execute("""
+            SELECT comment FROM feedback
+            WHERE timestamp >= ? AND timestamp < ? AND rating < 3 AND comment != ''
+            ORDER BY timestamp DESC LIMIT ?
+        """, (t0, t1, comments_limit))
+        return {"count": count, "avg_rating": avg, "comments": [r[0] for r in cur.fetchall()]}
+
+    def turnaround_stats(self, t0: float, t1: float) -> Dict:
+        """
+        Seconds from order creation to its first completed status (COMPLETED_STATUSES),
+        for orders that completed in [t0, t1). Returns count, avg, p50, p90 and p95.
+        Uses order_status_history, so orders completed before it existed are not counted.
+        """
+        self._barrier("order_status")
+        if self.use_cloud:
+            events = (self.db.collection('order_status_history')
+                      .where('status', 'in', list(COMPLETED_STATUSES))
+                      .where('timestamp', '>=', t0).where('timestamp', '<', t1).stream())
+            first = {}
+            for d in events:
+                dd = d.to_dict()
+                if dd.get('order_ts') is None:
+                    continue
+                if dd['order_id'] not in first or dd['timestamp'] < first[dd['order_id']][0]:
+                    first[dd['order_id']] = (dd['timestamp'], dd['order_ts'])
+            # Drop orders that had already completed before the window
+            ids = list(first)
+            for i in range(0, len(ids), 30):
+                earlier = (self.db.collection('order_status_history')
+                           .where('order_id', 'in', ids[i:i + 30])
+                           .where('status', 'in', list(COMPLETED_STATUSES))
+                           .where('timestamp', '<', t0).stream())
+                for d in earlier:
+                    first.pop(d.to_dict().get('order_id'), None)
+            durations = [done - created for done, created in first.values()]
+        else:
+            marks = ",".join("?" for _ in COMPLETED_STATUSES)
+            cur = self._reader()
+            cur.execute(f"""
+                SELECT MIN(h.timestamp) - h.order_ts FROM order_status_history h
+                WHERE h.status IN ({marks}) AND h.timestamp >= ? AND h.timestamp < ?
+                  AND h.order_ts IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM order_status_history e
+                      WHERE e.order_id = h.order_id AND e.status IN ({marks}) AND e.timestamp < ?)
+                GROUP BY h.order_id
+            """, (*COMPLETED_STATUSES, t0, t1, *COMPLETED_STATUSES, t0))
+            durations = [r[0] for r in cur.fetchall()]
+        return _percentiles([max(d, 0.0) for d in durations])
+
     def save_notification(self, phone: str, message: str):
         import time
         ts = time.time()
+        keys = (f"notifications:{phone}",)
         if self.use_cloud:
-            self.db.collection('notifications').add({
+            ref = self.db.collection('notifications').document()
+            self._fs_write(lambda batch: batch.set(ref, {
                 "phone": phone,
                 "message": message,
                 "timestamp": ts,
                 "read": False
-            })
+            }), keys, on_commit=lambda _: self._publish(
+                phone, {"type": "notification", "id": ref.id, "message": message, "timestamp": ts}))
             return
-        
-        # Ensure table exists (lazy init for SQLite)
-        cur = self.conn.cursor()
-        cur.execute("CREATE TABLE IF NOT EXISTS notifications (id INTEGER PRIMARY KEY AUTOINCREMENT, phone TEXT, message TEXT, timestamp REAL, read INTEGER)")
-        cur.execute("INSERT INTO notifications (phone, message, timestamp, read) VALUES (?, ?, ?, ?)", (phone, message, ts, 0))
-        self.conn.commit()
+
+        def _save(cur):
+            cur.execute("INSERT INTO notifications (phone, message, timestamp, read) VALUES (?, ?, ?, ?)", (phone, message, ts, 0))
+            return cur.lastrowid
+        self._sql_write(_save, keys, on_commit=lambda notif_id: self._publish(
+            phone, {"type": "notification", "id": notif_id, "message": message, "timestamp": ts}))
 
     def get_notifications_by_phone(self, phone: str) -> list:
+        self._barrier(f"notifications:{phone}")
         if self.use_cloud:
-            from google.cloud import firestore
             # Remove order_by to avoid needing a composite index immediately
             docs = self.db.collection('notifications').where('phone', '==', phone).stream()
             results = [{"id": d.id, **d.to_dict()} for d in docs]
@@ -324,8 +1424,7 @@ class MemoryBank:
             results.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
             return results[:20]
         
-        cur = self.conn.cursor()
-        cur.execute("CREATE TABLE IF NOT EXISTS notifications (id INTEGER PRIMARY KEY AUTOINCREMENT, phone TEXT, message TEXT, timestamp REAL, read INTEGER)")
+        cur = self._reader()
         cur.execute("SELECT id, message, timestamp, read FROM notifications WHERE phone = ? ORDER BY timestamp DESC LIMIT 20", (phone,))
         rows = cur.fetchall()
         results = []
@@ -334,3 +1433,40 @@ class MemoryBank:
                 "id": r[0], "message": r[1], "timestamp": r[2], "read": bool(r[3])
             })
         return results
+
+
+_banks = {}
+_banks_lock = threading.Lock()
+
+def get_memory_bank(path: str = DB_FILE) -> MemoryBank:
+    """
+    Process-wide MemoryBank per backend and database path. Building one opens
+    connections, starts the writer thread and runs migrations (or creates a
+    Firestore client), so apps and agents share this one instead of constructing
+    their own. With Config.READ_CACHE it comes wrapped in a CachedMemoryBank.
+    """
+    key = ('firestore',) if Config.USE_FIRESTORE else ('sqlite', os.path.abspath(path))
+    with _banks_lock:
+        bank = _banks.get(key)
+        if bank is None:
+            bank = MemoryBank(path)
+            if Config.READ_CACHE:
+                from agents.cached_memory_bank import CachedMemoryBank
+                shared = Config.READ_CACHE_SHARED_RELAY
+                policies = CachedMemoryBank.policies_from_json(json.loads(Config.READ_CACHE_POLICIES), shared)
+                bank = CachedMemoryBank(bank, policies, shared_relay=shared)
+            _banks[key] = bank
+        return bank
+
+def close_memory_banks():
+    """Closes every shared MemoryBank (flushing write-behind writes)."""
+    with _banks_lock:
+        banks = list(_banks.values())
+        _banks.clear()
+    for bank in banks:
+        try:
+            bank.close()
+        except Exception as e:
+            logger.warning(f"Closing MemoryBank failed: {e}")
+
+atexit.register(close_memory_banks)
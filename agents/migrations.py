@@ -0,0 +1,122 @@
+# agents/migrations.py
+"""
+Versioned schema for the SQLite MemoryBank.
+
+Each migration runs exactly once, in order, inside its own transaction and
+bumps PRAGMA user_version. Add new steps to the end of MIGRATIONS; never edit
+one that has already shipped.
+"""
+import logging
+import sqlite3
+
+logger = logging.getLogger("migrations")
+
+
+def _m001_base_tables(cur):
+    # Original schema (IF NOT EXISTS so pre-migration databases adopt it as-is)
+    cur.execute("CREATE TABLE IF NOT EXISTS customers (phone TEXT PRIMARY KEY, data TEXT)")
+    cur.execute("CREATE TABLE IF NOT EXISTS fabric_kb (fabric_key TEXT PRIMARY KEY, data TEXT)")
+    cur.execute("CREATE TABLE IF NOT EXISTS redeem_codes (code TEXT PRIMARY KEY, phone TEXT, data TEXT)")
+    cur.execute("CREATE TABLE IF NOT EXISTS orders (id TEXT PRIMARY KEY, phone TEXT, status TEXT, data TEXT, timestamp REAL)")
+    cur.execute("CREATE TABLE IF NOT EXISTS feedback (id TEXT PRIMARY KEY, order_id TEXT, rating INTEGER, comment TEXT, timestamp REAL)")
+    cur.execute("CREATE TABLE IF NOT EXISTS notifications (id INTEGER PRIMARY KEY AUTOINCREMENT, phone TEXT, message TEXT, timestamp REAL, read INTEGER)")
+    cur.execute("CREATE TABLE IF NOT EXISTS aggregates (metric TEXT, dim TEXT, value REAL, PRIMARY KEY (metric, dim))")
+
+
+def _m002_indexes_and_columns(cur):
+    # Promote hot fields out of the JSON blobs
+    cur.execute("ALTER TABLE orders ADD COLUMN total REAL NOT NULL DEFAULT 0")
+    cur.execute("ALTER TABLE orders ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0")
+    cur.execute("ALTER TABLE redeem_codes ADD COLUMN used INTEGER NOT NULL DEFAULT 0")
+    cur.execute("""
+        UPDATE orders SET
+            total = COALESCE(CAST(json_extract(data, '$.total') AS REAL), 0),
+            item_count = COALESCE(json_array_length(data, '$.items'), 0)
+    """)
+    cur.execute("UPDATE redeem_codes SET used = CASE WHEN json_extract(data, '$.used') THEN 1 ELSE 0 END")
+
+    # Every read path becomes an index range scan
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_phone_ts ON orders (phone, timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_ts ON orders (timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_redeem_phone_used ON redeem_codes (phone, used)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_notifications_phone_ts ON notifications (phone, timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_feedback_ts ON feedback (timestamp)")
+
+
+def _m003_order_status_history(cur):
+    # One row per status an order enters; order_ts (creation time) is copied in so
+    # turnaround needs no join. Orders from before this migration have no history.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS order_status_history (
+            order_id TEXT, phone TEXT, status TEXT, timestamp REAL, order_ts REAL)
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_status_history_status_ts ON order_status_history (status, timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_status_history_order ON order_status_history (order_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_status_history_phone ON order_status_history (phone)")
+
+
+def _m004_rollups(cur):
+    # Hour/day buckets of the aggregates counters; filled by MemoryBank on first start
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS rollups (
+            granularity TEXT, bucket INTEGER, metric TEXT, dim TEXT, value REAL,
+            PRIMARY KEY (granularity, bucket, metric, dim)) WITHOUT ROWID
+    """)
+
+
+def _m005_approval_tasks(cur):
+    # Human-in-the-loop approvals; 'waiting' rows are the persisted pending queue
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS approval_tasks (
+            order_id TEXT PRIMARY KEY, status TEXT, data TEXT, result TEXT,
+            created REAL, updated REAL, expires REAL)
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_approval_tasks_status_created ON approval_tasks (status, created)")
+
+
+def _m006_offer_eligibility(cur):
+    # One row per customer: unused redeem codes and when the offer job may look at them again
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS offer_eligibility (
+            phone TEXT PRIMARY KEY, active_offers INTEGER NOT NULL DEFAULT 0,
+            next_eligible_at REAL NOT NULL DEFAULT 0)
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_offer_eligibility_due ON offer_eligibility (active_offers, next_eligible_at)")
+    cur.execute("""
+        INSERT OR IGNORE INTO offer_eligibility (phone, active_offers)
+        SELECT phone, SUM(used = 0) FROM (
+            SELECT phone, used FROM redeem_codes UNION ALL SELECT phone, 1 FROM customers)
+        GROUP BY phone
+    """)
+
+
+MIGRATIONS = [
+    _m001_base_tables,
+    _m002_indexes_and_columns,
+    _m003_order_status_history,
+    _m004_rollups,
+    _m005_approval_tasks,
+    _m006_offer_eligibility,
+]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Brings the database up to the latest version. Returns the final version."""
+    cur = conn.cursor()
+    while True:
+        # Take the write lock before reading the version so concurrent workers
+        # starting at the same time don't apply the same step twice.
+        cur.execute("BEGIN IMMEDIATE")
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(MIGRATIONS):
+            conn.rollback()
+            return version
+        migration = MIGRATIONS[version]
+        logger.info(f"Applying SQLite migration {version + 1}: {migration.__name__}")
+        try:
+            migration(cur)
+            cur.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
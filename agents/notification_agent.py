@@ -2,9 +2,56 @@
 
 from google.adk import Agent, AgentConfig
 from google.adk.tools import ToolContext
+from google import genai
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+from agents.response_parsing import parse_json_response
+from agents.memory_bank import get_memory_bank
+
+ORDER_ID_SLOT = "{order_id}"
+
+class MessageVariants:
+    """
+    Per-status pools of generated notification templates. One model call fills a
+    status's pool with several variants (with an {order_id} slot); later
+    notifications pick one at random until the pool is older than ttl_seconds.
+    """
+    def __init__(self, size: int = 5, ttl_seconds: float = 86400):
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self._pools = {}  # status -> (templates, created)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def pick(self, status: str):
+        with self._lock:
+            pool = self._pools.get(status)
+            if pool and pool[0] and time.time() - pool[1] <= self.ttl_seconds:
+                self.hits += 1
+                return random.choice(pool[0])
+            self.misses += 1
+            return None
+
+    def fill(self, status: str, templates: list):
+        with self._lock:
+            self._pools[status] = (list(templates), time.time())
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                    "statuses": {s: len(p[0]) for s, p in self._pools.items()}}
 
 class NotificationAgent(Agent):
-    def __init__(self, notifier_tool=None):
+    def __init__(self, notifier_tool=None, mem=None):
         super().__init__(
             config=AgentConfig(
                 name="notification_agent",
@@ -16,64 +63,68 @@ class NotificationAgent(Agent):
         # In a real ADK app, tools are registered with the runtime.
         # Here we pass the tool implementation directly for the shim.
         self.tool = notifier_tool
+        # Injected by the apps; standalone use falls back to the process-wide instance
+        self.mem = mem if mem is not None else get_memory_bank()
         
-        # Initialize Gemini for message generation
-        import google.generativeai as genai
-        import os
-        self.genai = genai
-        
-        # Support both env vars
-        api_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
-        
-        if api_key:
-            self.genai.configure(api_key=api_key)
-            self.model = self.genai.GenerativeModel('gemini-2.0-flash-exp')
-        else:
-            print("[NotificationAgent] Warning: No API Key found (GEMINI_API_KEY or GOOGLE_API_KEY)")
-            self.model = None
+        # Shared, rate-limited Gemini client (google/genai shim)
+        self.client = genai.Client()
+        # Generated copy is reused per status, so most notifications skip the model
+        self.variants = MessageVariants(Config.NOTIFY_VARIANTS_PER_STATUS, Config.NOTIFY_VARIANTS_TTL_SECONDS)
+        self._filling = {}  # (loop, status) -> asyncio.Task, so concurrent misses share one call
+
+    async def compose(self, inputs: dict) -> str:
+        """Message for {"type": "order_update", "status", "order_id"} (or the explicit "message")."""
+        msg = inputs.get("message") or inputs.get("msg")
+        if msg or inputs.get("type") != "order_update":
+            return msg
+        status = inputs.get("status")
+        order_id = str(inputs.get("order_id"))
+        template = self.variants.pick(status)
+        if template is None:
+            key = (asyncio.get_running_loop(), status)
+            task = self._filling.get(key)
+            if task is None:
+                task = self._filling[key] = asyncio.ensure_future(self._generate_variants(status))
+                task.add_done_callback(lambda _: self._filling.pop(key, None))
+            templates = await task
+            template = random.choice(templates) if templates else None
+        if not template:
+            return f"Your order {order_id} is {status}! 🧺"
+        return template.replace(ORDER_ID_SLOT, order_id)
+
+    async def _generate_variants(self, status: str) -> list:
+        try:
+            prompt = f"""
+            You are a witty, friendly laundry assistant (like the Duolingo owl but for laundry).
+            Write {self.variants.size} different SHORT, FUN push notifications for an order which is now '{status}'.
+            Refer to the order as Order #{ORDER_ID_SLOT} (keep that placeholder exactly as written).
+            Use emojis. Be encouraging or slightly dramatic but cute.
+            Max 15 words each. Return only a JSON array of strings.
+            """
+            response = await self.client.models.generate_content_async(
+                model=self.config.model, contents=prompt, priority=genai.BACKGROUND
+            )
+            templates = [t.strip() for t in parse_json_response(response.text, default=[])
+                         if isinstance(t, str) and t.strip()]
+        except Exception as e:
+            # Also covers a missing API key (the shim raises)
+            print(f"[NotificationAgent] Generation failed: {e}")
+            return []
+        if templates:
+            self.variants.fill(status, templates)
+        return templates
 
     async def handle(self, ctx: ToolContext):
         phone = ctx.inputs.get("phone")
-        msg = ctx.inputs.get("message") or ctx.inputs.get("msg")
-        
-        # If no explicit message, generate one based on context
-        if not msg and ctx.inputs.get("type") == "order_update":
-            status = ctx.inputs.get("status")
-            order_id = ctx.inputs.get("order_id")
-            
-            if self.model:
-                try:
-                    prompt = f"""
-                    You are a witty, friendly laundry assistant (like the Duolingo owl but for laundry).
-                    Write a SHORT, FUN push notification for Order #{order_id} which is now '{status}'.
-                    Use emojis. Be encouraging or slightly dramatic but cute.
-                    Max 15 words.
-                    """
-                    response = self.model.generate_content(prompt)
-                    msg = response.text.strip()
-                except Exception as e:
-                    print(f"[NotificationAgent] Generation failed: {e}")
-                    msg = f"Your order {order_id} is {status}! 🧺"
-            else:
-                msg = f"Your order {order_id} is {status}! 🧺"
+        msg = await self.compose(ctx.inputs)
 
         # In real ADK: return await ctx.call_tool("push_notify_tool", {"phone":phone, "msg":msg})
         # For our shim/demo:
         print(f"[NotificationAgent] Sending to {phone}: {msg}")
         
         # Save to memory bank so it can be fetched by UI
-        # We need access to memory bank. In this shim, we can import the global one or pass it in.
-        # Ideally passed in init, but for quick fix we can import from app context or similar.
-        # But since this is an Agent class, let's try to get it from the tool context or import.
-        # Actually, let's just import the MemoryBank class and instantiate it (it handles singleton/connection logic)
-        # OR better, pass it in constructor if possible.
-        # Given the constraints, let's import the global 'mem' from business_app.app if running there, 
-        # but this agent might run in isolation.
-        # SAFEST: Re-instantiate MemoryBank (it connects to same DB/Firestore)
         try:
-            from agents.memory_bank import MemoryBank
-            mem = MemoryBank()
-            mem.save_notification(phone, msg)
+            await asyncio.to_thread(self.mem.save_notification, phone, msg)
         except Exception as e:
             print(f"[NotificationAgent] Failed to save notification: {e}")
 
@@ -0,0 +1,224 @@
+# agents/notification_outbox.py
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from agents.async_runtime import get_runtime
+
+logger = logging.getLogger("notification_outbox")
+
+
+class NotificationOutbox:
+    """
+    Persistent queue of outbound customer notifications.
+
+    Request handlers enqueue() and return; worker threads claim rows, compose the
+    message (an awaitable `compose(payload) -> str`, run on the AsyncRuntime loop)
+    and store it with mem.save_notification(). The queue is a SQLite file shared by
+    every worker process on the host, so nothing is lost on restart.
+
+    - A claimed row is leased for lease_seconds; rows from a crashed worker are
+      picked up again once the lease runs out.
+    - Failures are retried with jittered exponential backoff; after max_attempts
+      the row is dead-lettered (status 'dead') for inspection and retry_dead().
+    - An error bookkeeping a row (e.g. a locked outbox file) is logged and the
+      worker moves on; the expired lease hands the row out again.
+    - Idle workers sleep on an Event set by enqueue() in this process, and look
+      at the table every poll_interval for rows enqueued by other processes.
+    """
+    def __init__(self, mem, compose: Callable, db_path: str, workers: int = 2, max_attempts: int = 5,
+                 backoff_base: float = 2.0, backoff_cap: float = 300, lease_seconds: float = 120,
+                 poll_interval: float = 1.0, retention_seconds: float = 86400):
+        self.mem = mem
+        self.compose = compose
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._wake = threading.Event()
+        self._local = threading.local()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._last_prune = 0.0
+        self.sent = self.failed = self.dead = 0
+        self._recent = deque(maxlen=1000)  # (sent_at, seconds from enqueue to sent)
+
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT, status TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL, lease_until REAL,
+                last_error TEXT, created REAL, updated REAL)
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON notification_outbox (status, next_attempt)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets workers in other processes read while we write
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        """Starts the worker threads (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"outbox-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, payload: Dict) -> int:
+        """Queues a notification ({"phone", "message"} or {"phone", "type", "status", "order_id"})."""
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO notification_outbox (payload, status, next_attempt, created, updated) VALUES (?, 'queued', ?, ?, ?)",
+            (json.dumps(payload), now, now, now)
+        )
+        self._wake.set()
+        return cur.lastrowid
+
+    # --- Workers ---
+
+    def _claim(self, limit: int = 10) -> List[tuple]:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("""
+                SELECT id, payload, attempts, created FROM notification_outbox
+                WHERE (status = 'queued' AND next_attempt <= ?) OR (status = 'sending' AND lease_until < ?)
+                ORDER BY next_attempt LIMIT ?
+            """, (now, now, limit)).fetchall()
+            if rows:
+                conn.executemany("UPDATE notification_outbox SET status = 'sending', lease_until = ?, updated = ? WHERE id = ?",
+                                 [(now + self.lease_seconds, now, r[0]) for r in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _work(self):
+        while True:
+            try:
+                rows = self._claim()
+            except sqlite3.Error as e:
+                logger.warning(f"Outbox claim failed: {e}")
+                rows = []
+            if not rows:
+                self._prune()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            for row in rows:
+                try:
+                    self._deliver(*row)
+                except Exception as e:
+                    # e.g. the status UPDATE hit a locked outbox; the row stays leased
+                    # and is picked up again once the lease runs out
+                    logger.error(f"Outbox row {row[0]} could not be processed: {e}")
+
+    def _deliver(self, row_id: int, payload: str, attempts: int, created: float):
+        try:
+            data = json.loads(payload)
+            message = data.get("message") or get_runtime().run(self.compose(data))
+            self.mem.save_notification(data["phone"], message)
+        except Exception as e:
+            self._failed(row_id, attempts + 1, e)
+            return
+        now = time.time()
+        self._conn().execute(
+            "UPDATE notification_outbox SET status = 'sent', attempts = ?, last_error = NULL, updated = ? WHERE id = ?",
+            (attempts + 1, now, row_id)
+        )
+        with self._lock:
+            self.sent += 1
+            self._recent.append((now, now - created))
+
+    def _failed(self, row_id: int, attempts: int, error: Exception):
+        now = time.time()
+        if attempts >= self.max_attempts:
+            status, next_attempt = 'dead', None
+            logger.error(f"Notification {row_id} dead-lettered after {attempts} attempts: {error}")
+        else:
+            status = 'queued'
+            next_attempt = now + random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempts))
+            logger.warning(f"Notification {row_id} failed (attempt {attempts}), retrying: {error}")
+        self._conn().execute(
+            "UPDATE notification_outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ?, updated = ? WHERE id = ?",
+            (status, attempts, next_attempt, str(error)[:500], now, row_id)
+        )
+        with self._lock:
+            self.failed += 1
+            if status == 'dead':
+                self.dead += 1
+
+    def _prune(self):
+        now = time.time()
+        if now - self._last_prune < 600:
+            return
+        self._last_prune = now
+        try:
+            self._conn().execute("DELETE FROM notification_outbox WHERE status = 'sent' AND updated < ?",
+                                 (now - self.retention_seconds,))
+        except sqlite3.Error as e:
+            logger.warning(f"Outbox prune failed: {e}")
+
+    # --- Dead letters and metrics ---
+
+    def list_dead(self, limit: int = 50) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT id, payload, attempts, last_error, created, updated FROM notification_outbox "
+            "WHERE status = 'dead' ORDER BY updated DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [{"id": r[0], "payload": json.loads(r[1]), "attempts": r[2], "last_error": r[3],
+                 "created": r[4], "updated": r[5]} for r in rows]
+
+    def retry_dead(self, row_id: Optional[int] = None) -> int:
+        """Puts one (or every) dead-lettered notification back in the queue with fresh attempts."""
+        now = time.time()
+        where, params = "status = 'dead'", [now, now]
+        if row_id is not None:
+            where += " AND id = ?"
+            params.append(row_id)
+        cur = self._conn().execute(
+            f"UPDATE notification_outbox SET status = 'queued', attempts = 0, next_attempt = ?, updated = ? WHERE {where}",
+            params
+        )
+        self._wake.set()
+        return cur.rowcount
+
+    def stats(self) -> Dict:
+        counts = dict(self._conn().execute(
+            "SELECT status, COUNT(*) FROM notification_outbox GROUP BY status").fetchall())
+        now = time.time()
+        with self._lock:
+            latencies = sorted(l for t, l in self._recent)
+            last_minute = sum(1 for t, _ in self._recent if now - t <= 60)
+            return {
+                "queue": {s: counts.get(s, 0) for s in ('queued', 'sending', 'sent', 'dead')},
+                "sent": self.sent,
+                "failed_attempts": self.failed,
+                "dead_lettered": self.dead,
+                "sent_last_minute": last_minute,
+                "throughput_per_second": round(self.sent / max(now - self._started_at, 1e-9), 3),
+                "latency_p50": round(latencies[len(latencies) // 2], 3) if latencies else 0.0,
+                "latency_p95": round(latencies[int(len(latencies) * 0.95)], 3) if latencies else 0.0,
+                "workers": len(self._threads),
+            }
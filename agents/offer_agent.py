@@ -1,14 +1,19 @@
 # agents/offer_agent.py
 from google.adk import Agent, AgentConfig
 from google.adk.tools import ToolContext
-import random, string
-from typing import Dict
+import logging, random, string, threading, time
+from typing import Dict, Optional
+
+from agents.async_runtime import get_runtime
+from agents.offer_campaign import TIERS, OfferCampaign
+
+logger = logging.getLogger("offer_agent")
 
 def _code():
     return ''.join(random.choice("ABCDEFGH0123456789") for _ in range(6))
 
 class OfferAgent(Agent):
-    def __init__(self, memory_bank, a2a):
+    def __init__(self, memory_bank, a2a, cooldown_seconds: float = 86400, batch_size: int = 1000):
         super().__init__(
             config=AgentConfig(
                 name="offer_agent",
@@ -21,30 +26,29 @@ class OfferAgent(Agent):
         )
         self.mem = memory_bank
         self.a2a = a2a
+        # A customer evaluated by the batch job (offer or not) isn't looked at again for cooldown_seconds
+        self.campaign = OfferCampaign(memory_bank, cooldown_seconds=cooldown_seconds, chunk_size=batch_size)
+        self._scheduler = None
+        self._lock = threading.Lock()
 
     async def handle(self, ctx: ToolContext):
         phone = ctx.inputs["phone"]
-        profile = self.mem.get_customer(phone) or {}
-
-        # Check if we already gave an offer recently (simple check: if any unused offer exists)
-        existing_offers = self.mem.get_redeems_by_phone(phone)
-        unused_offers = [o for o in existing_offers if not o.get('used', False)]
-        
-        if len(unused_offers) > 0:
-            # User already has an active offer, don't spam
+
+        # Don't spam: one unused code at a time (index lookup, no code scan)
+        state = self.mem.get_offer_eligibility(phone) or {}
+        if state.get("active_offers", 0) > 0:
             return {"status": "skipped", "reason": "Active offer exists"}
 
-        # Simple logic for demo
-        avg_spend = profile.get("avg_spend", 0)
-        # Only give offer if spend > 0 (returning customer) or random chance
-        import random
-        if avg_spend == 0 and random.random() > 0.3:
-             return {"status": "skipped", "reason": "New user, no spend history"}
+        # Same spend / frequency / recency scoring as the batch campaign
+        plan = self.campaign.plan([phone])
+        if not plan:
+            return {"status": "skipped", "reason": "No recent order history"}
+        _, discount, reason = TIERS[plan[0][1]]
+        return await self._issue(phone, discount, reason)
 
-        discount = "20% OFF" if avg_spend > 500 else "10% OFF"
+    async def _issue(self, phone: str, discount: str, reason: str) -> Dict:
         code = _code()
-
-        self.mem.save_redeem(code, phone, {"discount":discount, "used":False, "type": "personal"})
+        self.mem.save_redeem(code, phone, {"discount":discount, "used":False, "type": "personal", "reason": reason})
 
         # Call Notification Agent via A2A
         await self.a2a.call("notification_agent", {
@@ -53,11 +57,36 @@ class OfferAgent(Agent):
 
         return {"code":code, "discount":discount}
 
+    # --- Scheduled batch ---
+
+    def run_batch(self, now: Optional[float] = None, progress=None) -> Dict:
+        """
+        One campaign pass over every due customer (no unused code, past next_eligible_at);
+        see OfferCampaign. Safe to run in several workers at once.
+        """
+        return self.campaign.run(now, progress)
+
+    def start_scheduler(self, interval_seconds: float):
+        """Runs run_batch() every interval_seconds on a daemon thread (idempotent; <= 0 disables)."""
+        with self._lock:
+            if self._scheduler or interval_seconds <= 0:
+                return
+            self._scheduler = threading.Thread(target=self._schedule, args=(interval_seconds,),
+                                               name="offer-batch", daemon=True)
+            self._scheduler.start()
+
+    def _schedule(self, interval_seconds: float):
+        while True:
+            try:
+                self.run_batch()
+            except Exception as e:
+                logger.error(f"Offer batch failed: {e}")
+            time.sleep(interval_seconds)
+
     # Legacy method
     def generate_personalized_offer(self, phone):
-        import asyncio
         ctx = ToolContext({"phone": phone})
-        return asyncio.run(self.handle(ctx))
+        return get_runtime().run(self.handle(ctx))
 
     def generate_first_time_code(self, phone: str) -> str:
         # Simple logic for first time code
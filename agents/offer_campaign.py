@@ -0,0 +1,158 @@
+# agents/offer_campaign.py
+import logging
+import time
+import uuid
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("offer_campaign")
+
+DAY = 86400.0
+# 32 unambiguous symbols; 8 of them keep collisions negligible at 100k codes per run
+CODE_ALPHABET = np.array(list("ABCDEFGHJKLMNPQRSTUVWXYZ23456789"))
+CODE_LENGTH = 8
+# Offers whose code was already taken are re-issued with fresh codes this many times
+CODE_RETRIES = 3
+
+# (tier, discount, reason) in priority order; index into this is the tier id
+TIERS = (
+    ("vip", "20% OFF", "Thanks for being one of our best customers"),
+    ("win_back", "25% OFF", "We miss you"),
+    ("regular", "10% OFF", "Thanks for coming back"),
+)
+NO_OFFER = -1
+
+
+def customer_features(stats: Dict[str, list], now: float) -> Dict[str, np.ndarray]:
+    """
+    Spend / frequency / recency arrays from MemoryBank.order_stats_by_phone() columns.
+    Customers without orders get recency = inf and frequency = 0.
+    """
+    orders = np.asarray(stats["orders"], dtype=np.float64)
+    spend = np.asarray(stats["spend"], dtype=np.float64)
+    first = np.asarray([np.nan if t is None else t for t in stats["first_order"]], dtype=np.float64)
+    last = np.asarray([np.nan if t is None else t for t in stats["last_order"]], dtype=np.float64)
+    has_orders = orders > 0
+    # Tenure is floored at 30 days so one recent order doesn't read as "30 orders a month"
+    tenure_days = np.maximum(np.where(has_orders, (now - first) / DAY, 30.0), 30.0)
+    return {
+        "orders": orders,
+        "spend": spend,
+        "avg_spend": np.divide(spend, orders, out=np.zeros_like(spend), where=has_orders),
+        "frequency": orders / tenure_days * 30.0,  # orders per 30 days
+        "recency_days": np.where(has_orders, np.maximum(now - last, 0) / DAY, np.inf),
+    }
+
+
+def score_customers(features: Dict[str, np.ndarray]):
+    """
+    RFM-style score in [0, 1] and a tier id (index into TIERS, or NO_OFFER) per customer.
+    Recency decays with a 30-day time constant; frequency saturates at 4 orders a month
+    and average spend at 500.
+    """
+    recency = np.exp(-features["recency_days"] / 30.0)
+    frequency = np.minimum(features["frequency"] / 4.0, 1.0)
+    monetary = np.minimum(features["avg_spend"] / 500.0, 1.0)
+    score = 0.4 * recency + 0.3 * frequency + 0.3 * monetary
+
+    orders = features["orders"]
+    tiers = np.select(
+        [
+            (orders > 0) & ((score >= 0.6) | (features["avg_spend"] > 500)),
+            (orders >= 2) & (features["recency_days"] >= 60),
+            (orders > 0) & (score >= 0.2),
+        ],
+        [0, 1, 2],
+        default=NO_OFFER,
+    )
+    return score, tiers
+
+
+def generate_codes(count: int, rng: Optional[np.random.Generator] = None) -> list:
+    rng = rng or np.random.default_rng()
+    symbols = CODE_ALPHABET[rng.integers(0, len(CODE_ALPHABET), size=(count, CODE_LENGTH))]
+    return ["".join(row) for row in symbols]
+
+
+class OfferCampaign:
+    """
+    Batch offer run over every due customer (see MemoryBank.claim_offer_candidates).
+
+    Each chunk is: claim chunk_size due customers, load their order aggregates in
+    one query, score them as NumPy arrays, then write every offer of the chunk
+    (redeem code, eligibility count, notification) in one transaction. Claimed
+    customers are held for cooldown_seconds whether or not they got an offer, so
+    several workers can run campaigns at once without doubling up. That hold is
+    also what ends a run, so cooldown_seconds must be positive.
+    """
+    def __init__(self, mem, cooldown_seconds: float = 86400, chunk_size: int = 1000):
+        if cooldown_seconds <= 0:
+            raise ValueError("cooldown_seconds must be > 0")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+        self.mem = mem
+        self.cooldown_seconds = cooldown_seconds
+        self.chunk_size = chunk_size
+
+    def plan(self, phones: list, now: Optional[float] = None) -> list:
+        """[(phone, tier_id, score)] for the customers that would get an offer; writes nothing."""
+        now = now or time.time()
+        if not phones:
+            return []
+        stats = self.mem.order_stats_by_phone(phones)
+        score, tiers = score_customers(customer_features(stats, now))
+        picked = np.flatnonzero(tiers != NO_OFFER)
+        return [(stats["phone"][i], int(tiers[i]), float(score[i])) for i in picked]
+
+    def offers_for(self, plan: list, campaign_id: str) -> list:
+        """(code, phone, data, message) rows for MemoryBank.save_offers_bulk()."""
+        rows = []
+        for (phone, tier, score), code in zip(plan, generate_codes(len(plan))):
+            name, discount, reason = TIERS[tier]
+            data = {"discount": discount, "used": False, "type": "personal", "reason": reason,
+                    "tier": name, "score": round(score, 3), "campaign": campaign_id}
+            rows.append((code, phone, data, f"You earned {discount}! Use code {code}"))
+        return rows
+
+    def save(self, plan: list, campaign_id: str) -> list:
+        """
+        Writes the plan's offers with save_offers_bulk(). That skips codes that already
+        exist, and the customer stays claimed either way, so skipped offers are retried
+        with fresh codes instead of silently holding the customer for the cooldown.
+        """
+        saved = []
+        for _ in range(CODE_RETRIES + 1):
+            done = self.mem.save_offers_bulk(self.offers_for(plan, campaign_id))
+            saved.extend(done)
+            issued = {phone for _, phone, _, _ in done}
+            plan = [entry for entry in plan if entry[0] not in issued]
+            if not plan:
+                break
+        if plan:
+            logger.error(f"Offer campaign {campaign_id}: no free code for {len(plan)} customers "
+                         f"after {CODE_RETRIES} retries; they stay held for the cooldown")
+        return saved
+
+    def run(self, now: Optional[float] = None, progress=None) -> Dict:
+        now = now or time.time()
+        report = progress or (lambda update: None)
+        campaign_id = uuid.uuid4().hex[:12]
+        started = time.perf_counter()
+        evaluated = issued = 0
+        by_tier = {name: 0 for name, _, _ in TIERS}
+        while True:
+            phones = self.mem.claim_offer_candidates(now, now + self.cooldown_seconds, self.chunk_size)
+            if not phones:
+                break
+            saved = self.save(self.plan(phones, now), campaign_id)
+            for _, _, data, _ in saved:
+                by_tier[data["tier"]] += 1
+            evaluated += len(phones)
+            issued += len(saved)
+            report({"stage": "evaluating", "evaluated": evaluated, "issued": issued})
+        elapsed = time.perf_counter() - started
+        if evaluated:
+            logger.info(f"Offer campaign {campaign_id}: {issued} offers for {evaluated} customers in {elapsed:.2f}s")
+        return {"campaign": campaign_id, "evaluated": evaluated, "issued": issued,
+                "tiers": by_tier, "seconds": round(elapsed, 3)}
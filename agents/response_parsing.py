@@ -0,0 +1,237 @@
+# agents/response_parsing.py
+"""
+Pulling JSON out of model output.
+
+Gemini wraps JSON in markdown fences, prefixes it with prose, stops mid-object
+when it hits the token limit, and now and then writes trailing commas or Python
+literals. These helpers tolerate all of that, so one stray character no longer
+throws away an expensive call.
+
+- JSONArrayStream: feed streamed text chunks, get each complete array element
+  back as soon as its closing brace arrives (progressive rendering).
+- parse_json_response: one-shot parse of a full response, with repair.
+"""
+import json
+import logging
+import re
+from typing import Any, Iterable, List
+
+logger = logging.getLogger("response_parsing")
+
+_TRAILING_COMMA = re.compile(r",\s*([\]}])")
+_PY_LITERALS = re.compile(r"\b(True|False|None)\b")
+_PY_TO_JSON = {"True": "true", "False": "false", "None": "null"}
+
+
+def strip_fences(text: str) -> str:
+    """Returns what is inside the first ``` fence (or the text itself if there is none)."""
+    match = re.search(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", text, re.S)
+    return match.group(1) if match else text
+
+
+def _replace_outside_strings(text: str, pattern: re.Pattern, repl) -> str:
+    # Only touch structural text; "None" inside a label must stay as is
+    out, start = [], 0
+    for match in re.finditer(r'"(?:\\.|[^"\\])*"', text):
+        out.append(pattern.sub(repl, text[start:match.start()]))
+        out.append(match.group(0))
+        start = match.end()
+    out.append(pattern.sub(repl, text[start:]))
+    return "".join(out)
+
+
+def repair_json(text: str) -> str:
+    """
+    Best-effort fix of common model faults: fences/prose around the JSON,
+    trailing commas, Python True/False/None, and truncation (unterminated string,
+    dangling key or comma, unclosed brackets).
+    """
+    text = strip_fences(text)
+    starts = [i for i in (text.find("["), text.find("{")) if i >= 0]
+    if not starts:
+        return text.strip()
+    text = text[min(starts):]
+
+    text = _replace_outside_strings(text, _PY_LITERALS, lambda m: _PY_TO_JSON[m.group(1)])
+    text = _replace_outside_strings(text, _TRAILING_COMMA, lambda m: m.group(1))
+
+    # Walk the text to find where it stops being balanced
+    stack, in_string, escape, end = [], False, False, len(text)
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "[{":
+            stack.append("]" if ch == "[" else "}")
+        elif ch in "]}":
+            if stack:
+                stack.pop()
+            if not stack:
+                end = i + 1  # Ignore anything after the top-level value closes
+                break
+    text = text[:end]
+    if not stack:
+        return text
+
+    # Truncated: close the open string, drop an incomplete trailing member, close brackets
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    text = re.sub(r'(\d)\.$', r'\1', text)                          # 0.  -> 0
+    text = re.sub(r'(?<=[\[,:])\s*(-|t|tr|tru|f|fa|fal|fals|n|nu|nul)$', '', text)  # cut-off number/literal
+    text = re.sub(r'\s*"(?:\\.|[^"\\])*"\s*:\s*$', '', text)         # "key": with no value
+    if stack[-1] == "}":
+        # A bare string right after '{' or ',' is a key that never got its value
+        text = re.sub(r'([{,])\s*"(?:\\.|[^"\\])*"$', r'\1', text)
+    text = re.sub(r',\s*$', '', text)
+    return text + "".join(reversed(stack))
+
+
+def parse_json_response(text: str, default: Any = None) -> Any:
+    """json.loads with repair; returns default if nothing usable can be recovered."""
+    candidates = (text, strip_fences(text))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except (ValueError, TypeError):
+            pass
+    try:
+        return json.loads(repair_json(text))
+    except (ValueError, TypeError):
+        pass
+    # Last resort: salvage whatever complete elements the array has
+    stream = JSONArrayStream()
+    elements = stream.feed(text) + stream.close()
+    if elements:
+        return elements
+    logger.warning(f"Unparseable model response: {text[:200]!r}")
+    return default
+
+
+class JSONArrayStream:
+    """
+    Incremental extractor for the elements of a top-level JSON array in streamed
+    text. Anything before the first '[' (prose, a ```json fence) is skipped, and
+    so is anything after the closing ']'.
+
+        stream = JSONArrayStream()
+        for chunk in response:
+            for item in stream.feed(chunk.text):
+                ...
+        leftovers = stream.close()   # repairs a truncated final element
+    """
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0          # next character to scan
+        self._started = False  # seen the opening '['
+        self._done = False     # seen the closing ']'
+        self._depth = 0        # nesting below the top-level array
+        self._in_string = False
+        self._escape = False
+        self._elem_start = None
+        self._truncated = False  # close() came before the closing ']'
+        self._repaired = False   # an element needed repair_json() or was dropped
+
+    @property
+    def found_array(self) -> bool:
+        """True once the opening '[' has been seen; a prose-only reply never sets it."""
+        return self._started
+
+    @property
+    def intact(self) -> bool:
+        """After close(): the array was closed and every element parsed as sent."""
+        return self._started and not self._truncated and not self._repaired
+
+    def feed(self, chunk: str) -> List[Any]:
+        if self._done or not chunk:
+            return []
+        self._buf += chunk
+        out = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf) and not self._done:
+            ch = buf[i]
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                i += 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+                if self._elem_start is None:
+                    self._elem_start = i
+            elif ch in "[{":
+                if self._elem_start is None:
+                    self._elem_start = i
+                self._depth += 1
+            elif ch in "]}":
+                if self._depth == 0:
+                    # Closing bracket of the top-level array
+                    self._emit(buf[self._elem_start:i] if self._elem_start is not None else "", out)
+                    self._elem_start = None
+                    self._done = True
+                else:
+                    self._depth -= 1
+            elif ch == "," and self._depth == 0:
+                self._emit(buf[self._elem_start:i] if self._elem_start is not None else "", out)
+                self._elem_start = None
+            elif not ch.isspace() and self._elem_start is None:
+                self._elem_start = i  # Scalar element
+            i += 1
+
+        # Drop what has been consumed so the buffer stays small
+        keep = self._elem_start if self._elem_start is not None else i
+        self._buf = buf[keep:]
+        self._pos = i - keep
+        if self._elem_start is not None:
+            self._elem_start = 0
+        return out
+
+    def close(self) -> List[Any]:
+        """Flushes a truncated trailing element, repaired if possible."""
+        if self._done:
+            return []
+        self._truncated = True
+        if self._elem_start is None:
+            return []
+        out = []
+        self._emit(self._buf, out)
+        self._done = True
+        return out
+
+    def _emit(self, text: str, out: list):
+        text = text.strip()
+        if not text:
+            return
+        try:
+            out.append(json.loads(text))
+            return
+        except ValueError:
+            pass
+        self._repaired = True
+        try:
+            out.append(json.loads(repair_json(text)))
+        except ValueError:
+            logger.warning(f"Dropping unparseable array element: {text[:120]!r}")
+
+
+def iter_array_elements(chunks: Iterable[str]):
+    """Generator form of JSONArrayStream over an iterable of text chunks."""
+    stream = JSONArrayStream()
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+    yield from stream.close()
@@ -0,0 +1,83 @@
+# agents/result_cache.py
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable, Tuple
+
+from agents.async_runtime import get_runtime
+
+logger = logging.getLogger("result_cache")
+
+
+class ResultCache:
+    """
+    Versioned stale-while-revalidate cache for expensive async computations
+    (e.g. the analytics swarm's LLM calls).
+
+    - An entry is fresh while the caller's data version (a counter that only
+      grows) matches the one it was computed at; a new version triggers a recompute.
+    - Stale entries (younger than max_stale_seconds) are served immediately while
+      the refresh runs in the background.
+    - Concurrent requests for the same key share one computation. It runs on the
+      process-wide AsyncRuntime loop, so it is shared across request threads and
+      outlives the request that started it.
+    """
+    def __init__(self, max_stale_seconds: float = 3600, max_entries: int = 64):
+        self.max_stale_seconds = max_stale_seconds
+        self.max_entries = max_entries
+        self._entries = {}   # key -> (version, value, computed_at)
+        self._inflight = {}  # key -> (version, Future)
+        self._lock = threading.Lock()
+        self.hits = self.stale_hits = self.misses = 0
+
+    async def get(self, key: Hashable, version: Any, compute: Callable[[], Awaitable]) -> Tuple[Any, str]:
+        """Returns (value, state) where state is 'hit', 'stale' or 'miss'."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self.hits += 1
+                return entry[1], "hit"
+            future, started = self._refresh(key, version, compute)
+            stale = entry and time.time() - entry[2] <= self.max_stale_seconds
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+        if started:
+            # Outside the lock: a computation that already finished runs _store right here
+            future.add_done_callback(lambda f: self._store(key, version, f))
+        if stale:
+            return entry[1], "stale"
+        return await asyncio.wrap_future(future), "miss"
+
+    def _refresh(self, key, version, compute) -> Tuple[Future, bool]:
+        """(future, started): started is False when joining a computation already running."""
+        # Caller holds the lock; the caller attaches _store to a started future after releasing it
+        inflight = self._inflight.get(key)
+        if inflight and inflight[0] == version:
+            return inflight[1], False  # Coalesce with the computation already running
+        future = get_runtime().submit(compute())
+        self._inflight[key] = (version, future)
+        return future, True
+
+    def _store(self, key, version, future: Future):
+        with self._lock:
+            if self._inflight.get(key, (None, None))[1] is future:
+                del self._inflight[key]
+            if future.cancelled() or future.exception() is not None:
+                logger.warning(f"Refresh of {key!r} failed: {future.exception() if not future.cancelled() else 'cancelled'}")
+                return
+            current = self._entries.get(key)
+            # An older computation finishing late must not replace a newer result
+            if current is None or current[0] <= version:
+                self._entries[key] = (version, future.result(), time.time())
+                while len(self._entries) > self.max_entries:
+                    oldest = min(self._entries, key=lambda k: self._entries[k][2])
+                    del self._entries[oldest]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses,
+                    "entries": len(self._entries), "inflight": len(self._inflight)}
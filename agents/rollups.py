@@ -0,0 +1,58 @@
+# agents/rollups.py
+"""
+Time-bucketed copies of the analytics counters (see MemoryBank aggregates).
+
+Every order/feedback delta is also added to the hour and day bucket of the
+record's own timestamp (UTC bucket boundaries), keyed by
+(granularity, bucket_start, metric, dim). Reading a chart is then a range scan
+over at most one row per bucket and dimension, however many orders fall in it.
+"""
+from typing import Dict, Iterable, Optional
+
+GRANULARITIES = {"hour": 3600, "day": 86400}
+# Upper bound on buckets per timeseries request (~7 months of hours)
+MAX_BUCKETS = 5000
+
+
+def bucket_start(ts: float, granularity: str) -> int:
+    size = GRANULARITIES[granularity]
+    return int(ts // size) * size
+
+
+def rollup_deltas(deltas: Dict, ts: Optional[float]) -> Dict:
+    """Spreads (metric, dim) deltas into every granularity's bucket for ts."""
+    if ts is None:
+        return {}
+    out = {}
+    for granularity in GRANULARITIES:
+        bucket = bucket_start(ts, granularity)
+        for (metric, dim), value in deltas.items():
+            if value:
+                key = (granularity, bucket, metric, dim)
+                out[key] = out.get(key, 0) + value
+    return out
+
+
+def to_series(rows: Iterable, granularity: str, t0: float, t1: float) -> list:
+    """
+    Zero-filled chart points for [t0, t1) from (bucket, metric, dim, value) rows:
+    [{"bucket", "orders", "revenue", "reviews", "avg_rating", "status", "category", "rating"}].
+    """
+    size = GRANULARITIES[granularity]
+    points = {}
+    for b in range(bucket_start(t0, granularity), int(t1), size):
+        points[b] = {"bucket": b, "orders": 0, "revenue": 0.0, "reviews": 0, "rating_sum": 0,
+                     "status": {}, "category": {}, "rating": {}}
+    for bucket, metric, dim, value in rows:
+        point = points.get(bucket)
+        if point is None or not value:
+            continue
+        value = value if metric == "revenue" else int(value)  # everything else is a count
+        if isinstance(point.get(metric), dict):
+            point[metric][dim] = value
+        elif metric in point:
+            point[metric] = value
+    for point in points.values():
+        rating_sum = point.pop("rating_sum")
+        point["avg_rating"] = round(rating_sum / point["reviews"], 2) if point["reviews"] else 0.0
+    return [points[b] for b in sorted(points)]
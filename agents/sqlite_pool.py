@@ -0,0 +1,149 @@
+# agents/sqlite_pool.py
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+logger = logging.getLogger("sqlite_pool")
+
+
+class SQLitePool:
+    """
+    Connection handling for the SQLite MemoryBank backend.
+
+    - Readers: one connection per thread (WAL lets them run concurrently with the writer).
+    - Writer: a single dedicated thread owns the only write connection and applies
+      jobs from a bounded queue. Writes never contend for the database lock, so
+      "database is locked" can't happen between our own threads. Batches start with
+      BEGIN IMMEDIATE, so writers in other processes queue on busy_timeout instead.
+    - Group commit: the writer drains up to batch_max_ops queued jobs (waiting at most
+      batch_max_delay_ms for more to arrive) and commits them as one transaction.
+      Each job runs in its own savepoint, so a failing job doesn't sink the batch.
+    """
+    def __init__(self, path: str, journal_mode: str = "WAL", synchronous: str = "NORMAL",
+                 busy_timeout_ms: int = 5000, queue_size: int = 1000, submit_timeout: float = 10.0,
+                 batch_max_ops: int = 1, batch_max_delay_ms: int = 0):
+        self.path = path
+        self.batch_max_ops = max(1, batch_max_ops)
+        self.batch_max_delay_ms = batch_max_delay_ms
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self.submit_timeout = submit_timeout
+        self._local = threading.local()
+        self._closed = False
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """Connection private to the calling thread. Use for SELECTs only."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+        return conn
+
+    def write(self, fn: Callable[[sqlite3.Cursor], Any], wait: bool = True) -> Any:
+        """
+        Runs fn(cursor) on the writer thread and returns its result once committed.
+        Exceptions roll back that job and are re-raised here. With wait=False the
+        Future is returned immediately instead (write-behind).
+        """
+        if threading.current_thread() is self._writer:
+            raise RuntimeError("Nested SQLitePool.write() from inside a write job")
+        if self._closed:
+            raise sqlite3.ProgrammingError("SQLitePool is closed")
+        future = Future()
+        try:
+            self._queue.put((fn, future), timeout=self.submit_timeout)
+        except queue.Full:
+            raise sqlite3.OperationalError("SQLite write queue is full")
+        return future.result() if wait else future
+
+    def pending_writes(self) -> int:
+        return self._queue.qsize()
+
+    def close(self, timeout: float = 10.0):
+        """Commits the writes already queued, then stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    def _write_loop(self):
+        conn = self.connect()
+        stop = False
+        while not stop:
+            jobs = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_max_delay_ms / 1000
+            while len(jobs) < self.batch_max_ops and jobs[-1] is not None:
+                remaining = deadline - time.monotonic()
+                try:
+                    jobs.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if jobs[-1] is None:  # close() sentinel
+                jobs.pop()
+                stop = True
+            if jobs:
+                try:
+                    self._run_batch(conn, jobs)
+                except BaseException as e:
+                    # Never let the writer die: callers block on these futures
+                    logger.error(f"SQLite write batch failed: {e}")
+                    self._fail(jobs, e)
+        conn.close()
+
+    @staticmethod
+    def _fail(jobs: list, error: BaseException):
+        for _, future in jobs:
+            if not future.done():
+                future.set_exception(error)
+
+    def _run_batch(self, conn: sqlite3.Connection, jobs: list):
+        outcomes = []
+        try:
+            cur = conn.cursor()
+            # IMMEDIATE takes the write lock up front, waiting up to busy_timeout for other
+            # processes. A deferred BEGIN whose jobs read before writing can't upgrade its
+            # lock while another process writes, and fails at once with "database is locked".
+            cur.execute("BEGIN IMMEDIATE")
+            for fn, future in jobs:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cur.execute("SAVEPOINT job")
+                try:
+                    result = fn(cur)
+                except BaseException as e:
+                    cur.execute("ROLLBACK TO job")
+                    cur.execute("RELEASE job")
+                    outcomes.append((future, None, e))
+                    continue
+                cur.execute("RELEASE job")
+                outcomes.append((future, result, None))
+            conn.commit()
+        except BaseException as e:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            self._fail(jobs, e)
+            return
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -0,0 +1,69 @@
+# agents/task_waiters.py
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger("task_waiters")
+
+# Event hub topic carrying {"type": "task", "order_id", "status"} on every task completion
+TASKS_TOPIC = "approval_tasks"
+
+
+class TaskWaiters:
+    """
+    Wakes coroutines that wait on approval tasks (MemoryBank.wait_for_task).
+
+    Each waiter is an asyncio.Event. One daemon thread per process blocks on the
+    event hub's TASKS_TOPIC queue (no CPU while idle) and sets the matching events
+    through their loop's call_soon_threadsafe. Completions made by other workers
+    arrive through the hub's relay.
+    """
+    def __init__(self, hub):
+        self.hub = hub
+        self._waiters = {}  # order_id -> {(loop, event)}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, order_id: str) -> asyncio.Event:
+        """Must be called from the coroutine that will await the returned event."""
+        self._start()
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(order_id, set()).add(entry)
+        return entry[1]
+
+    def unregister(self, order_id: str, event: asyncio.Event):
+        with self._lock:
+            entries = self._waiters.get(order_id, set())
+            entries.difference_update({e for e in entries if e[1] is event})
+            if not entries:
+                self._waiters.pop(order_id, None)
+
+    def waiting(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._waiters.values())
+
+    def _notify(self, order_id: str):
+        with self._lock:
+            entries = list(self._waiters.get(order_id, ()))
+        for loop, event in entries:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # Loop already closed; its waiter is gone
+
+    def _start(self):
+        with self._lock:
+            if self._thread:
+                return
+            q = self.hub.subscribe(TASKS_TOPIC)
+            self._thread = threading.Thread(target=self._listen, args=(q,), name="task-waiters", daemon=True)
+            self._thread.start()
+
+    def _listen(self, q):
+        while True:
+            event = q.get()
+            try:
+                self._notify(event.get("order_id"))
+            except Exception as e:
+                logger.error(f"Task wake-up failed: {e}")
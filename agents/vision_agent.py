@@ -1,6 +1,6 @@
 # agents/vision_agent.py
 import base64, logging, uuid, os
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
 logger = logging.getLogger("vision_agent")
 
@@ -13,8 +13,16 @@ from google.adk import Agent, AgentConfig
 from google.adk.tools import ToolContext
 from google import genai
 import base64
-import json
 import asyncio
+import sys
+from concurrent.futures import Future
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import Config
+from agents.async_runtime import get_runtime
+from agents.detection_cache import DetectionCache, phash
+from agents.image_preprocess import prepare_image, mime_type
+from agents.response_parsing import JSONArrayStream
 
 class VisionAgent(Agent):
     def __init__(self):
@@ -47,28 +55,70 @@ class VisionAgent(Agent):
         )
 
         self.client = genai.Client()
+        # Caps in-flight model calls; created lazily on the runtime loop
+        self._slots = None
+        # Near-duplicate photos (re-shoots, resubmits) reuse earlier detections
+        self.cache = DetectionCache(
+            max_entries=Config.DETECTION_CACHE_SIZE,
+            ttl_seconds=Config.DETECTION_CACHE_TTL_SECONDS,
+            threshold=Config.DETECTION_CACHE_THRESHOLD,
+            db_path=Config.DETECTION_CACHE_DB or None,
+        ) if Config.DETECTION_CACHE_SIZE > 0 else None
 
     async def handle(self, ctx: ToolContext):
-        img_b64 = ctx.inputs["image_b64"]
-        
-        # Decode base64 to bytes for Gemini
-        # Note: The shim/client handles the format conversion
-        import PIL.Image
-        import io
-        
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(Config.VISION_CONCURRENCY)
+        data = ctx.inputs.get("image_bytes")
+        if data is None:
+            data = base64.b64decode(ctx.inputs["image_b64"])
+        on_item = ctx.inputs.get("on_item")
+        image, encoded, key = await asyncio.to_thread(self._open, data)
+        if self.cache is not None:
+            items = self.cache.get(key)
+            if items is not None:
+                logger.info(f"VisionAgent: cache hit for {key:016x}")
+                items = self._with_ids(items)
+                if on_item:
+                    for item in items:
+                        on_item(item)
+                return items
+        async with self._slots:
+            # The SDK call blocks, so run it on the runtime's executor instead of the loop
+            items, intact = await asyncio.to_thread(self._detect, encoded, on_item)
+        # An empty or salvaged answer may be a bad shot; near-duplicate retakes must
+        # reach the model again instead of inheriting it
+        if self.cache is not None and items and intact:
+            self.cache.put(key, items)
+        return items
+
+    def _open(self, data: bytes):
+        """Downscales/re-encodes the upload and computes its perceptual hash (the cache key)."""
+        image, encoded = prepare_image(data, max_side=Config.VISION_MAX_SIDE,
+                                       quality=Config.VISION_JPEG_QUALITY, fmt=Config.VISION_IMAGE_FORMAT)
+        return image, encoded, phash(image) if self.cache is not None else None
+
+    @staticmethod
+    def _with_ids(items: List[Dict]) -> List[Dict]:
+        # Cached detections become new order items, so they need fresh ids
+        for item in items:
+            item["item_id"] = str(uuid.uuid4())
+        return items
+
+    @staticmethod
+    def _accept(element) -> bool:
+        # Elements salvaged from a truncated response may be missing parts
+        if not isinstance(element, dict):
+            return False
+        bbox = element.get("bbox")
+        return bool(element.get("type")) and isinstance(bbox, list) and len(bbox) == 4
+
+    def _detect(self, encoded: bytes, on_item=None) -> Tuple[List[Dict], bool]:
+        """
+        Streams the model's answer; on_item(item) is called as each detection completes.
+        Returns (items, intact): intact is False if the response was truncated or
+        repaired, or incomplete items were skipped.
+        """
         try:
-            logger.info("VisionAgent: Decoding base64...")
-            img_bytes = base64.b64decode(img_b64)
-            logger.info(f"VisionAgent: Decoded {len(img_bytes)} bytes")
-            
-            logger.info("VisionAgent: Importing PIL...")
-            import PIL.Image
-            import io
-            logger.info("VisionAgent: PIL imported. Opening image...")
-            
-            image = PIL.Image.open(io.BytesIO(img_bytes))
-            logger.info(f"VisionAgent: Image opened. Size: {image.size}")
-            
             system_instruction = """
             You are a vision agent for a laundry business.
             You're given an image and must detect:
@@ -96,24 +146,34 @@ class VisionAgent(Agent):
             
             response = self.client.models.generate_content(
                 model="gemini-2.0-flash-exp",
-                contents=[{"role":"user","parts":[{"image": image, "text": prompt}]}]
+                contents=[{"role":"user","parts":[{"image": {"mime_type": mime_type(Config.VISION_IMAGE_FORMAT), "data": encoded}, "text": prompt}]}],
+                stream=True
             )
 
-            # Parse response
-            text = response.text
-            # Clean up markdown code blocks if present
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0]
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0]
-                
-            items = json.loads(text)
-            # Add IDs
-            for item in items:
-                item["item_id"] = str(uuid.uuid4())
-                if "confidence" not in item:
-                    item["confidence"] = 0.9 # Placeholder if not provided by model
-            return items
+            # Parse array elements as they arrive (tolerates fences, prose and truncation)
+            stream = JSONArrayStream()
+            items, skipped = [], []
+
+            def accept(elements):
+                for item in elements:
+                    if not self._accept(item):
+                        logger.warning(f"VisionAgent: skipping incomplete item {item!r}")
+                        skipped.append(item)
+                        continue
+                    item["item_id"] = str(uuid.uuid4())
+                    if "confidence" not in item:
+                        item["confidence"] = 0.9 # Placeholder if not provided by model
+                    items.append(item)
+                    if on_item:
+                        on_item(item)
+
+            for chunk in response:
+                accept(stream.feed(chunk.text))
+            accept(stream.close())
+            if not stream.found_array:
+                # Prose only ("I could not find any clothing"): not the same as a real []
+                raise ValueError("Vision model returned no JSON array")
+            return items, stream.intact and not skipped
             
         except Exception as e:
             import traceback
@@ -127,7 +187,15 @@ class VisionAgent(Agent):
                 logger.info(f"API Key present (starts with {key[:4]}...)")
             raise e
 
+    def submit_image(self, image, on_item=None) -> Future:
+        """
+        Queues detection on the shared background loop; returns a concurrent Future.
+        Takes raw image bytes (preferred) or, for older callers, a base64 string.
+        on_item(item) is called from a worker thread as each item is parsed.
+        """
+        key = "image_bytes" if isinstance(image, (bytes, bytearray)) else "image_b64"
+        return get_runtime().submit(self.handle(ToolContext({key: image, "on_item": on_item})))
+
     # Legacy method for backward compatibility during migration
-    def analyze_image(self, image_b64: str) -> List[Dict]:
-        ctx = ToolContext({"image_b64": image_b64})
-        return asyncio.run(self.handle(ctx))
+    def analyze_image(self, image) -> List[Dict]:
+        return self.submit_image(image).result(timeout=Config.VISION_TIMEOUT_SECONDS)
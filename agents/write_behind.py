@@ -0,0 +1,118 @@
+# agents/write_behind.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger("write_behind")
+
+
+class PendingWrites:
+    """
+    Tracks in-flight write-behind futures by key (e.g. "orders:<phone>") so reads
+    can wait for writes they depend on (read-your-writes) without flushing everything.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._all = set()
+
+    def track(self, future: Future, keys: Iterable[str]):
+        keys = tuple(keys)
+        with self._lock:
+            self._all.add(future)
+            for key in keys:
+                self._by_key.setdefault(key, set()).add(future)
+        future.add_done_callback(lambda f: self._done(f, keys))
+
+    def _done(self, future: Future, keys: tuple):
+        if future.exception() is not None:
+            logger.error(f"Write-behind write failed for {keys}: {future.exception()}")
+        with self._lock:
+            self._all.discard(future)
+            for key in keys:
+                futures = self._by_key.get(key)
+                if futures:
+                    futures.discard(future)
+                    if not futures:
+                        del self._by_key[key]
+
+    def wait(self, *keys: str, timeout: Optional[float] = None):
+        """Blocks until pending writes for the given keys (or all, if none given) are committed."""
+        with self._lock:
+            if keys:
+                futures = set()
+                for key in keys:
+                    futures |= self._by_key.get(key, set())
+            else:
+                futures = set(self._all)
+        if futures:
+            wait(futures, timeout=timeout)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._all)
+
+
+class FirestoreBatcher:
+    """
+    Write-behind queue for Firestore. Jobs are callables that add operations to a
+    WriteBatch; a background thread commits them together every max_delay_ms or
+    as soon as max_ops operations are queued (Firestore caps a batch at 500).
+    """
+    def __init__(self, db, max_ops: int = 500, max_delay_ms: int = 50, queue_size: int = 10000):
+        self.db = db
+        self.max_ops = min(max_ops, 500)
+        self.max_delay_ms = max_delay_ms
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._loop, name="firestore-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, apply: Callable) -> Future:
+        future = Future()
+        self._queue.put((apply, future))
+        return future
+
+    def _loop(self):
+        while True:
+            jobs = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay_ms / 1000
+            while len(jobs) < self.max_ops:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    jobs.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(jobs)
+
+    def _commit(self, jobs: list):
+        batch, members = self.db.batch(), []
+        for apply, future in jobs:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                apply(batch)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            members.append(future)
+            # A single job may add several writes; stay under the per-batch cap
+            if len(batch) >= self.max_ops - 10:
+                self._flush(batch, members)
+                batch, members = self.db.batch(), []
+        if members:
+            self._flush(batch, members)
+
+    def _flush(self, batch, members: list):
+        try:
+            batch.commit()
+        except Exception as e:
+            for future in members:
+                future.set_exception(e)
+            return
+        for future in members:
+            future.set_result(None)
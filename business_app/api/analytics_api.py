@@ -1,4 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
+import time
+from agents.analytics_agents import parse_timeframe
 # import __main__ <-- Removed
 
 analytics_bp = Blueprint('analytics', __name__)
@@ -10,6 +12,10 @@ def get_a2a(): return current_app.a2a
 async def get_summary():
     try:
         timeframe = request.args.get('timeframe', 'last_7_days')
+        try:
+            parse_timeframe(timeframe)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         summary = await get_a2a().call_agent("analytics_orchestrator", {"timeframe": timeframe})
         return jsonify(summary)
     except Exception as e:
@@ -20,53 +26,45 @@ async def get_summary():
 
 @analytics_bp.route('/stats', methods=['GET'])
 def get_stats():
-    orders = get_mem().get_all_orders()
-    feedback = get_mem().get_all_feedback()
+    # Counters are maintained incrementally by MemoryBank writes, so this is
+    # a constant-size read over *all* orders and feedback.
+    agg = get_mem().get_aggregates()
     
-    # Calculate Revenue
-    revenue = sum(o.get('total', 0) for o in orders)
+    revenue = agg.get('revenue', {}).get('total', 0)
     
-    # Calculate Status Counts
+    # Status Counts (always report the core statuses, even when zero)
     status_counts = {"Pending": 0, "Finished": 0, "Delivered": 0}
-    for o in orders:
-        s = o.get('status', 'Pending')
-        status_counts[s] = status_counts.get(s, 0) + 1
+    for s, n in agg.get('status', {}).items():
+        if n > 0:
+            status_counts[s] = int(n)
         
-    # Calculate Satisfaction
-    ratings = [f['rating'] for f in feedback]
-    avg_rating = sum(ratings) / len(ratings) if ratings else 0.0
+    # Satisfaction
+    review_count = int(agg.get('reviews', {}).get('total', 0))
+    rating_sum = agg.get('rating_sum', {}).get('total', 0)
+    avg_rating = rating_sum / review_count if review_count else 0.0
     
-    # Calculate Top Category (Simple heuristic from items)
-    categories = {}
-    for o in orders:
-        for item in o.get('items', []):
-            label = item.get('label', 'Unknown')
-            # Simple extraction: "Blue Shirt" -> "Shirt"
-            cat = label.split()[-1] 
-            categories[cat] = categories.get(cat, 0) + 1
-            
+    # Top Category
+    categories = {c: int(n) for c, n in agg.get('category', {}).items() if n > 0}
     top_category = max(categories, key=categories.get) if categories else "None"
     top_cat_pct = 0
     if categories:
         total_items = sum(categories.values())
         top_cat_pct = int((categories[top_category] / total_items) * 100)
         
-    # Calculate Rating Distribution
-    rating_counts = [0] * 5
-    for r in ratings:
-        if 1 <= r <= 5:
-            rating_counts[r-1] += 1
+    # Rating Distribution
+    ratings = agg.get('rating', {})
+    rating_counts = [int(ratings.get(str(r), 0)) for r in range(1, 6)]
 
-    # Revenue Trend (Last 10 orders)
-    # Assuming orders are sorted by timestamp desc, take first 10 and reverse
-    rev_trend = [o.get('total', 0) for o in orders[:10][::-1]]
+    # Revenue Trend (daily revenue over the last 14 days, from the rollups)
+    now = time.time()
+    rev_trend = [p["revenue"] for p in get_mem().get_timeseries('day', now - 13 * 86400, now)]
 
-    return jsonify({
+    stats = {
         "revenue": revenue,
         "orders_finished": status_counts.get('Finished', 0) + status_counts.get('Delivered', 0),
         "orders_pending": status_counts.get('Pending', 0),
         "satisfaction": round(avg_rating, 1),
-        "review_count": len(ratings),
+        "review_count": review_count,
         "top_category": top_category,
         "top_category_pct": top_cat_pct,
         "chart_data": {
@@ -75,4 +73,33 @@ def get_stats():
             "category_counts": categories,
             "rating_counts": rating_counts
         }
-    })
+    }
+
+    # Optional page of recent orders for drill-down: ?limit=20&fields=id,total,status&cursor=...
+    if any(k in request.args for k in ('limit', 'cursor', 'fields')):
+        limit = max(1, min(request.args.get('limit', 20, type=int), 200))
+        fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+        try:
+            page = get_mem().query_orders(limit=limit, cursor=request.args.get('cursor'), fields=fields)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        stats["recent_orders"] = page["orders"]
+        stats["next_cursor"] = page["next_cursor"]
+
+    return jsonify(stats)
+
+@analytics_bp.route('/timeseries', methods=['GET'])
+def get_timeseries():
+    """
+    Chart data from the hour/day rollups: ?granularity=hour|day&from=<epoch>&to=<epoch>.
+    Defaults to daily points for the last 30 days.
+    """
+    now = time.time()
+    granularity = request.args.get('granularity', 'day')
+    t1 = request.args.get('to', now, type=float)
+    t0 = request.args.get('from', t1 - 30 * 86400, type=float)
+    try:
+        points = get_mem().get_timeseries(granularity, t0, t1)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"granularity": granularity, "from": t0, "to": t1, "points": points})
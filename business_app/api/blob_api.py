@@ -0,0 +1,63 @@
+from flask import Blueprint, Response, jsonify, current_app, request, send_file
+import io
+from werkzeug.datastructures import ContentRange
+from agents.blob_store import DIGEST_RE, sniff_content_type
+
+blob_bp = Blueprint('blobs', __name__)
+
+def get_blobs(): return current_app.blobs
+
+@blob_bp.route('/<digest>', methods=['GET'])
+def get_blob(digest):
+    if not DIGEST_RE.match(digest):
+        return jsonify({"error": "Invalid blob id"}), 400
+
+    # Content-addressed: the digest is a strong ETag and the bytes never change.
+    # send_file(conditional=True) answers If-None-Match with 304 and honours Range.
+    path = get_blobs().local_path(digest)
+    if path:
+        with open(path, 'rb') as f:
+            mimetype = sniff_content_type(f.read(16))
+        resp = send_file(path, mimetype=mimetype, conditional=True, etag=digest, max_age=31536000)
+    else:
+        byte_range = _single_range(digest)
+        if byte_range is not None:
+            # Ranged read from a remote backend: fetch only the requested bytes
+            info = get_blobs().info(digest)
+            if info is None:
+                return jsonify({"error": "Not found"}), 404
+            size, mimetype = info
+            span = byte_range.range_for_length(size)
+            if span is None:
+                resp = Response(status=416)
+                resp.content_range = ContentRange("bytes", None, None, size)
+                return resp
+            start, stop = span
+            data = get_blobs().get(digest, start, stop)
+            if data is None:
+                return jsonify({"error": "Not found"}), 404
+            resp = Response(data, status=206, mimetype=mimetype)
+            resp.content_range = ContentRange("bytes", start, stop, size)
+            resp.accept_ranges = "bytes"
+            resp.set_etag(digest)
+            resp.cache_control.max_age = 31536000
+        else:
+            data = get_blobs().get(digest)
+            if data is None:
+                return jsonify({"error": "Not found"}), 404
+            resp = send_file(io.BytesIO(data), mimetype=sniff_content_type(data), conditional=True,
+                             etag=digest, max_age=31536000)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+def _single_range(digest):
+    """The request's Range if it is one byte range we should honour, else None (serve the whole blob)."""
+    if request.range is None or len(request.range.ranges) != 1 or request.range.units != "bytes":
+        return None
+    if request.if_none_match.contains(digest):
+        return None  # send_file answers with 304
+    if_range = request.if_range
+    if if_range.date is not None or (if_range.etag is not None and if_range.etag != digest):
+        return None
+    return request.range
@@ -5,26 +5,42 @@ business_bp = Blueprint('business', __name__)
 
 def get_mem(): return current_app.mem
 def get_a2a(): return current_app.a2a
+def get_jobs(): return current_app.jobs
 
 @business_bp.route('/customers', methods=['GET'])
 def get_customers():
-    # Get all customers
-    customers = get_mem().get_all_customers()
-    # For each customer, get order count
-    for c in customers:
-        orders = get_mem().get_orders_by_phone(c['phone'])
-        c['orders_count'] = len(orders)
-    return jsonify({"customers": customers})
+    # One page of customers with order counts in a single query (no per-customer lookups)
+    limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+    cursor = request.args.get('cursor')
+    page = get_mem().get_customers_with_stats(limit=limit, cursor=cursor)
+    return jsonify(page)
 
 @business_bp.route('/customers/<phone>', methods=['DELETE'])
 def delete_customer(phone):
-    get_mem().delete_customer(phone)
-    return jsonify({"status": "deleted"})
+    # Customers with long histories can take a while on Firestore: ?background=1
+    # runs the cascade as a job and returns immediately with its id.
+    if request.args.get('background') in ('1', 'true'):
+        job_id = get_jobs().submit("delete_customer", get_mem().delete_customer, phone)
+        return jsonify({"status": "accepted", "job_id": job_id}), 202
+    counts = get_mem().delete_customer(phone)
+    return jsonify({"status": "deleted", "deleted": counts})
+
+@business_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_jobs().get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 @business_bp.route('/orders/<phone>', methods=['GET'])
 def get_customer_orders(phone):
-    orders = get_mem().get_orders_by_phone(phone)
-    return jsonify({"orders": orders})
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+    try:
+        page = get_mem().query_orders(phone, limit=limit, cursor=request.args.get('cursor'), fields=fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
 
 @business_bp.route('/order/update_status', methods=['POST'])
 def update_status():
@@ -35,21 +51,15 @@ def update_status():
     
     get_mem().update_order_status(order_id, status)
     
-    # Trigger Notification Agent
+    # Notify the customer through the outbox: composing and saving the message
+    # happens on its worker threads, so this request doesn't wait on the model
     if status in ['Finished', 'Delivered', 'Ready']:
-        # Pass context to agent so it can generate a personalized message
-        import asyncio
-        try:
-            # Create a new loop for this thread if needed, or run in existing
-            # Since Flask is threaded, we can usually just run:
-            asyncio.run(get_a2a().call_agent("notification_agent", {
-                "phone": phone, 
-                "status": status, 
-                "order_id": order_id,
-                "type": "order_update"
-            }))
-        except Exception as e:
-            print(f"Failed to trigger notification: {e}")
+        current_app.outbox.enqueue({
+            "phone": phone, 
+            "status": status, 
+            "order_id": order_id,
+            "type": "order_update"
+        })
         
     return jsonify({"status": "updated"})
 
@@ -69,3 +79,52 @@ def update_redeem_code():
         return jsonify({"status": "updated"})
     else:
         return jsonify({"error": "Code not found"}), 404
+
+@business_bp.route('/offers/run', methods=['POST'])
+def run_offer_batch():
+    # Out-of-schedule pass of the offer job; poll /jobs/<job_id> for the result
+    job_id = get_jobs().submit("offer_batch", current_app.offer.run_batch)
+    return jsonify({"status": "accepted", "job_id": job_id}), 202
+
+@business_bp.route('/approvals', methods=['GET'])
+def list_approvals():
+    # Persisted queue of orders waiting for a human decision, oldest first
+    limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+    return jsonify(get_mem().list_pending_tasks(limit))
+
+@business_bp.route('/approvals/<order_id>', methods=['GET'])
+def get_approval(order_id):
+    task = get_mem().get_task(order_id)
+    if not task:
+        return jsonify({"error": "No approval task for this order"}), 404
+    return jsonify(task)
+
+@business_bp.route('/approvals/<order_id>', methods=['POST'])
+def decide_approval(order_id):
+    """Body: {"approved": true|false, "note": "..."}; wakes the waiting HITL agent in whichever worker holds it."""
+    data = request.json or {}
+    decision = "approved" if data.get('approved', True) else "rejected"
+    task = get_mem().complete_task(order_id, decision, {"note": data.get('note', '')})
+    if not task:
+        return jsonify({"error": "No pending approval for this order"}), 409
+    return jsonify(task)
+
+@business_bp.route('/notifications/outbox', methods=['GET'])
+def outbox_stats():
+    return jsonify({**current_app.outbox.stats(), "templates": current_app.notification.variants.stats()})
+
+@business_bp.route('/notifications/dead', methods=['GET'])
+def dead_notifications():
+    return jsonify(current_app.outbox.list_dead(max(1, min(request.args.get('limit', 50, type=int), 500))))
+
+@business_bp.route('/notifications/dead/retry', methods=['POST'])
+def retry_dead_notifications():
+    """Body: {"id": <row id>} to requeue one dead letter, or {} for all of them."""
+    data = request.json or {}
+    return jsonify({"requeued": current_app.outbox.retry_dead(data.get('id'))})
+
+@business_bp.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    # Read-through cache counters of this worker (empty when READ_CACHE is off)
+    stats = getattr(get_mem(), 'cache_stats', None)
+    return jsonify(stats() if stats else {})
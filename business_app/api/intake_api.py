@@ -1,13 +1,35 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from concurrent.futures import as_completed
+import json
+import queue
 import uuid
 import base64
 import time
+from config import Config
+from agents.blob_store import decode_data_url, BlobStore
+from agents.image_preprocess import prepare_image
 
 intake_bp = Blueprint('intake', __name__)
 
 def get_mem(): return current_app.mem
 def get_vision(): return current_app.vision
 def get_fabric(): return current_app.fabric
+def get_blobs(): return current_app.blobs
+def get_hitl(): return current_app.hitl
+
+def to_ui_items(items):
+    # Normalize output for UI
+    # UI expects: items: [{label, confidence, box}]
+    # VisionAgent returns: [{type, confidence, bbox, color}]
+    ui_items = []
+    for item in items:
+        ui_items.append({
+            "label": f"{item.get('color', '')} {item.get('type', 'item')}".strip(),
+            "confidence": item.get('confidence', 0.9),
+            "box": item.get('bbox', [0,0,0,0]), # [ymin, xmin, ymax, xmax] or similar
+            "raw": item
+        })
+    return ui_items
 
 @intake_bp.route('/detect', methods=['POST'])
 def detect_items():
@@ -21,27 +43,21 @@ def detect_items():
         print(f"DEBUG: File received: {file.filename}")
         image_bytes = file.read()
         print(f"DEBUG: File read, bytes: {len(image_bytes)}")
-        image_b64 = base64.b64encode(image_bytes).decode('utf-8')
-        print("DEBUG: Base64 encoded")
+        # Upright, downscaled, compact JPEG: this is what the model (and later the
+        # fabric check) needs, at a fraction of the upload's size
+        _, prepared = prepare_image(image_bytes, max_side=Config.VISION_MAX_SIDE,
+                                    quality=Config.VISION_JPEG_QUALITY, fmt=Config.VISION_IMAGE_FORMAT)
         
-        # Call Vision Agent
+        # Call Vision Agent with raw bytes (no base64 round trip)
         print("DEBUG: Calling VisionAgent.analyze_image...")
         # VisionAgent.analyze_image returns a list of dicts with bbox, type, color
-        items = get_vision().analyze_image(image_b64)
+        items = get_vision().analyze_image(prepared)
         print(f"DEBUG: VisionAgent returned {len(items)} items")
         
-        # Normalize output for UI
-        # UI expects: items: [{label, confidence, box}]
-        # VisionAgent returns: [{type, confidence, bbox, color}]
-        ui_items = []
-        for item in items:
-            ui_items.append({
-                "label": f"{item.get('color', '')} {item.get('type', 'item')}".strip(),
-                "confidence": item.get('confidence', 0.9),
-                "box": item.get('bbox', [0,0,0,0]), # [ymin, xmin, ymax, xmax] or similar
-                "raw": item
-            })
+        ui_items = to_ui_items(items)
             
+        # Only the fabric check reads this back; the UI draws the original file
+        image_b64 = base64.b64encode(prepared).decode('utf-8')
         return jsonify({"items": ui_items, "image_b64": image_b64})
     except Exception as e:
         import traceback
@@ -49,6 +65,105 @@ def detect_items():
         print(traceback.format_exc())
         return jsonify({"error": str(e), "trace": traceback.format_exc()}), 500
 
+@intake_bp.route('/detect_stream', methods=['POST'])
+def detect_stream():
+    """
+    Same input as /detect, but streams NDJSON: one {"type": "item"} line per
+    detection as the model produces it (so boxes can be drawn progressively),
+    then {"type": "done", "items": [...], "image_b64": ...} or {"type": "error"}.
+    """
+    if 'image' not in request.files:
+        return jsonify({"error": "No image uploaded"}), 400
+    _, prepared = prepare_image(request.files['image'].read(), max_side=Config.VISION_MAX_SIDE,
+                                quality=Config.VISION_JPEG_QUALITY, fmt=Config.VISION_IMAGE_FORMAT)
+
+    done = object()
+    updates = queue.Queue()
+    future = get_vision().submit_image(prepared, on_item=updates.put)
+    future.add_done_callback(lambda _: updates.put(done))
+
+    def generate():
+        while True:
+            try:
+                item = updates.get(timeout=Config.VISION_TIMEOUT_SECONDS)
+            except queue.Empty:
+                future.cancel()
+                yield json.dumps({"type": "error", "error": "Timed out"}) + "\n"
+                return
+            if item is done:
+                break
+            yield json.dumps({"type": "item", "item": to_ui_items([item])[0]}) + "\n"
+        try:
+            items = future.result()
+        except Exception as e:
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+            return
+        yield json.dumps({"type": "done", "items": to_ui_items(items),
+                          "image_b64": base64.b64encode(prepared).decode('utf-8')}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
+@intake_bp.route('/detect_batch', methods=['POST'])
+def detect_batch():
+    """
+    Multipart upload of several photos ('images' fields). All of them are sent to
+    VisionAgent at once (its semaphore bounds the in-flight model calls) and each
+    result is streamed back as an NDJSON line as soon as it completes:
+
+        {"type": "image", "index": 0, "filename": "...", "items": [...]}
+        {"type": "error", "index": 3, "filename": "...", "error": "..."}
+        {"type": "draft", "items": [...], "images": 10, "failed": 1}
+
+    The final draft merges the items of every photo (each tagged with image_index).
+    """
+    files = request.files.getlist('images') or request.files.getlist('image')
+    if not files:
+        return jsonify({"error": "No images uploaded"}), 400
+    if len(files) > Config.INTAKE_BATCH_MAX_IMAGES:
+        return jsonify({"error": f"At most {Config.INTAKE_BATCH_MAX_IMAGES} images per batch"}), 400
+
+    vision = get_vision()
+    # Preprocessing happens inside VisionAgent, on the runtime's worker threads
+    futures = {vision.submit_image(f.read()): (i, f.filename) for i, f in enumerate(files)}
+
+    # At most VISION_CONCURRENCY model calls run at once, so the photos go through in
+    # waves; each wave gets the single-image timeout
+    waves = -(-len(files) // max(Config.VISION_CONCURRENCY, 1))
+
+    def generate():
+        merged, failed, pending = [], 0, set(futures)
+        try:
+            for future in as_completed(futures, timeout=Config.VISION_TIMEOUT_SECONDS * waves):
+                pending.discard(future)
+                index, filename = futures[future]
+                try:
+                    ui_items = to_ui_items(future.result())
+                except Exception as e:
+                    failed += 1
+                    yield json.dumps({"type": "error", "index": index, "filename": filename, "error": str(e)}) + "\n"
+                    continue
+                for item in ui_items:
+                    item["image_index"] = index
+                merged.extend(ui_items)
+                yield json.dumps({"type": "image", "index": index, "filename": filename, "items": ui_items}) + "\n"
+        except TimeoutError:
+            for future in pending:
+                future.cancel()
+                index, filename = futures[future]
+                failed += 1
+                yield json.dumps({"type": "error", "index": index, "filename": filename, "error": "Timed out"}) + "\n"
+        merged.sort(key=lambda item: item["image_index"])
+        yield json.dumps({"type": "draft", "items": merged, "images": len(futures), "failed": failed}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
+@intake_bp.route('/detect/cache_stats', methods=['GET'])
+def detect_cache_stats():
+    cache = get_vision().cache
+    return jsonify(cache.stats() if cache else {"enabled": False})
+
 @intake_bp.route('/analyze_fabric', methods=['POST'])
 def analyze_fabric():
     data = request.json
@@ -73,22 +188,27 @@ def create_order():
     
     order_id = f"ORD-{uuid.uuid4().hex[:6].upper()}"
     
-    # Store overlay image directly in Firestore (as base64) to avoid ephemeral storage issues on Cloud Run
-    # The frontend is now resizing to max 600px/JPEG 0.6, so it should be < 100KB, well within Firestore 1MB limit.
+    # Store the overlay in the content-addressed blob store; the order keeps only a
+    # reference, so order lists stay small and the image is cached by the browser.
+    overlay_url = 'https://via.placeholder.com/150?text=No+Image'
+    overlay_sha256 = None
     if overlay_base64 and overlay_base64.startswith('data:image'):
-        overlay_url = overlay_base64 # Store the data URL directly
-    else:
-        overlay_url = 'https://via.placeholder.com/150?text=No+Image'
+        image_bytes = decode_data_url(overlay_base64)
+        if image_bytes:
+            overlay_sha256 = get_blobs().put(image_bytes)
+            overlay_url = BlobStore.url(overlay_sha256)
     
     order_data = {
         "items": items,
         "total": total,
         "timestamp": time.time(),
-        "overlay_url": overlay_url
+        "overlay_url": overlay_url,
+        "overlay_sha256": overlay_sha256
     }
     
     # Determine initial status based on items (HITL Safety Check)
     status = "Pending"
+    reason = ""
     delicate_keywords = ["silk", "wool", "leather", "cashmere", "delicate"]
     
     # Check if any item label contains a delicate keyword (case-insensitive)
@@ -97,9 +217,14 @@ def create_order():
             label = item.get('label', '').lower()
             if any(k in label for k in delicate_keywords):
                 status = "Needs Approval"
+                reason = f"Delicate item: {item.get('label')}"
                 break
     
     # Save to MemoryBank
     get_mem().save_order(order_id, phone, status, order_data)
+
+    # The approval wait runs on the background loop, so this request returns at once
+    if status == "Needs Approval":
+        get_hitl().submit_review(order_id, overlay_url, reason)
     
-    return jsonify({"status": "success", "order_id": order_id})
+    return jsonify({"status": "success", "order_id": order_id, "order_status": status})
@@ -19,20 +19,26 @@ from agents.hitl_agent import HITLAgent
 from agents.offer_agent import OfferAgent
 from agents.analytics_orchestrator import AnalyticsOrchestrator
 from agents.notification_agent import NotificationAgent # Added import for NotificationAgent
-from agents.memory_bank import MemoryBank # Added import for MemoryBank
+from agents.memory_bank import get_memory_bank # Added import for MemoryBank
 from agents.analytics_agents import RevenueAgent, LogisticsAgent, FeedbackAgent # Real Analytics Agents
+from agents.background_jobs import JobRegistry
+from agents.blob_store import get_blob_store
+from agents.notification_outbox import NotificationOutbox
+from config import Config
 
 # Initialize Services
-mem = MemoryBank()
+mem = get_memory_bank()
 a2a = A2ADispatcher()
+jobs = JobRegistry()
+blobs = get_blob_store()
 
 # Initialize Agents
 vision = VisionAgent()
 fabric = FabricExpertAgent(mem)
 hitl = HITLAgent(mem)  # Using mem as session service for demo
-notification = NotificationAgent()
-offer = OfferAgent(mem, a2a)
-analytics = AnalyticsOrchestrator(a2a)
+notification = NotificationAgent(mem=mem)
+offer = OfferAgent(mem, a2a, cooldown_seconds=Config.OFFER_COOLDOWN_SECONDS, batch_size=Config.OFFER_BATCH_SIZE)
+analytics = AnalyticsOrchestrator(a2a, mem)
 revenue = RevenueAgent(mem)
 logistics = LogisticsAgent(mem)
 feedback = FeedbackAgent(mem)
@@ -50,6 +56,17 @@ a2a.register("revenue_agent", revenue)
 a2a.register("logistics_agent", logistics)
 a2a.register("feedback_agent", feedback)
 
+# Orders still waiting for approval from before a restart get their waiters back
+hitl.resume_pending()
+
+# Customer notifications are queued and delivered by background workers
+outbox = NotificationOutbox(mem, notification.compose, Config.NOTIFY_OUTBOX_DB,
+                            workers=Config.NOTIFY_WORKERS, max_attempts=Config.NOTIFY_MAX_ATTEMPTS)
+outbox.start()
+
+# Personalized offers are generated for all due customers in one scheduled pass
+offer.start_scheduler(Config.OFFER_BATCH_INTERVAL_SECONDS)
+
 
 app = Flask(__name__)
 app.secret_key = "dev_key"
@@ -57,9 +74,13 @@ app.secret_key = "dev_key"
 # Attach services to app for blueprint access
 app.mem = mem
 app.a2a = a2a
+app.jobs = jobs
+app.blobs = blobs
 app.vision = vision
 app.fabric = fabric
 app.hitl = hitl
+app.notification = notification
+app.outbox = outbox
 app.offer = offer
 app.analytics = analytics
 app.revenue = revenue
@@ -70,10 +91,12 @@ app.feedback = feedback
 from api.intake_api import intake_bp
 from api.analytics_api import analytics_bp
 from api.business_api import business_bp
+from api.blob_api import blob_bp
 
 app.register_blueprint(intake_bp, url_prefix='/api/intake')
 app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
 app.register_blueprint(business_bp, url_prefix='/api/business')
+app.register_blueprint(blob_bp, url_prefix='/blobs')
 
 @app.route('/')
 def index():
@@ -25,6 +25,94 @@ class Config:
     # Default to True on Cloud Run unless disabled
     USE_FIRESTORE = os.getenv("USE_FIRESTORE", str(IS_CLOUD_RUN)) == "True"
 
+    # Blob storage for order images ('local' filesystem or 'gcs'). Cloud Run defaults to
+    # 'gcs' (instance disks are ephemeral and not shared), which requires GCS_BUCKET.
+    GCS_BUCKET = os.getenv('GCS_BUCKET')
+    BLOB_BACKEND = os.getenv('BLOB_BACKEND', 'gcs' if GCS_BUCKET or IS_CLOUD_RUN else 'local')
+    BLOB_DIR = os.getenv('BLOB_DIR', "/tmp/blobs" if IS_CLOUD_RUN else "blobs")
+
+    # SQLite tuning (local/dev backend)
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')  # OFF / NORMAL / FULL
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_WRITE_QUEUE_SIZE = int(os.getenv('SQLITE_WRITE_QUEUE_SIZE', 1000))
+
+    # Write batching: queued writes are group-committed, up to N ops per transaction / WriteBatch.
+    # WRITE_BEHIND returns before commit and flushes every WRITE_BATCH_MAX_DELAY_MS;
+    # reads of a key with pending writes wait for them (read-your-writes).
+    WRITE_BEHIND = os.getenv('WRITE_BEHIND', 'False') == 'True'
+    WRITE_BATCH_MAX_OPS = int(os.getenv('WRITE_BATCH_MAX_OPS', 100))
+    WRITE_BATCH_MAX_DELAY_MS = int(os.getenv('WRITE_BATCH_MAX_DELAY_MS', 20))
+
+    # Realtime push (SSE)
+    # 'sqlite' relays events across processes through a shared file; 'none' keeps them in-process
+    EVENT_RELAY = os.getenv('EVENT_RELAY', 'sqlite')
+    EVENT_RELAY_DB = os.getenv('EVENT_RELAY_DB', "/tmp/agents_events.db" if IS_CLOUD_RUN else "agents_events.db")
+    SSE_KEEPALIVE_SECONDS = int(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+    SSE_MAX_SECONDS = int(os.getenv('SSE_MAX_SECONDS', 300))
+    # Pages still poll this often while the stream is connected: the relay file is local, so
+    # events written by another service/container (e.g. the business app) never reach the stream
+    SSE_FALLBACK_POLL_SECONDS = int(os.getenv('SSE_FALLBACK_POLL_SECONDS', 30))
+    # Each open stream holds a gthread thread, so only this many run per process (the customer
+    # Dockerfile has 64 threads); beyond it the stream gets a 503 and the page polls instead,
+    # retrying the stream after SSE_BUSY_RETRY_SECONDS
+    SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', 32))
+    SSE_BUSY_RETRY_SECONDS = int(os.getenv('SSE_BUSY_RETRY_SECONDS', 60))
+
+    # Background event loop for agent work (see agents/async_runtime.py)
+    # gunicorn gthread threads per worker (the business Dockerfile passes this to --threads)
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 16))
+    # Threads for blocking SDK calls; room for one vision call per request thread plus background work
+    ASYNC_WORKERS = int(os.getenv('ASYNC_WORKERS', max(32, 2 * WEB_THREADS)))
+    # In-flight Gemini vision calls per process. Request threads block until their call
+    # finishes, so a cap below WEB_THREADS queues requests behind it (at 8 of 16 threads
+    # throughput halves); set it lower only to stay under the model quota
+    VISION_CONCURRENCY = int(os.getenv('VISION_CONCURRENCY', WEB_THREADS))
+    VISION_TIMEOUT_SECONDS = float(os.getenv('VISION_TIMEOUT_SECONDS', 60))
+    # Uploads are downscaled to this long edge and re-encoded before inference
+    VISION_MAX_SIDE = int(os.getenv('VISION_MAX_SIDE', 1024))
+    VISION_JPEG_QUALITY = int(os.getenv('VISION_JPEG_QUALITY', 85))
+    VISION_IMAGE_FORMAT = os.getenv('VISION_IMAGE_FORMAT', 'JPEG')  # JPEG or WEBP
+    INTAKE_BATCH_MAX_IMAGES = int(os.getenv('INTAKE_BATCH_MAX_IMAGES', 20))
+
+    # Perceptual-hash cache of vision detections (size 0 disables; empty DB keeps it in memory only)
+    DETECTION_CACHE_SIZE = int(os.getenv('DETECTION_CACHE_SIZE', 512))
+    DETECTION_CACHE_TTL_SECONDS = int(os.getenv('DETECTION_CACHE_TTL_SECONDS', 86400))
+    DETECTION_CACHE_THRESHOLD = int(os.getenv('DETECTION_CACHE_THRESHOLD', 6))  # max Hamming distance (of 64 bits)
+    DETECTION_CACHE_DB = os.getenv('DETECTION_CACHE_DB', '')
+
+    # Analytics swarm summaries are cached per timeframe until orders/feedback change;
+    # an outdated summary younger than this is served while a refresh runs
+    SWARM_CACHE_MAX_STALE_SECONDS = int(os.getenv('SWARM_CACHE_MAX_STALE_SECONDS', 3600))
+
+    # Read-through cache for hot MemoryBank lookups (customers, redeem codes, fabric KB);
+    # READ_CACHE_POLICIES overrides per namespace, e.g. {"customer": {"ttl_seconds": 60}}
+    READ_CACHE = os.getenv('READ_CACHE', 'True') == 'True'
+    READ_CACHE_POLICIES = os.getenv('READ_CACHE_POLICIES', '{}')
+    # Cache invalidations travel over the event relay, which only spans one host. Set this
+    # only when every service writing customers/redeem codes shares it; otherwise redeem
+    # lookups and negative results are cached for seconds (see agents/cached_memory_bank.py)
+    READ_CACHE_SHARED_RELAY = os.getenv('READ_CACHE_SHARED_RELAY', 'False') == 'True'
+
+    # Human-in-the-loop approvals: waiting orders expire after this long; waiters
+    # re-read their task at this interval in case a wake-up event was missed
+    APPROVAL_TIMEOUT_SECONDS = int(os.getenv('APPROVAL_TIMEOUT_SECONDS', 86400))
+    APPROVAL_RECHECK_SECONDS = float(os.getenv('APPROVAL_RECHECK_SECONDS', 30))
+
+    # Outbound notification queue (see agents/notification_outbox.py)
+    NOTIFY_OUTBOX_DB = os.getenv('NOTIFY_OUTBOX_DB', "/tmp/notification_outbox.db" if IS_CLOUD_RUN else "notification_outbox.db")
+    NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', 2))
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', 5))
+    # Generated message templates kept per order status
+    NOTIFY_VARIANTS_PER_STATUS = int(os.getenv('NOTIFY_VARIANTS_PER_STATUS', 5))
+    NOTIFY_VARIANTS_TTL_SECONDS = int(os.getenv('NOTIFY_VARIANTS_TTL_SECONDS', 86400))
+
+    # Offer job: due customers are evaluated every OFFER_BATCH_INTERVAL_SECONDS (0 disables
+    # the scheduler in this process) and then left alone for OFFER_COOLDOWN_SECONDS (must be > 0)
+    OFFER_BATCH_INTERVAL_SECONDS = int(os.getenv('OFFER_BATCH_INTERVAL_SECONDS', 300))
+    OFFER_COOLDOWN_SECONDS = int(os.getenv('OFFER_COOLDOWN_SECONDS', 86400))
+    OFFER_BATCH_SIZE = int(os.getenv('OFFER_BATCH_SIZE', 1000))
+
     # AI / Google
     GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY') # Fallback
@@ -1,8 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 # import __main__ <-- Removed
+import json
+import queue
+import threading
+import time
+from config import Config
+from agents.event_hub import customer_topic
 
 customer_bp = Blueprint('customer', __name__)
 
+# Open SSE streams in this process; each one occupies a request thread while idle
+_stream_slots = threading.BoundedSemaphore(Config.SSE_MAX_STREAMS)
+
 def get_mem():
     return current_app.mem
 
@@ -41,24 +50,20 @@ def register():
 
 @customer_bp.route('/orders/<phone>', methods=['GET'])
 def get_orders(phone):
-    # Fetch real orders from shared DB
-    orders = get_mem().get_orders_by_phone(phone)
-    return jsonify({"orders": orders})
+    # Newest first, one page at a time; ?fields=id,status,total trims the payload
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+    try:
+        page = get_mem().query_orders(phone, limit=limit, cursor=request.args.get('cursor'), fields=fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
 
 @customer_bp.route('/offers/<phone>', methods=['GET'])
 def get_offers(phone):
-    # Get existing codes from memory
+    # Polled by open tabs: one indexed (and cached) lookup. New personalized offers
+    # come from the business app's scheduled offer job, not from this request.
     codes = get_mem().get_redeems_by_phone(phone)
-    
-    # Only call Offer Agent if no active (unused) offers exist
-    has_active = any(not c.get('used', False) for c in codes)
-    
-    if not has_active:
-        # Trigger Offer Agent to potentially generate a NEW personalized offer
-        get_offer().generate_personalized_offer(phone)
-        # Re-fetch to include the new one
-        codes = get_mem().get_redeems_by_phone(phone)
-    
     return jsonify({"offers": codes})
 
 @customer_bp.route('/notifications', methods=['GET'])
@@ -70,3 +75,54 @@ def get_notifications():
     # Use shared MemoryBank instance
     notifs = get_mem().get_notifications_by_phone(phone)
     return jsonify({"notifications": notifs})
+
+@customer_bp.route('/stream/<phone>', methods=['GET'])
+def stream(phone):
+    """
+    Server-Sent Events feed of order and notification updates for one customer.
+    Replaces client polling: the connection idles on a queue until MemoryBank
+    publishes an event for this phone. Browsers reconnect automatically when
+    the stream is recycled after SSE_MAX_SECONDS.
+
+    At most SSE_MAX_STREAMS streams are open per process so idle tabs can't take
+    every request thread; beyond that the answer is a 503 with Retry-After, the
+    browser's EventSource gives up and the page polls until it retries.
+    """
+    if not _stream_slots.acquire(blocking=False):
+        return jsonify({"error": "Too many open streams, poll instead"}), 503, {
+            "Retry-After": str(Config.SSE_BUSY_RETRY_SECONDS)}
+    hub = get_mem().events
+    topic = customer_topic(phone)
+    q = hub.subscribe(topic)
+    released = threading.Event()
+
+    def release():
+        # Runs when the response closes, even if the generator never started
+        if not released.is_set():
+            released.set()
+            hub.unsubscribe(topic, q)
+            _stream_slots.release()
+
+    def generate():
+        yield "retry: 3000\n\n"
+        deadline = time.time() + Config.SSE_MAX_SECONDS
+        while time.time() < deadline:
+            try:
+                event = q.get(timeout=Config.SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    response.call_on_close(release)
+    return response
+
+@customer_bp.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    # Read-through cache counters of this worker (empty when READ_CACHE is off)
+    stats = getattr(get_mem(), 'cache_stats', None)
+    return jsonify(stats() if stats else {})
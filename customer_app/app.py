@@ -8,15 +8,15 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from config import Config
 from agents.a2a_dispatcher import A2ADispatcher
-from agents.memory_bank import MemoryBank
+from agents.memory_bank import get_memory_bank
 from agents.offer_agent import OfferAgent
 from agents.notification_agent import NotificationAgent
 
 # Initialize Agents
 a2a = A2ADispatcher()
-mem = MemoryBank()
+mem = get_memory_bank()
 offer = OfferAgent(mem, a2a)
-notification = NotificationAgent()
+notification = NotificationAgent(mem=mem)
 
 # Register notification agent
 a2a.register("notification_agent", notification)
@@ -36,6 +36,11 @@ from api.feedback_api import feedback_bp
 app.register_blueprint(customer_bp, url_prefix='/api/customer')
 app.register_blueprint(feedback_bp, url_prefix='/api/feedback')
 
+@app.context_processor
+def inject_realtime():
+    return {"sse_fallback_poll_ms": Config.SSE_FALLBACK_POLL_SECONDS * 1000,
+            "sse_busy_retry_ms": Config.SSE_BUSY_RETRY_SECONDS * 1000}
+
 @app.route('/')
 def index():
     return render_template('register.html')
@@ -1,42 +1,226 @@
 # google/genai/__init__.py
+"""
+Shim over google-generativeai with one process-wide client.
+
+- The SDK is configured once and GenerativeModel handles are cached per model,
+  so every agent shares the same underlying HTTP/gRPC connections.
+- Calls go through a per-model token-bucket scheduler (requests and tokens per
+  minute). When the bucket is empty, waiting callers are served by priority:
+  INTERACTIVE (intake) before BACKGROUND (analytics, notifications).
+- 429 / RESOURCE_EXHAUSTED responses are retried with full-jitter exponential
+  backoff, and the model is paused for everyone meanwhile.
+
+Environment:
+  GENAI_API_ENDPOINT   e.g. http://localhost:8089 to talk to scripts/fake_gemini_server.py
+  GENAI_RPM / GENAI_TPM                 default per-model quotas
+  GENAI_QUOTAS         JSON overrides, e.g. {"gemini-2.0-flash-exp": {"rpm": 10, "tpm": 4000000}}
+  GENAI_MAX_RETRIES / GENAI_BACKOFF_BASE / GENAI_BACKOFF_CAP
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
 import os
-import google.generativeai as real_genai
+import random
+import threading
+import time
+import traceback
+
+logger = logging.getLogger("genai_shim")
+
+INTERACTIVE = 0
+BACKGROUND = 10
+
+MAX_RETRIES = int(os.getenv("GENAI_MAX_RETRIES", 4))
+BACKOFF_BASE = float(os.getenv("GENAI_BACKOFF_BASE", 0.5))
+BACKOFF_CAP = float(os.getenv("GENAI_BACKOFF_CAP", 20))
+
+# Rough Gemini accounting: ~4 characters per text token, flat cost per image
+IMAGE_TOKENS = 258
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateScheduler:
+    """Per-model RPM/TPM buckets with a priority queue of waiting callers."""
+    def __init__(self, default_rpm: float, default_tpm: float, overrides: dict = None):
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.overrides = overrides or {}
+        self._buckets = {}
+        self._paused_until = {}
+        self._waiting = {}  # model -> heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _buckets_for(self, model: str):
+        if model not in self._buckets:
+            quota = self.overrides.get(model, {})
+            self._buckets[model] = (TokenBucket(quota.get("rpm", self.default_rpm)),
+                                    TokenBucket(quota.get("tpm", self.default_tpm)))
+        return self._buckets[model]
+
+    def acquire(self, model: str, tokens: int, priority: int = INTERACTIVE):
+        with self._cond:
+            rpm, tpm = self._buckets_for(model)
+            heap = self._waiting.setdefault(model, [])
+            ticket = (priority, next(self._seq))
+            heapq.heappush(heap, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = max(self._paused_until.get(model, 0) - now, 0)
+                    if heap[0] == ticket and not wait:
+                        wait = max(rpm.wait_time(1, now), tpm.wait_time(tokens, now))
+                        if not wait:
+                            rpm.take(1)
+                            tpm.take(tokens)
+                            return
+                    # Woken early when the queue head changes or a pause is set
+                    self._cond.wait(timeout=wait or 0.05)
+            finally:
+                heap.remove(ticket)
+                heapq.heapify(heap)
+                self._cond.notify_all()
+
+    def pause(self, model: str, seconds: float):
+        """Holds back every caller of `model` (used after a 429)."""
+        with self._cond:
+            until = time.monotonic() + seconds
+            self._paused_until[model] = max(self._paused_until.get(model, 0), until)
+            self._cond.notify_all()
+
+
+def _is_rate_limited(e: Exception) -> bool:
+    code = getattr(e, "code", None)
+    if code == 429 or getattr(code, "value", None) == 429:
+        return True
+    text = str(e)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "Resource has been exhausted" in text
+
+
+def _to_real_contents(contents):
+    # Convert ADK format to real API format
+    real_contents = []
+    if isinstance(contents, str):
+        real_contents.append(contents)
+    elif isinstance(contents, list):
+        if len(contents) > 0 and isinstance(contents[0], dict) and "parts" in contents[0]:
+            # ADK format: contents=[{"role":"user","parts":[{"image": img, "text":"..."}]}]
+            parts = contents[0]["parts"]
+            for p in parts:
+                if "image" in p:
+                    real_contents.append(p["image"])
+                if "text" in p:
+                    real_contents.append(p["text"])
+        else:
+            # List of strings or other objects
+            real_contents = contents
+    return real_contents
+
+
+def _estimate_tokens(real_contents) -> int:
+    tokens = 0
+    for part in real_contents if isinstance(real_contents, list) else [real_contents]:
+        tokens += len(part) // 4 + 1 if isinstance(part, str) else IMAGE_TOKENS
+    return tokens
+
 
 class Models:
-    def generate_content(self, model, contents):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configured = False
+        self._handles = {}
+        self.scheduler = RateScheduler(
+            default_rpm=float(os.getenv("GENAI_RPM", 60)),
+            default_tpm=float(os.getenv("GENAI_TPM", 1_000_000)),
+            overrides=json.loads(os.getenv("GENAI_QUOTAS", "{}")),
+        )
+
+    def _model(self, name: str):
+        """Cached GenerativeModel; the SDK is configured once per process."""
+        with self._lock:
+            if not self._configured:
+                import google.generativeai as real_genai
+                api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+                options = {"api_key": api_key}
+                endpoint = os.getenv("GENAI_API_ENDPOINT")
+                if endpoint:
+                    options.update(transport="rest", client_options={"api_endpoint": endpoint})
+                real_genai.configure(**options)
+                self._configured = True
+                self._real = real_genai
+            if name not in self._handles:
+                self._handles[name] = self._real.GenerativeModel(name)
+            return self._handles[name]
+
+    def generate_content(self, model, contents, stream=False, priority=INTERACTIVE):
         # Bridge to real Gemini API if available, or mock
         api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        
+
         if not api_key or api_key == "YOUR_API_KEY_HERE":
             raise ValueError("GenAI Shim: No valid API Key found. Please set GOOGLE_API_KEY or GEMINI_API_KEY.")
 
-        try:
-            real_genai.configure(api_key=api_key)
-            m = real_genai.GenerativeModel(model)
-            # Convert ADK format to real API format
-            real_contents = []
-            if isinstance(contents, str):
-                real_contents.append(contents)
-            elif isinstance(contents, list):
-                if len(contents) > 0 and isinstance(contents[0], dict) and "parts" in contents[0]:
-                     # ADK format: contents=[{"role":"user","parts":[{"image": img, "text":"..."}]}]
-                    parts = contents[0]["parts"]
-                    for p in parts:
-                        if "image" in p:
-                            real_contents.append(p["image"])
-                        if "text" in p:
-                            real_contents.append(p["text"])
-                else:
-                    # List of strings or other objects
-                    real_contents = contents
-            
-            return m.generate_content(real_contents)
-        except Exception as e:
-            import logging, traceback
-            logging.error(f"GenAI Shim Error: {e}")
-            logging.error(traceback.format_exc())
-            raise e
+        real_contents = _to_real_contents(contents)
+        tokens = _estimate_tokens(real_contents)
+        attempt = 0
+        while True:
+            self.scheduler.acquire(model, tokens, priority)
+            try:
+                # stream=True returns an iterable of partial responses (each has .text)
+                return self._model(model).generate_content(real_contents, stream=stream)
+            except Exception as e:
+                if _is_rate_limited(e) and attempt < MAX_RETRIES:
+                    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                    logger.warning(f"GenAI Shim: {model} rate limited, retry {attempt + 1} in {delay:.2f}s")
+                    self.scheduler.pause(model, delay)
+                    attempt += 1
+                    continue
+                logging.error(f"GenAI Shim Error: {e}")
+                logging.error(traceback.format_exc())
+                raise e
+
+    async def generate_content_async(self, model, contents, stream=False, priority=INTERACTIVE):
+        """
+        Awaitable generate_content: the blocking SDK call, scheduler wait and
+        backoff sleeps all run on a worker thread, so the event loop stays free and
+        asyncio.gather() over several agents really runs them concurrently.
+        """
+        return await asyncio.to_thread(self.generate_content, model, contents, stream=stream, priority=priority)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_models() -> Models:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Models()
+        return _shared
+
 
 class Client:
     def __init__(self):
-        self.models = Models()
+        # Every Client in the process shares one registry, connection pool and scheduler
+        self.models = shared_models()
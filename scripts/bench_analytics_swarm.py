@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark the analytics swarm (/api/analytics/swarm): AnalyticsOrchestrator fans
+out to the revenue, logistics and feedback agents with asyncio.gather, then
+synthesizes their summaries.
+
+google.generativeai is replaced by a stub whose calls sleep for --latency, so the
+real google/genai shim (scheduler included) is exercised without a key. The
+"blocking" run restores the old behaviour (sync generate_content inside async
+handle()), where gather degrades to one agent after another.
+
+    python scripts/bench_analytics_swarm.py --latency 0.5 --runs 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import types
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--latency", type=float, default=0.5, help="simulated model latency in seconds")
+parser.add_argument("--runs", type=int, default=3)
+args = parser.parse_args()
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+os.environ.setdefault("EVENT_RELAY", "none")
+
+
+class _StubModel:
+    def __init__(self, name):
+        self.name = name
+
+    def generate_content(self, contents, stream=False):
+        time.sleep(args.latency)
+        return types.SimpleNamespace(text="Simulated insight.")
+
+stub = types.ModuleType("google.generativeai")
+stub.configure = lambda **kwargs: None
+stub.GenerativeModel = _StubModel
+sys.modules["google.generativeai"] = stub
+
+from google import genai
+from google.adk.tools import ToolContext
+from agents.a2a_dispatcher import A2ADispatcher
+from agents.analytics_agents import RevenueAgent, LogisticsAgent, FeedbackAgent
+from agents.analytics_orchestrator import AnalyticsOrchestrator
+from agents.memory_bank import MemoryBank
+
+mem = MemoryBank(os.path.join(tempfile.mkdtemp(), "bench.db"))
+for i in range(50):
+    mem.save_order(f"ORD-{i}", "5550000", "Finished" if i % 3 else "Pending",
+                   {"items": [{"label": "blue shirt"}], "total": 10 + i, "timestamp": time.time()})
+    mem.save_feedback(f"FB-{i}", f"ORD-{i}", 1 + i % 5, "Too slow" if i % 5 == 0 else "")
+a2a = A2ADispatcher()
+for name, agent in (("revenue_agent", RevenueAgent(mem)), ("logistics_agent", LogisticsAgent(mem)),
+                    ("feedback_agent", FeedbackAgent(mem))):
+    a2a.register(name, agent)
+orchestrator = AnalyticsOrchestrator(a2a)
+
+
+def run(label):
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        asyncio.run(orchestrator.handle(ToolContext({"timeframe": "last_7_days"})))
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{label:<34} {best:6.2f}s  ({best / args.latency:.1f}x model latency)")
+
+
+print(f"model latency {args.latency}s, 3 sub-agents + 1 synthesis call, best of {args.runs}")
+run("async (generate_content_async)")
+
+async def _blocking(self, model, contents, stream=False, priority=genai.INTERACTIVE):
+    return self.generate_content(model, contents, stream=stream, priority=priority)
+genai.Models.generate_content_async = _blocking
+run("blocking call in async handle()")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark the intake image path: the old flow (base64 round trip, full-resolution
+decode, original bytes sent to the model) vs agents/image_preprocess.prepare_image.
+
+Uses the JPEG/PNG files in --corpus if given, otherwise synthesizes phone-sized
+photos (12 MP, EXIF-rotated). The model call is simulated as a fixed latency plus
+upload time at --mbps, so the numbers show where the bytes go.
+
+    python scripts/bench_image_preprocess.py --corpus ~/Pictures/laundry --mbps 20
+"""
+import argparse
+import base64
+import glob
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image, ImageDraw
+from agents.image_preprocess import prepare_image
+from config import Config
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--corpus", help="directory of sample images")
+parser.add_argument("--samples", type=int, default=6, help="synthetic images when no corpus is given")
+parser.add_argument("--mbps", type=float, default=20.0, help="simulated upload bandwidth to the model API")
+parser.add_argument("--latency", type=float, default=1.5, help="simulated model latency in seconds")
+args = parser.parse_args()
+
+
+def synthetic_photo(seed: int) -> bytes:
+    rng = random.Random(seed)
+    image = Image.new("RGB", (4032, 3024), (rng.randint(180, 255),) * 3)
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randint(0, 3500), rng.randint(0, 2500)
+        draw.ellipse([x, y, x + rng.randint(100, 900), y + rng.randint(100, 700)],
+                     fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    # Grain, so the JPEG is as large as a real phone photo
+    noise = Image.effect_noise((4032, 3024), 40).convert("RGB")
+    image = Image.blend(image, noise, 0.15)
+    exif = Image.Exif()
+    exif[0x0112] = rng.choice([1, 6, 8])  # orientation, as phones write it
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=92, exif=exif)
+    return out.getvalue()
+
+
+def load_corpus():
+    if args.corpus:
+        paths = sorted(p for ext in ("jpg", "jpeg", "png", "webp")
+                       for p in glob.glob(os.path.join(args.corpus, f"*.{ext}")))
+        return [(os.path.basename(p), open(p, "rb").read()) for p in paths]
+    return [(f"synthetic-{i}.jpg", synthetic_photo(i)) for i in range(args.samples)]
+
+
+def model_time(nbytes: int) -> float:
+    return args.latency + nbytes * 8 / (args.mbps * 1_000_000)
+
+
+def old_path(data: bytes):
+    image_b64 = base64.b64encode(data).decode()       # intake_api
+    raw = base64.b64decode(image_b64)                 # VisionAgent.handle
+    image = Image.open(io.BytesIO(raw))
+    image.load()                                      # full-resolution bitmap
+    return len(raw), image.size[0] * image.size[1] * len(image.getbands())
+
+
+def new_path(data: bytes):
+    image, encoded = prepare_image(data, max_side=Config.VISION_MAX_SIDE,
+                                   quality=Config.VISION_JPEG_QUALITY, fmt=Config.VISION_IMAGE_FORMAT)
+    return len(encoded), image.size[0] * image.size[1] * len(image.getbands())
+
+
+corpus = load_corpus()
+print(f"{len(corpus)} images, model latency {args.latency}s + upload at {args.mbps} Mbit/s, "
+      f"VISION_MAX_SIDE={Config.VISION_MAX_SIDE} {Config.VISION_IMAGE_FORMAT}")
+print(f"{'image':<20} {'path':<5} {'prep ms':>8} {'to model':>10} {'bitmap':>9} {'end-to-end':>11}")
+totals = {"old": [0.0, 0, 0.0], "new": [0.0, 0, 0.0]}
+for name, data in corpus:
+    for label, fn in (("old", old_path), ("new", new_path)):
+        start = time.perf_counter()
+        sent, bitmap = fn(data)
+        prep = time.perf_counter() - start
+        e2e = prep + model_time(sent)
+        totals[label][0] += prep
+        totals[label][1] += sent
+        totals[label][2] += e2e
+        print(f"{name:<20} {label:<5} {prep * 1000:8.1f} {sent / 1024:8.0f}KB {bitmap / 2**20:7.1f}MB {e2e:10.2f}s")
+
+n = len(corpus)
+for label, (prep, sent, e2e) in totals.items():
+    print(f"{'mean':<20} {label:<5} {prep / n * 1000:8.1f} {sent / n / 1024:8.0f}KB {'':>9} {e2e / n:10.2f}s")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-notification cost of NotificationAgent.handle() with an
+explicit message (no model call), i.e. pure MemoryBank overhead.
+
+"per-call MemoryBank" reproduces the old behaviour, where every notification
+built a fresh MemoryBank (new connections, writer thread, schema checks);
+"shared MemoryBank" is the injected process-wide instance from get_memory_bank().
+
+    python scripts/bench_notification_overhead.py --count 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--count", type=int, default=200)
+args = parser.parse_args()
+
+os.environ.setdefault("EVENT_RELAY", "none")
+os.environ.setdefault("USE_FIRESTORE", "False")
+
+from google.adk.tools import ToolContext
+from agents.memory_bank import MemoryBank, get_memory_bank
+from agents.notification_agent import NotificationAgent
+
+path = os.path.join(tempfile.mkdtemp(), "bench.db")
+shared = get_memory_bank(path)
+
+
+class PerCallAgent(NotificationAgent):
+    """The old handle(): a brand-new MemoryBank for every notification."""
+    @property
+    def mem(self):
+        return MemoryBank(path)
+
+    @mem.setter
+    def mem(self, value):
+        pass
+
+
+def run(label, agent):
+    async def send_all():
+        for i in range(args.count):
+            await agent.handle(ToolContext({"phone": "5550000", "message": f"Order #{i} is Ready!"}))
+    start = time.perf_counter()
+    asyncio.run(send_all())
+    elapsed = time.perf_counter() - start
+    print(f"{label:>22}: {elapsed * 1000 / args.count:7.2f} ms/notification  ({args.count} in {elapsed:.2f}s)")
+    return elapsed
+
+
+# Silence the agent's per-send print
+import builtins
+_print = builtins.print
+builtins.print = lambda *a, **k: None if a and str(a[0]).startswith("[NotificationAgent]") else _print(*a, **k)
+
+before = run("per-call MemoryBank", PerCallAgent(mem=shared))
+after = run("shared MemoryBank", NotificationAgent(mem=shared))
+print(f"{'speedup':>22}: {before / after:.1f}x")
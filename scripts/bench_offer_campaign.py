@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark a full offer campaign (OfferCampaign.run) over a synthetic customer
+base, against the per-customer path (OfferAgent.handle) on a sample.
+
+Customers get 0-12 orders spread over the last year; nobody holds an unused
+code, so everyone is due.
+
+    python scripts/bench_offer_campaign.py --customers 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--customers", type=int, default=100000)
+parser.add_argument("--chunk", type=int, default=1000)
+parser.add_argument("--sample", type=int, default=200, help="customers sent through OfferAgent.handle one by one")
+args = parser.parse_args()
+
+os.environ.setdefault("EVENT_RELAY", "none")
+os.environ.setdefault("USE_FIRESTORE", "False")
+
+from google.adk.tools import ToolContext
+from agents.memory_bank import MemoryBank, get_memory_bank
+from agents.offer_agent import OfferAgent
+from agents.offer_campaign import OfferCampaign
+
+path = os.path.join(tempfile.mkdtemp(), "bench.db")
+MemoryBank(path).close()  # schema only; the seed below writes directly
+
+start = time.perf_counter()
+rng = random.Random(7)
+now = time.time()
+conn = sqlite3.connect(path)
+customers, orders = [], []
+for i in range(args.customers):
+    phone = f"555{i:07d}"
+    customers.append((phone, json.dumps({"name": f"Customer {i}"})))
+    for j in range(rng.choice((0, 0, 1, 2, 3, 5, 8, 12))):
+        total = round(rng.uniform(50, 900), 2)
+        orders.append((f"o{i}-{j}", phone, "Delivered", json.dumps({"total": total}), now - rng.uniform(0, 365) * 86400, total))
+conn.executemany("INSERT INTO customers (phone, data) VALUES (?, ?)", customers)
+conn.executemany("INSERT INTO orders (id, phone, status, data, timestamp, total) VALUES (?, ?, ?, ?, ?, ?)", orders)
+conn.execute("INSERT INTO offer_eligibility (phone) SELECT phone FROM customers")
+conn.commit()
+conn.close()
+print(f"{'seed':>12}: {args.customers} customers, {len(orders)} orders in {time.perf_counter() - start:.2f}s")
+
+mem = get_memory_bank(path)
+
+
+class NullA2A:
+    async def call(self, name, params):
+        return None
+
+
+# Per-customer path on a sample, extrapolated (those customers are then held by the campaign claim)
+agent = OfferAgent(mem, NullA2A())
+sample = [f"555{i:07d}" for i in range(min(args.sample, args.customers))]
+start = time.perf_counter()
+for phone in sample:
+    asyncio.run(agent.handle(ToolContext({"phone": phone})))
+per_customer = (time.perf_counter() - start) / max(len(sample), 1)
+print(f"{'per-customer':>12}: {per_customer * 1000:.2f} ms/customer -> ~{per_customer * args.customers:.1f}s for all")
+
+result = OfferCampaign(mem, chunk_size=args.chunk).run(now=now)
+print(f"{'campaign':>12}: {result['evaluated']} customers, {result['issued']} offers in {result['seconds']:.2f}s "
+      f"({result['seconds'] * 1e6 / max(result['evaluated'], 1):.1f} µs/customer)  tiers={result['tiers']}")
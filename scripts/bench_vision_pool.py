@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark VisionAgent.analyze_image: asyncio.run() per call (old path) vs the
+shared background loop (agents/async_runtime.py).
+
+google.genai is replaced with a stub whose generate_content sleeps for
+--latency seconds, so no API key or network is needed.
+
+    python scripts/bench_vision_pool.py --requests 200 --latency 0.2
+    WEB_THREADS=32 python scripts/bench_vision_pool.py
+    VISION_CONCURRENCY=8 python scripts/bench_vision_pool.py   # cap below the thread count
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Every request uses the same image; keep the detection cache out of the measurement
+os.environ.setdefault("DETECTION_CACHE_SIZE", "0")
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=200)
+parser.add_argument("--threads", type=int, default=int(os.getenv("WEB_THREADS", 16)),
+                    help="concurrent request threads (gunicorn gthread, WEB_THREADS)")
+parser.add_argument("--latency", type=float, default=0.2, help="simulated model latency in seconds")
+args = parser.parse_args()
+
+
+class _Response:
+    text = '[{"type": "shirt", "color": "blue", "bbox": [0.1, 0.2, 0.45, 0.6]}]'
+
+class _Models:
+    def generate_content(self, model, contents, stream=False):
+        time.sleep(args.latency)
+        return [_Response()] if stream else _Response()
+
+class _Client:
+    def __init__(self):
+        self.models = _Models()
+
+stub = types.ModuleType("google.genai")
+stub.Client = _Client
+sys.modules["google.genai"] = stub
+import google
+google.genai = stub
+
+from PIL import Image
+from agents.vision_agent import VisionAgent
+from config import Config
+
+buf = io.BytesIO()
+Image.new("RGB", (64, 64), "white").save(buf, format="JPEG")
+IMAGE_BYTES = buf.getvalue()
+
+agent = VisionAgent()
+
+
+def old_path(_):
+    # What analyze_image used to do: a fresh event loop per request, blocking call inline
+    return asyncio.run(_old_handle())
+
+async def _old_handle():
+    _, encoded, _ = agent._open(IMAGE_BYTES)
+    return agent._detect(encoded)[0]
+
+
+def run(label, fn):
+    latencies = []
+    def timed(i):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(timed, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{label:<28} {args.requests / elapsed:8.1f} req/s   p50 {p50:7.1f} ms   p99 {p99:7.1f} ms")
+
+
+print(f"{args.requests} requests, {args.threads} request threads, {args.latency * 1000:.0f} ms model latency, "
+      f"VISION_CONCURRENCY={Config.VISION_CONCURRENCY}")
+if Config.VISION_CONCURRENCY < args.threads:
+    print(f"note: only {Config.VISION_CONCURRENCY} of {args.threads} threads can have a model call in flight")
+run("asyncio.run per request", old_path)
+agent.analyze_image(IMAGE_BYTES)  # start the runtime outside the timing
+run("shared background loop", lambda _: agent.analyze_image(IMAGE_BYTES))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini REST API, for exercising the google/genai shim
+(pooling, scheduling, 429 backoff) without a key or quota.
+
+    python scripts/fake_gemini_server.py --port 8089 --latency 0.8 --rpm 30
+    GENAI_API_ENDPOINT=http://localhost:8089 GOOGLE_API_KEY=fake python business_app/app.py
+
+Serves :generateContent and :streamGenerateContent (alt=sse) for any model.
+Requests over --rpm in a rolling minute, or a random --fail-rate fraction, get
+429 RESOURCE_EXHAUSTED. Prompts mentioning "JSON list" get a vision-style
+detection array; anything else gets a short sentence. GET /stats shows counters.
+"""
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+
+from flask import Flask, Response, jsonify, request
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--port", type=int, default=8089)
+parser.add_argument("--latency", type=float, default=0.5, help="seconds per response")
+parser.add_argument("--rpm", type=int, default=0, help="per-model requests/minute before 429 (0 = unlimited)")
+parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+args = parser.parse_args()
+
+app = Flask(__name__)
+lock = threading.Lock()
+recent = collections.defaultdict(collections.deque)  # model -> request timestamps
+stats = collections.Counter()
+
+DETECTIONS = [
+    {"type": "shirt", "color": "blue", "bbox": [0.1, 0.2, 0.45, 0.6]},
+    {"type": "pants", "color": "black", "bbox": [0.5, 0.25, 0.85, 0.65]},
+    {"type": "towel", "color": "white", "bbox": [0.05, 0.6, 0.3, 0.95]},
+]
+
+
+def _prompt_text(body) -> str:
+    return " ".join(part.get("text", "") for content in body.get("contents", [])
+                    for part in content.get("parts", []))
+
+
+def _answer(prompt: str) -> str:
+    if "JSON list" in prompt:
+        return "```json\n" + json.dumps(DETECTIONS, indent=2) + "\n```"
+    return random.choice(["Business is steady this week.", "Your laundry is ready to shine! ✨",
+                          "Turnaround is holding at under a day."])
+
+
+def _candidate(text: str, finish: bool = True) -> dict:
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finish:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate],
+            "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": len(text) // 4,
+                              "totalTokenCount": 100 + len(text) // 4}}
+
+
+def _rate_limited(model: str) -> bool:
+    now = time.time()
+    with lock:
+        window = recent[model]
+        while window and window[0] < now - 60:
+            window.popleft()
+        limited = (args.rpm and len(window) >= args.rpm) or random.random() < args.fail_rate
+        if not limited:
+            window.append(now)
+        stats["429" if limited else "ok"] += 1
+        return bool(limited)
+
+
+@app.route("/<version>/models/<path:model_action>", methods=["POST"])
+def generate(version, model_action):
+    model, _, action = model_action.partition(":")
+    if _rate_limited(model):
+        return jsonify({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                  "status": "RESOURCE_EXHAUSTED"}}), 429
+    text = _answer(_prompt_text(request.get_json(force=True) or {}))
+
+    if action == "streamGenerateContent":
+        def events():
+            pieces = [text[i:i + 40] for i in range(0, len(text), 40)]
+            for i, piece in enumerate(pieces):
+                time.sleep(args.latency / len(pieces))
+                yield "data: " + json.dumps(_candidate(piece, finish=i == len(pieces) - 1)) + "\r\n\r\n"
+        return Response(events(), mimetype="text/event-stream")
+
+    time.sleep(args.latency)
+    return jsonify(_candidate(text))
+
+
+@app.route("/stats")
+def get_stats():
+    with lock:
+        return jsonify(dict(stats))
+
+
+if __name__ == "__main__":
+    app.run(port=args.port, threaded=True)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Move inline overlay images (base64 data URLs) out of existing order records
+into the blob store, leaving a /blobs/<sha256> reference behind.
+Safe to re-run: orders that already reference a blob are skipped.
+"""
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.memory_bank import get_memory_bank
+from agents.blob_store import get_blob_store, decode_data_url, BlobStore
+
+mem = get_memory_bank()
+blobs = get_blob_store()
+
+moved = skipped = 0
+cursor = None
+while True:
+    # One page of orders (with their inline images) in memory at a time
+    page = mem.query_orders(limit=50, cursor=cursor)
+    for order in page['orders']:
+        image_bytes = decode_data_url(order.get('overlay_url', ''))
+        if not image_bytes:
+            skipped += 1
+            continue
+        digest = blobs.put(image_bytes)
+        order_id, phone, status = order.pop('id'), order.pop('phone'), order.pop('status')
+        order.pop('item_count', None)  # column, not part of the stored order
+        order['overlay_url'] = BlobStore.url(digest)
+        order['overlay_sha256'] = digest
+        mem.save_order(order_id, phone, status, order)
+        moved += 1
+        print(f"✓ {order_id} -> {digest[:12]}... ({len(image_bytes)} bytes)")
+    cursor = page['next_cursor']
+    if not cursor:
+        break
+
+print(f"\nMoved {moved} overlays, skipped {skipped} orders.")
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Recompute the hour/day analytics rollups (and optionally the all-time
+aggregates and the offer eligibility index) from the full history. Use after a
+bulk import or manual data fixes; normal writes keep them up to date incrementally.
+"""
+import argparse
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.memory_bank import get_memory_bank
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--aggregates", action="store_true", help="also rebuild the all-time aggregates")
+parser.add_argument("--offers", action="store_true", help="also recount the offer eligibility index")
+args = parser.parse_args()
+
+mem = get_memory_bank()
+start = time.perf_counter()
+rows = mem.rebuild_rollups()
+print(f"✓ Rebuilt {rows} rollup rows in {time.perf_counter() - start:.2f}s")
+if args.aggregates:
+    start = time.perf_counter()
+    mem.rebuild_aggregates()
+    print(f"✓ Rebuilt aggregates in {time.perf_counter() - start:.2f}s")
+if args.offers:
+    start = time.perf_counter()
+    rows = mem.rebuild_offer_index()
+    print(f"✓ Recounted offer eligibility for {rows} customers in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,195 @@
+# tests/fake_firestore.py
+"""
+In-memory stand-in for the parts of google.cloud.firestore that MemoryBank uses.
+
+install() registers it as google.cloud.firestore, so MemoryBank's
+`from google.cloud import firestore` and `firestore.Client()` pick it up.
+Batches enforce Firestore's 500-op limit and commit atomically;
+FakeClient.fail_commits makes chosen commits raise, to simulate partial failures.
+"""
+import copy
+import itertools
+import sys
+import threading
+import types
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+class FieldPath:
+    @staticmethod
+    def document_id():
+        return "__name__"
+
+
+class Query:
+    DESCENDING = "DESCENDING"
+    ASCENDING = "ASCENDING"
+
+    def __init__(self, client, collection, filters=(), order=None, limit=None):
+        self._client = client
+        self._collection = collection
+        self._filters = list(filters)
+        self._order = order
+        self._limit = limit
+
+    def _copy(self, **changes):
+        query = Query(self._client, self._collection, self._filters, self._order, self._limit)
+        for key, value in changes.items():
+            setattr(query, f"_{key}", value)
+        return query
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + [(field, op, value)])
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._copy(order=(field, direction))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, fields):
+        return self
+
+    def stream(self, transaction=None):
+        ops = {"==": lambda a, b: a == b, "<=": lambda a, b: a is not None and a <= b,
+               "<": lambda a, b: a is not None and a < b, ">=": lambda a, b: a is not None and a >= b,
+               "in": lambda a, b: a in b}
+        with self._client.lock:
+            docs = [(doc_id, copy.deepcopy(data))
+                    for doc_id, data in self._client.store.get(self._collection, {}).items()]
+        docs = [(doc_id, data) for doc_id, data in docs
+                if all(ops[op](_lookup(data, field), value) for field, op, value in self._filters)]
+        if self._order:
+            field, direction = self._order
+            docs.sort(key=lambda d: _lookup(d[1], field) or 0, reverse=direction == Query.DESCENDING)
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return iter([Snapshot(DocumentReference(self._client, self._collection, doc_id), data)
+                     for doc_id, data in docs])
+
+
+class CollectionReference(Query):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+
+    def document(self, doc_id=None):
+        return DocumentReference(self._client, self._collection, doc_id or f"auto{next(self._client.ids)}")
+
+
+class DocumentReference:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self.collection_name = collection
+        self.id = doc_id
+
+    def get(self, transaction=None):
+        with self._client.lock:
+            data = self._client.store.get(self.collection_name, {}).get(self.id)
+            return Snapshot(self, copy.deepcopy(data))
+
+    def set(self, data, merge=False):
+        batch = self._client.batch()
+        batch.set(self, data, merge=merge)
+        batch.commit()
+
+
+class Snapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self.exists else None
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(("set", ref, data, merge))
+
+    def update(self, ref, data):
+        self._ops.append(("update", ref, data, True))
+
+    def delete(self, ref):
+        self._ops.append(("delete", ref, None, False))
+
+    def commit(self):
+        if len(self._ops) > 500:
+            raise ValueError(f"WriteBatch has {len(self._ops)} ops (max 500)")
+        self._client.commit(self._ops)
+
+
+class FakeClient:
+    def __init__(self):
+        self.store = {}  # collection -> {doc_id: data}
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.commits = 0
+        self.fail_commits = set()  # commit numbers (1-based) that raise instead of applying
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+    def commit(self, ops):
+        with self.lock:
+            self.commits += 1
+            if self.commits in self.fail_commits:
+                raise RuntimeError(f"Injected failure on commit {self.commits}")
+            for kind, ref, data, merge in ops:
+                docs = self.store.setdefault(ref.collection_name, {})
+                if kind == "delete":
+                    docs.pop(ref.id, None)
+                elif merge:
+                    docs[ref.id] = _merge(docs.get(ref.id) or {}, data)
+                else:
+                    docs[ref.id] = _merge({}, data)
+
+
+def _lookup(data, field):
+    for part in field.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def _merge(target, data):
+    for key, value in data.items():
+        if isinstance(value, Increment):
+            target[key] = (target.get(key) or 0) + value.value
+        elif isinstance(value, dict):
+            target[key] = _merge(target.get(key) if isinstance(target.get(key), dict) else {}, value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def install() -> FakeClient:
+    """Registers the fake as google.cloud.firestore; returns the client firestore.Client() will hand out."""
+    client = FakeClient()
+    module = types.ModuleType("google.cloud.firestore")
+    module.Client = lambda *args, **kwargs: client
+    module.Increment = Increment
+    module.FieldPath = FieldPath
+    module.Query = Query
+    module.transactional = lambda fn: fn
+    cloud = sys.modules.get("google.cloud") or types.ModuleType("google.cloud")
+    cloud.firestore = module
+    sys.modules["google.cloud"] = cloud
+    sys.modules["google.cloud.firestore"] = module
+    return client
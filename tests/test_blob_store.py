@@ -0,0 +1,152 @@
+# tests/test_blob_store.py
+"""
+Blob stores and the /blobs endpoint: ranged reads must fetch only the bytes
+requested, from the local disk and from remote (GCS) backends alike.
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from agents.blob_store import BlobStore, GCSBlobStore, LocalBlobStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+class _MemoryBlobStore(BlobStore):
+    """A remote-style backend (no local_path) that records every read."""
+    def __init__(self):
+        self.blobs, self.reads = {}, []
+
+    def put(self, data):
+        digest = self.digest(data)
+        self.blobs[digest] = data
+        return digest
+
+    def get(self, digest, start=None, end=None):
+        self.reads.append((start, end))
+        data = self.blobs.get(digest)
+        return None if data is None else data[start:end]
+
+    def info(self, digest):
+        data = self.blobs.get(digest)
+        return None if data is None else (len(data), "image/png")
+
+
+class _Blob:
+    def __init__(self, bucket, name):
+        self.bucket, self.name = bucket, name
+
+    def download_as_bytes(self, start=None, end=None):
+        from google.api_core.exceptions import NotFound
+        self.bucket.downloads.append((start, end))
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        data = self.bucket.objects[self.name]
+        return data[start or 0:None if end is None else end + 1]
+
+
+class _Bucket:
+    def __init__(self, objects):
+        self.objects, self.downloads = objects, []
+
+    def blob(self, name):
+        return _Blob(self, name)
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        BlobStore()
+
+    class Partial(BlobStore):
+        def put(self, data):
+            return self.digest(data)
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_local_ranged_get(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    digest = store.put(PNG)
+
+    assert store.get(digest) == PNG
+    assert store.get(digest, 8, 16) == PNG[8:16]
+    assert store.get(digest, 1000) == PNG[1000:]
+    assert store.get(digest, 5, 5) == b""
+    assert store.info(digest) == (len(PNG), "image/png")
+    assert store.get("0" * 64, 0, 4) is None and store.info("0" * 64) is None
+
+
+def test_gcs_ranged_get_downloads_only_the_range():
+    pytest.importorskip("google.api_core")
+    store = GCSBlobStore.__new__(GCSBlobStore)
+    store.prefix = "blobs/"
+    digest = BlobStore.digest(PNG)
+    store.bucket = _Bucket({"blobs/" + digest: PNG})
+
+    assert store.get(digest, 8, 16) == PNG[8:16]
+    assert store.get(digest) == PNG
+    assert store.get("0" * 64, 0, 4) is None
+    # end is exclusive here and inclusive for GCS
+    assert store.bucket.downloads == [(8, 15), (None, None), (0, 3)]
+
+
+@pytest.fixture
+def remote_store():
+    return _MemoryBlobStore()
+
+
+@pytest.fixture
+def client(remote_store):
+    spec = importlib.util.spec_from_file_location("blob_api_under_test",
+                                                  os.path.join(ROOT, "business_app/api/blob_api.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    app = Flask(__name__)
+    app.blobs = remote_store
+    app.register_blueprint(module.blob_bp, url_prefix="/blobs")
+    return app.test_client()
+
+
+def test_remote_range_request_fetches_only_the_range(client, remote_store):
+    digest = remote_store.put(PNG)
+
+    response = client.get(f"/blobs/{digest}", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.data == PNG[100:200]
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(PNG)}"
+    assert response.headers["ETag"] == f'"{digest}"'
+    assert remote_store.reads == [(100, 200)]
+
+    response = client.get(f"/blobs/{digest}", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206 and response.data == PNG[-10:]
+
+
+def test_remote_full_and_conditional_requests(client, remote_store):
+    digest = remote_store.put(PNG)
+
+    response = client.get(f"/blobs/{digest}")
+    assert response.status_code == 200 and response.data == PNG
+    assert response.mimetype == "image/png"
+    assert client.get(f"/blobs/{digest}", headers={"If-None-Match": f'"{digest}"'}).status_code == 304
+    # If-Range naming another version: the whole blob, not a range
+    response = client.get(f"/blobs/{digest}", headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200 and response.data == PNG
+    assert remote_store.reads == [(None, None)] * 3
+
+
+def test_remote_unsatisfiable_range_and_missing_blob(client, remote_store):
+    digest = remote_store.put(PNG)
+
+    response = client.get(f"/blobs/{digest}", headers={"Range": f"bytes={len(PNG) + 10}-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(PNG)}"
+    assert client.get(f"/blobs/{'0' * 64}", headers={"Range": "bytes=0-9"}).status_code == 404
+    assert client.get(f"/blobs/{'0' * 64}").status_code == 404
+    assert remote_store.reads == [(None, None)]
@@ -0,0 +1,113 @@
+# tests/test_delete_customer_firestore.py
+"""
+Firestore cascade delete (MemoryBank.delete_customer) against tests/fake_firestore.py:
+multi-chunk deletes and the analytics counters they adjust.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(__file__))
+
+import fake_firestore
+from config import Config
+from agents.event_hub import EventHub
+from agents.memory_bank import DATA_VERSION, MemoryBank, _merge_deltas, _order_deltas
+from agents.rollups import rollup_deltas
+
+DAY = 86400.0
+START = 1_700_000_000.0
+
+
+@pytest.fixture
+def bank(monkeypatch):
+    client = fake_firestore.install()
+    monkeypatch.setattr(Config, "USE_FIRESTORE", True)
+    monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+    mem = MemoryBank(events=EventHub())
+    assert mem.use_cloud
+    return mem, client
+
+
+def _seed(mem, phone, orders, notifications=3):
+    mem.save_customer(phone, {"name": phone})
+    for i in range(orders):
+        # Spread over several days so the rollups touch many hour/day buckets
+        mem.save_order(f"{phone}-{i}", phone, "Delivered" if i % 3 else "Pending", {
+            "total": 10.0 + i, "timestamp": START + i * 3600,
+            "items": [{"label": "Blue Shirt" if i % 2 else "Silk Saree"}]})
+    for i in range(notifications):
+        mem.save_notification(phone, f"message {i}")
+
+
+def _counters(client):
+    """(aggregates, rollups) as stored, without zero entries and the data version."""
+    aggregates = {(metric, dim): round(value, 6)
+                  for metric, dims in (client.store["analytics"]["aggregates"]).items() if metric != DATA_VERSION[0]
+                  for dim, value in dims.items() if value}
+    rollups = {(doc["granularity"], doc["bucket"], metric, dim): round(value, 6)
+               for doc in client.store.get("rollups", {}).values()
+               for metric, dims in doc.items() if isinstance(dims, dict)
+               for dim, value in dims.items() if value}
+    return aggregates, rollups
+
+
+def _expected(client):
+    """The counters recomputed from the orders still in the store."""
+    deltas, rdeltas = {}, {}
+    for order in client.store.get("orders", {}).values():
+        order_deltas = _order_deltas(order["status"], order["data"])
+        _merge_deltas(deltas, order_deltas)
+        _merge_deltas(rdeltas, rollup_deltas(order_deltas, order["timestamp"]))
+    return ({key: round(value, 6) for key, value in deltas.items() if value},
+            {key: round(value, 6) for key, value in rdeltas.items() if value})
+
+
+def _docs(client, collection, phone):
+    return [doc_id for doc_id, data in client.store.get(collection, {}).items() if data.get("phone") == phone]
+
+
+def test_delete_spanning_many_chunks_adjusts_counters(bank):
+    mem, client = bank
+    _seed(mem, "111", orders=300, notifications=450)
+    _seed(mem, "222", orders=7)
+    assert _counters(client) == _expected(client)
+
+    updates = []
+    counts = mem.delete_customer("111", progress=updates.append)
+
+    assert counts["orders"] == 300 and counts["notifications"] == 450
+    for collection in ("orders", "order_status_history", "notifications"):
+        assert _docs(client, collection, "111") == []
+    assert "111" not in client.store["customers"]
+    assert not any(order_id.startswith("111-") for order_id in client.store.get("approval_tasks", {}))
+    assert len(_docs(client, "orders", "222")) == 7
+    assert "222" in client.store["customers"]
+
+    aggregates, rollups = _counters(client)
+    assert (aggregates, rollups) == _expected(client)
+    assert aggregates[("orders", "total")] == 7
+    assert updates[-1]["stage"] == "done" and updates[-1]["deleted"] == updates[-1]["total"]
+
+
+def test_failed_chunk_leaves_counters_consistent_and_rerun_finishes(bank):
+    mem, client = bank
+    _seed(mem, "111", orders=300)
+    _seed(mem, "222", orders=7)
+
+    # Commit 1 is the non-order chunk; 2-4 are the order chunks. Fail one of those.
+    client.fail_commits = {client.commits + 3}
+    with pytest.raises(RuntimeError):
+        mem.delete_customer("111")
+
+    remaining = len(_docs(client, "orders", "111"))
+    assert 0 < remaining < 300
+    assert _counters(client) == _expected(client)
+
+    client.fail_commits = set()
+    mem.delete_customer("111")
+    assert _docs(client, "orders", "111") == []
+    assert _counters(client) == _expected(client)
+    assert _counters(client)[0][("orders", "total")] == 7
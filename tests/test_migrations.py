@@ -0,0 +1,186 @@
+# tests/test_migrations.py
+"""
+Versioned SQLite migrations (agents/migrations.py) as MemoryBank applies them:
+a fresh database, an upgrade of a database with the original (pre-migration)
+schema or from an intermediate version, and re-running on an up-to-date one.
+"""
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.event_hub import EventHub
+from agents.memory_bank import DATA_VERSION, MemoryBank, _feedback_deltas, _merge_deltas, _order_deltas
+from agents.migrations import MIGRATIONS, migrate
+from agents.rollups import bucket_start, rollup_deltas
+
+START = 1_700_000_000.0
+
+# Tables as the app created them before the migrations existed (no user_version)
+BASELINE_SCHEMA = [
+    "CREATE TABLE customers (phone TEXT PRIMARY KEY, data TEXT)",
+    "CREATE TABLE fabric_kb (fabric_key TEXT PRIMARY KEY, data TEXT)",
+    "CREATE TABLE redeem_codes (code TEXT PRIMARY KEY, phone TEXT, data TEXT)",
+    "CREATE TABLE orders (id TEXT PRIMARY KEY, phone TEXT, status TEXT, data TEXT, timestamp REAL)",
+    "CREATE TABLE feedback (id TEXT PRIMARY KEY, order_id TEXT, rating INTEGER, comment TEXT, timestamp REAL)",
+    "CREATE TABLE notifications (id INTEGER PRIMARY KEY AUTOINCREMENT, phone TEXT, message TEXT, timestamp REAL, read INTEGER)",
+]
+
+ORDERS = [
+    ("o1", "111", "Delivered", {"total": 120.5, "items": [{"label": "Blue Shirt"}, {"label": "Silk Saree"}]}, START),
+    ("o2", "111", "Pending", {"total": 40, "items": [{"label": "Wool Blanket"}]}, START + 3600),
+    ("o3", "222", "Ready", {"total": "75.25", "items": []}, START + 2 * 86400),
+    ("o4", "222", None, {"items": [{"label": "Shirt"}, {"label": ""}]}, START + 2 * 86400 + 60),
+]
+FEEDBACK = [("f1", "o1", 5, "great", START + 7200), ("f2", "o3", 3, "ok", START + 2 * 86400 + 5)]
+REDEEMS = [("CODE1", "111", {"used": False}), ("CODE2", "111", {"used": True}), ("CODE3", "333", {"used": False})]
+
+
+def _baseline_db(path):
+    conn = sqlite3.connect(path)
+    for statement in BASELINE_SCHEMA:
+        conn.execute(statement)
+    conn.executemany("INSERT INTO customers (phone, data) VALUES (?, ?)",
+                     [("111", json.dumps({"name": "A"})), ("222", json.dumps({"name": "B"}))])
+    for order_id, phone, status, data, ts in ORDERS:
+        conn.execute("INSERT INTO orders (id, phone, status, data, timestamp) VALUES (?, ?, ?, ?, ?)",
+                     (order_id, phone, status, json.dumps({**data, "timestamp": ts}), ts))
+    conn.executemany("INSERT INTO feedback (id, order_id, rating, comment, timestamp) VALUES (?, ?, ?, ?, ?)", FEEDBACK)
+    conn.executemany("INSERT INTO redeem_codes (code, phone, data) VALUES (?, ?, ?)",
+                     [(code, phone, json.dumps(data)) for code, phone, data in REDEEMS])
+    conn.commit()
+    conn.close()
+
+
+def _expected_counters():
+    deltas, rdeltas = {}, {}
+    for _, _, status, data, ts in ORDERS:
+        order_deltas = _order_deltas(status, data)
+        _merge_deltas(deltas, order_deltas)
+        _merge_deltas(rdeltas, rollup_deltas(order_deltas, ts))
+    for _, _, rating, _, ts in FEEDBACK:
+        _merge_deltas(deltas, _feedback_deltas(rating))
+        _merge_deltas(rdeltas, rollup_deltas(_feedback_deltas(rating), ts))
+    return ({k: round(v, 6) for k, v in deltas.items() if v},
+            {k: round(v, 6) for k, v in rdeltas.items() if v})
+
+
+def _stored_counters(path):
+    conn = sqlite3.connect(path)
+    aggregates = {(m, d): round(v, 6) for m, d, v in conn.execute("SELECT metric, dim, value FROM aggregates")
+                  if m != DATA_VERSION[0] and v}
+    rollups = {(g, b, m, d): round(v, 6) for g, b, m, d, v in
+               conn.execute("SELECT granularity, bucket, metric, dim, value FROM rollups") if v}
+    conn.close()
+    return aggregates, rollups
+
+
+def _user_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _open(path):
+    return MemoryBank(path, events=EventHub())
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "memory.db")
+
+
+def test_fresh_database(db_path):
+    mem = _open(db_path)
+    mem.close()
+
+    assert _user_version(db_path) == len(MIGRATIONS)
+    conn = sqlite3.connect(db_path)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    order_columns = {row[1] for row in conn.execute("PRAGMA table_info(orders)")}
+    conn.close()
+    assert {"customers", "orders", "feedback", "redeem_codes", "notifications", "aggregates",
+            "order_status_history", "rollups", "approval_tasks", "offer_eligibility"} <= tables
+    assert {"idx_orders_phone_ts", "idx_redeem_phone_used", "idx_offer_eligibility_due"} <= indexes
+    assert {"total", "item_count"} <= order_columns
+    assert _stored_counters(db_path) == ({}, {})
+
+
+def test_upgrade_from_baseline_schema(db_path):
+    _baseline_db(db_path)
+    assert _user_version(db_path) == 0
+
+    mem = _open(db_path)
+    try:
+        assert _user_version(db_path) == len(MIGRATIONS)
+
+        # Promoted columns are backfilled from the JSON blobs
+        conn = sqlite3.connect(db_path)
+        columns = {row[0]: row[1:] for row in conn.execute("SELECT id, total, item_count FROM orders")}
+        used = dict(conn.execute("SELECT code, used FROM redeem_codes"))
+        eligibility = dict(conn.execute("SELECT phone, active_offers FROM offer_eligibility"))
+        conn.close()
+        assert columns == {"o1": (120.5, 2), "o2": (40.0, 1), "o3": (75.25, 0), "o4": (0.0, 2)}
+        assert used == {"CODE1": 0, "CODE2": 1, "CODE3": 0}
+        assert eligibility == {"111": 1, "222": 0, "333": 1}
+
+        # Counters and rollups are rebuilt from the existing history
+        assert _stored_counters(db_path) == _expected_counters()
+        aggregates = mem.get_aggregates()
+        assert aggregates["orders"]["total"] == 4
+        assert aggregates["reviews"]["total"] == 2
+
+        # Pre-existing rows are readable through the new code paths
+        page = mem.query_orders("111", limit=10)
+        assert [o["id"] for o in page["orders"]] == ["o2", "o1"]
+        assert sorted(c["code"] for c in mem.get_redeems_by_phone("111")) == ["CODE1", "CODE2"]
+        assert mem.get_offer_eligibility("111")["active_offers"] == 1
+    finally:
+        mem.close()
+
+
+def test_rerun_is_idempotent(db_path):
+    _baseline_db(db_path)
+    _open(db_path).close()
+    before = _stored_counters(db_path)
+
+    mem = _open(db_path)
+    mem.close()
+    conn = sqlite3.connect(db_path)
+    assert migrate(conn) == len(MIGRATIONS)
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("orders", "redeem_codes", "offer_eligibility")}
+    conn.close()
+
+    assert _user_version(db_path) == len(MIGRATIONS)
+    assert _stored_counters(db_path) == before
+    assert counts == {"orders": 4, "redeem_codes": 3, "offer_eligibility": 3}
+
+
+def test_upgrade_from_intermediate_version(db_path):
+    # A database that stopped at migration 3 picks up from there
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cur = conn.cursor()
+    for version, migration in enumerate(MIGRATIONS[:3]):
+        cur.execute("BEGIN")
+        migration(cur)
+        cur.execute(f"PRAGMA user_version = {version + 1}")
+        cur.execute("COMMIT")
+    cur.execute("INSERT INTO orders (id, phone, status, data, timestamp, total, item_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ("o1", "111", "Delivered", json.dumps({"total": 10, "items": []}), START, 10, 0))
+    conn.close()
+
+    mem = _open(db_path)
+    try:
+        assert _user_version(db_path) == len(MIGRATIONS)
+        assert mem.get_aggregates()["revenue"]["total"] == 10
+        assert _stored_counters(db_path)[1][("day", bucket_start(START, "day"), "orders", "total")] == 1
+    finally:
+        mem.close()
@@ -0,0 +1,146 @@
+# tests/test_order_pagination.py
+"""
+Keyset-paginated orders: MemoryBank.query_orders and the business/customer
+endpoints in front of it.
+"""
+import base64
+import importlib.util
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from agents.event_hub import EventHub
+from agents.memory_bank import MemoryBank
+
+START = 1_700_000_000.0
+
+
+def _blueprint(path, name, attr):
+    # Both apps keep their blueprints in a package called `api`, so load them by path
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, attr)
+
+
+@pytest.fixture
+def mem(tmp_path):
+    mem = MemoryBank(str(tmp_path / "memory.db"), events=EventHub())
+    # 3 timestamps shared by several orders each, plus one customer of their own
+    for i in range(9):
+        mem.save_order(f"o{i}", "111", "Delivered" if i % 2 else "Pending", {
+            "total": 10.0 * i, "timestamp": START + (i // 3) * 60,
+            "items": [{"label": f"Shirt {i}"}], "notes": f"note {i}"})
+    mem.save_order("x1", "222", "Ready", {"total": 5, "timestamp": START + 30, "items": []})
+    yield mem
+    mem.close()
+
+
+@pytest.fixture
+def client(mem):
+    app = Flask(__name__)
+    app.mem = mem
+    app.register_blueprint(_blueprint("business_app/api/business_api.py", "business_api_under_test", "business_bp"),
+                           url_prefix="/api/business")
+    app.register_blueprint(_blueprint("customer_app/api/customer_api.py", "customer_api_under_test", "customer_bp"),
+                           url_prefix="/api/customer")
+    return app.test_client()
+
+
+def _all_pages(fetch):
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = fetch(cursor)
+        ids += [order["id"] for order in page["orders"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            return ids, pages
+
+
+def test_pages_are_stable_across_timestamp_ties(mem):
+    ids, pages = _all_pages(lambda cursor: mem.query_orders("111", limit=2, cursor=cursor))
+
+    # Newest first; orders sharing a timestamp are ordered by id, none skipped or repeated
+    assert ids == ["o8", "o7", "o6", "o5", "o4", "o3", "o2", "o1", "o0"]
+    assert pages == 5
+
+
+def test_pages_without_phone_cover_every_customer(mem):
+    ids, _ = _all_pages(lambda cursor: mem.query_orders(limit=4, cursor=cursor))
+    assert sorted(ids) == sorted([f"o{i}" for i in range(9)] + ["x1"])
+    assert len(ids) == len(set(ids))
+
+
+def test_last_page(mem):
+    page = mem.query_orders("111", limit=9)
+    assert len(page["orders"]) == 9 and page["next_cursor"] is None
+
+    page = mem.query_orders("111", limit=8)
+    assert page["next_cursor"] is not None
+    last = mem.query_orders("111", limit=8, cursor=page["next_cursor"])
+    assert [o["id"] for o in last["orders"]] == ["o0"] and last["next_cursor"] is None
+
+    assert mem.query_orders("nobody", limit=5) == {"orders": [], "next_cursor": None}
+
+
+def test_fields_projection(mem):
+    page = mem.query_orders("111", limit=2, fields=["id", "status", "total", "notes"])
+    assert page["orders"] == [
+        {"id": "o8", "status": "Pending", "total": 80.0, "notes": "note 8"},
+        {"id": "o7", "status": "Delivered", "total": 70.0, "notes": "note 7"},
+    ]
+    # Unknown blob fields come back as null rather than failing
+    assert mem.query_orders("111", limit=1, fields=["id", "missing"])["orders"] == [{"id": "o8", "missing": None}]
+
+    full = mem.query_orders("111", limit=1)["orders"][0]
+    assert {"id", "status", "timestamp", "total", "item_count", "items", "notes"} <= set(full)
+
+
+@pytest.mark.parametrize("cursor", [
+    "garbage",
+    "!!!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(b'["abc", "o1"]').decode(),
+    base64.urlsafe_b64encode(b'{"ts": 1}').decode(),
+    base64.urlsafe_b64encode(b"[1]").decode(),
+])
+def test_bad_cursor_is_rejected(mem, client, cursor):
+    with pytest.raises(ValueError):
+        mem.query_orders("111", limit=2, cursor=cursor)
+    for url in ("/api/business/orders/111", "/api/customer/orders/111"):
+        response = client.get(url, query_string={"cursor": cursor})
+        assert response.status_code == 400
+        assert "error" in response.get_json()
+
+
+@pytest.mark.parametrize("prefix", ["/api/business", "/api/customer"])
+def test_endpoint_pages_with_projection(client, prefix):
+    ids, cursor = [], None
+    while True:
+        query = {"limit": 4, "fields": "id,total"}
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get(f"{prefix}/orders/111", query_string=query)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert all(set(order) == {"id", "total"} for order in page["orders"])
+        ids += [order["id"] for order in page["orders"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert ids == ["o8", "o7", "o6", "o5", "o4", "o3", "o2", "o1", "o0"]
+
+
+@pytest.mark.parametrize("prefix", ["/api/business", "/api/customer"])
+def test_endpoint_rejects_bad_fields_and_clamps_limit(client, prefix):
+    assert client.get(f"{prefix}/orders/111", query_string={"fields": "id,data;drop"}).status_code == 400
+    page = client.get(f"{prefix}/orders/111", query_string={"limit": -5}).get_json()
+    assert len(page["orders"]) == 1
+    page = client.get(f"{prefix}/orders/111", query_string={"limit": 10000}).get_json()
+    assert len(page["orders"]) == 9 and page["next_cursor"] is None
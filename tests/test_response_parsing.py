@@ -0,0 +1,89 @@
+# tests/test_response_parsing.py
+"""
+agents/response_parsing against a corpus of recorded-style vision responses:
+parse_json_response on the whole text, and JSONArrayStream fed in chunks of
+several sizes, must both recover exactly the complete items.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.response_parsing import JSONArrayStream, parse_json_response, repair_json
+
+SHIRT = '{"type": "shirt", "color": "blue", "bbox": [0.1, 0.2, 0.45, 0.6]}'
+PANTS = '{"type": "pants", "color": "black", "bbox": [0.5, 0.25, 0.85, 0.65]}'
+TOWEL = '{"type": "towel", "color": "white", "bbox": [0.05, 0.6, 0.3, 0.95], "confidence": 0.82}'
+
+# (name, response text, types of the complete items expected, stream finds an array, stream intact)
+CORPUS = [
+    ("plain array", f"[{SHIRT}, {PANTS}]", ["shirt", "pants"], True, True),
+    ("json fence", f"```json\n[\n  {SHIRT},\n  {PANTS}\n]\n```", ["shirt", "pants"], True, True),
+    ("bare fence", f"```\n[{SHIRT}]\n```", ["shirt"], True, True),
+    ("prose before", f"Here are the detected items:\n\n```json\n[{SHIRT}, {TOWEL}]\n```", ["shirt", "towel"], True, True),
+    ("prose after", f"[{SHIRT}, {PANTS}]\n\nLet me know if you need anything else.", ["shirt", "pants"], True, True),
+    ("prose without fence", f"I found 3 items: [{SHIRT}, {PANTS}, {TOWEL}] in the photo.",
+     ["shirt", "pants", "towel"], True, True),
+    ("trailing comma", f"```json\n[{SHIRT}, {PANTS},]\n```", ["shirt", "pants"], True, True),
+    ("python literals", '[{"type": "sock", "color": "grey", "bbox": [0.1, 0.1, 0.2, 0.2], "paired": True, "stain": None}]',
+     ["sock"], True, False),
+    ("brackets inside strings", '[{"type": "shirt", "color": "red [faded], {old}", "bbox": [0, 0, 0.5, 0.5]}]',
+     ["shirt"], True, True),
+    ("escaped quotes", '[{"type": "jacket", "color": "\\"navy\\" blue", "bbox": [0.2, 0.2, 0.9, 0.9]}]',
+     ["jacket"], True, True),
+    ("truncated mid-string", f"```json\n[{SHIRT}, {PANTS}, {{\"type\": \"tow", ["shirt", "pants"], True, False),
+    ("truncated mid-bbox", f"[{SHIRT}, {{\"type\": \"towel\", \"color\": \"white\", \"bbox\": [0.05, 0.", ["shirt"], True, False),
+    ("truncated after item", f"```json\n[{SHIRT}, {PANTS},", ["shirt", "pants"], True, False),
+    ("truncated after key", f"[{SHIRT}, {{\"type\": \"towel\", \"color\":", ["shirt"], True, False),
+    ("wrapped in object", f'{{"items": [{SHIRT}, {PANTS}]}}', ["shirt", "pants"], True, True),
+    ("empty array", "```json\n[]\n```", [], True, True),
+    ("no json at all", "I could not find any clothing in this image.", [], False, False),
+]
+
+
+def _complete(items):
+    """Types of the items VisionAgent would accept (type and a 4-number bbox)."""
+    if isinstance(items, dict):
+        items = next((v for v in items.values() if isinstance(v, list)), [])
+    return [i["type"] for i in items or [] if isinstance(i, dict) and i.get("type")
+            and isinstance(i.get("bbox"), list) and len(i["bbox"]) == 4]
+
+
+@pytest.mark.parametrize("name, text, expected, found, intact", CORPUS, ids=[c[0] for c in CORPUS])
+def test_full_response(name, text, expected, found, intact):
+    assert _complete(parse_json_response(text, default=[])) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+@pytest.mark.parametrize("name, text, expected, found, intact", CORPUS, ids=[c[0] for c in CORPUS])
+def test_streamed_response(name, text, expected, found, intact, chunk_size):
+    stream, items = JSONArrayStream(), []
+    for start in range(0, len(text), chunk_size):
+        items += stream.feed(text[start:start + chunk_size])
+    items += stream.close()
+    assert _complete(items) == expected
+    assert stream.found_array == found
+    assert stream.intact == intact
+
+
+def test_items_arrive_before_the_response_ends():
+    text = f"```json\n[{SHIRT}, {PANTS}, {TOWEL}]\n```"
+    stream = JSONArrayStream()
+    first = stream.feed(text[:text.index(PANTS)])
+    assert _complete(first) == ["shirt"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('[{"a": 1,}]', '[{"a": 1}]'),
+    ('[{"a": True, "b": "True"}]', '[{"a": true, "b": "True"}]'),
+    ('[{"a": [1, 2', '[{"a": [1, 2]}]'),
+    ('[{"a": "x', '[{"a": "x"}]'),
+    ('[{"a": 1, "b":', '[{"a": 1}]'),
+    ('[{"a": 1, "b"', '[{"a": 1}]'),
+    ('{"a": 0.', '{"a": 0}'),
+    ('Result: {"a": 1} done', '{"a": 1}'),
+])
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
@@ -0,0 +1,79 @@
+# tests/test_result_cache.py
+"""
+ResultCache with computations that have already finished by the time submit() returns.
+"""
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import agents.result_cache as result_cache
+from agents.result_cache import ResultCache
+
+
+class _EagerRuntime:
+    """Runs each coroutine to completion inside submit(), so its future is already done."""
+    def submit(self, coro) -> Future:
+        future = Future()
+        def run():
+            try:
+                future.set_result(asyncio.run(coro))
+            except Exception as e:
+                future.set_exception(e)
+        # On its own thread: the caller is already inside an event loop
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        return future
+
+
+@pytest.fixture(autouse=True)
+def eager_runtime(monkeypatch):
+    monkeypatch.setattr(result_cache, "get_runtime", lambda: _EagerRuntime())
+
+
+def _get(cache, key, version, compute, timeout=5):
+    """cache.get() on a separate thread; fails instead of hanging if it deadlocks."""
+    outcome = {}
+    def run():
+        try:
+            outcome["value"] = asyncio.run(cache.get(key, version, compute))
+        except Exception as e:
+            outcome["error"] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "ResultCache.get deadlocked"
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
+
+
+def test_computation_finished_before_callback_is_stored():
+    cache = ResultCache()
+
+    async def compute():
+        return "summary"
+
+    assert _get(cache, "week", 1, compute) == ("summary", "miss")
+    assert _get(cache, "week", 1, compute) == ("summary", "hit")
+    assert cache.stats()["inflight"] == 0
+
+
+def test_computation_failing_immediately_does_not_deadlock():
+    cache = ResultCache()
+
+    async def compute():
+        raise RuntimeError("model unavailable")
+
+    with pytest.raises(RuntimeError):
+        _get(cache, "week", 1, compute)
+    # The lock was released and the failed refresh cleared; the next call recomputes
+    with pytest.raises(RuntimeError):
+        _get(cache, "week", 1, compute)
+    assert cache.stats() == {"hits": 0, "stale_hits": 0, "misses": 2, "entries": 0, "inflight": 0}
@@ -0,0 +1,100 @@
+# tests/test_vision_agent.py
+"""
+VisionAgent with a scripted model client: which results the detection cache keeps.
+"""
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Config
+from agents.vision_agent import VisionAgent
+
+SHIRT = '{"type": "shirt", "color": "blue", "bbox": [0.1, 0.2, 0.45, 0.6]}'
+PANTS = '{"type": "pants", "color": "black", "bbox": [0.5, 0.25, 0.85, 0.65]}'
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Models:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def generate_content(self, model, contents, stream=False):
+        self.calls += 1
+        text = self.replies.pop(0)
+        # Streamed in small pieces, like the real SDK
+        return [_Chunk(text[i:i + 16]) for i in range(0, len(text), 16)]
+
+
+class _Client:
+    def __init__(self, replies):
+        self.models = _Models(replies)
+
+
+def _photo(color="red"):
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(Config, "DETECTION_CACHE_SIZE", 16)
+    monkeypatch.setattr(Config, "DETECTION_CACHE_DB", "")
+    return VisionAgent()
+
+
+def _script(agent, *replies):
+    agent.client = _Client(replies)
+    return agent.client.models
+
+
+def test_empty_result_is_not_cached_and_retry_reaches_model(agent):
+    models = _script(agent, "```json\n[]\n```", f"[{SHIRT}]")
+    image = _photo()
+
+    assert agent.analyze_image(image) == []
+    items = agent.analyze_image(image)
+
+    assert models.calls == 2
+    assert [item["type"] for item in items] == ["shirt"]
+
+
+def test_truncated_result_is_not_cached(agent):
+    models = _script(agent, f'[{SHIRT}, {{"type": "pants", "bbox": [0.5,', f"[{SHIRT}, {PANTS}]")
+    image = _photo()
+
+    assert [item["type"] for item in agent.analyze_image(image)] == ["shirt"]
+    assert [item["type"] for item in agent.analyze_image(image)] == ["shirt", "pants"]
+    assert models.calls == 2
+
+
+def test_complete_result_is_cached(agent):
+    models = _script(agent, f"[{SHIRT}, {PANTS}]")
+    image = _photo()
+
+    first = agent.analyze_image(image)
+    again = agent.analyze_image(image)
+
+    assert models.calls == 1
+    assert [item["type"] for item in again] == ["shirt", "pants"]
+    assert {item["item_id"] for item in first}.isdisjoint(item["item_id"] for item in again)
+
+
+def test_prose_only_reply_raises_and_is_not_cached(agent):
+    models = _script(agent, "I could not find any clothing in this image.", f"[{SHIRT}]")
+    image = _photo()
+
+    with pytest.raises(ValueError):
+        agent.analyze_image(image)
+    assert [item["type"] for item in agent.analyze_image(image)] == ["shirt"]
+    assert models.calls == 2